@@ -0,0 +1,73 @@
+# Copyright 2022 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""
+WER and decoding time of the greedy and beam search decoders with different beam widths,
+on the model outputs saved by eval.py
+"""
+import argparse
+import json
+import pickle
+import time
+
+from src.config import eval_config
+from src.ctc_decoder import BeamCTCDecoder, GreedyDecoder
+
+parser = argparse.ArgumentParser(description='DeepSpeech decoder benchmark')
+parser.add_argument('--output_file', type=str, default=eval_config.save_output + '.bin',
+                    help='Model outputs saved by eval.py')
+parser.add_argument('--beam_widths', type=str, default='1,8,32,128,512', help='Beam widths separated by comma')
+parser.add_argument('--lm_path', type=str, default='', help='ARPA language model, empty means no language model')
+parser.add_argument('--alpha', type=float, default=eval_config.LMConfig.alpha, help='Language model weight')
+parser.add_argument('--beta', type=float, default=eval_config.LMConfig.beta, help='Word insertion bonus')
+parser.add_argument('--lm_workers', type=int, default=eval_config.LMConfig.lm_workers, help='Decoding processes')
+args = parser.parse_args()
+
+
+def evaluate(decoder, output_data):
+    """Return WER, CER and decoding seconds of the decoder on the saved outputs"""
+    total_wer, total_cer, num_tokens, num_chars = 0, 0, 0, 0
+    start = time.time()
+    for out, output_sizes, target_strings in output_data:
+        decoded_output, _ = decoder.decode(out, output_sizes)
+        for doutput, toutput in zip(decoded_output, target_strings):
+            transcript, reference = doutput[0], toutput[0]
+            total_wer += decoder.wer(transcript, reference)
+            total_cer += decoder.cer(transcript, reference)
+            num_tokens += len(reference.split())
+            num_chars += len(reference.replace(' ', ''))
+    elapsed = time.time() - start
+    return float(total_wer) / num_tokens, float(total_cer) / num_chars, elapsed
+
+
+if __name__ == '__main__':
+    with open(eval_config.DataConfig.labels_path) as label_file:
+        labels = json.load(label_file)
+    with open(args.output_file, 'rb') as f:
+        outputs = pickle.load(f)
+    blank_index = labels.index('_')
+
+    wer, cer, seconds = evaluate(GreedyDecoder(labels, blank_index=blank_index), outputs)
+    print('greedy      \tWER {:.3f}\tCER {:.3f}\ttime {:.2f}s'.format(wer * 100, cer * 100, seconds))
+    decoder = BeamCTCDecoder(labels, lm_path=args.lm_path or None, alpha=args.alpha, beta=args.beta,
+                             cutoff_top_n=eval_config.LMConfig.cutoff_top_n,
+                             cutoff_prob=eval_config.LMConfig.cutoff_prob,
+                             num_processes=args.lm_workers, blank_index=blank_index)
+    for beam_width in [int(width) for width in args.beam_widths.split(',')]:
+        # The worker processes hold a copy of the decoder, they are restarted with the new beam width
+        decoder.close()
+        decoder.beam_width = beam_width
+        wer, cer, seconds = evaluate(decoder, outputs)
+        print('beam {:<7d}\tWER {:.3f}\tCER {:.3f}\ttime {:.2f}s'.format(beam_width, wer * 100, cer * 100, seconds))
+    decoder.close()
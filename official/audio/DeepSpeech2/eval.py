@@ -23,6 +23,7 @@ import numpy as np
 from src.config import eval_config
 from src.deepspeech2 import DeepSpeechModel, PredictWithSoftmax
 from src.dataset import create_dataset
+from src.ctc_decoder import create_decoder
 from src.greedydecoder import MSGreedyDecoder
 from mindspore import context
 from mindspore.train.serialization import load_checkpoint, load_param_into_net
@@ -33,11 +34,15 @@ parser.add_argument('--pretrain_ckpt', type=str,
                     default='./checkpoint/ckpt_0/DeepSpeech0-70_1287.ckpt', help='Pretrained checkpoint path')
 parser.add_argument('--device_target', type=str, default="GPU", choices=("GPU", "CPU"),
                     help='Device target, support GPU and CPU, Default: GPU')
+parser.add_argument('--decoder_type', type=str, default=None, choices=("greedy", "beam"),
+                    help='Decoder type, Default: LMConfig.decoder_type in src/config.py')
 args = parser.parse_args()
 
 if __name__ == '__main__':
     context.set_context(mode=context.GRAPH_MODE, device_target=args.device_target, save_graphs=False)
     config = eval_config
+    if args.decoder_type is not None:
+        config.LMConfig.decoder_type = args.decoder_type
     with open(config.DataConfig.labels_path) as label_file:
         labels = json.load(label_file)
 
@@ -52,7 +57,9 @@ if __name__ == '__main__':
     ds_eval = create_dataset(audio_conf=config.DataConfig.SpectConfig,
                              manifest_filepath=config.DataConfig.test_manifest,
                              labels=labels, normalize=True, train_mode=False,
-                             batch_size=config.DataConfig.batch_size, rank=0, group_size=1)
+                             batch_size=config.DataConfig.batch_size, rank=0, group_size=1,
+                             cache_dir=config.DataConfig.cache_dir,
+                             bucket_boundaries=config.DataConfig.bucket_boundaries)
 
     param_dict = load_checkpoint(args.pretrain_ckpt)
     param_dict_new = {}
@@ -66,10 +73,7 @@ if __name__ == '__main__':
     # load_param_into_net(model, param_dict)
     print('Successfully loading the pre-trained model')
 
-    if config.LMConfig.decoder_type == 'greedy':
-        decoder = MSGreedyDecoder(labels=labels, blank_index=labels.index('_'))
-    else:
-        raise NotImplementedError("Only greedy decoder is supported now")
+    decoder = create_decoder(labels, config.LMConfig)
     target_decoder = MSGreedyDecoder(labels, blank_index=labels.index('_'))
 
     model.set_train(False)
@@ -110,6 +114,7 @@ if __name__ == '__main__':
                 print("Hyp:", transcript.lower())
                 print("WER:", float(wer_inst) / len(reference.split()),
                       "CER:", float(cer_inst) / len(reference.replace(' ', '')), "\n")
+    decoder.close()
     wer = float(total_wer) / num_tokens
     cer = float(total_cer) / num_chars
 
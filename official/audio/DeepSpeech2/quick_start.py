@@ -19,6 +19,7 @@ import numpy as np
 from src.qs_config import quickstart_config
 from src.deepspeech2 import DeepSpeechModel, PredictWithSoftmax
 from src.dataset import create_dataset
+from src.ctc_decoder import create_decoder
 from src.greedydecoder import MSGreedyDecoder
 from mindspore import context
 from mindspore.train.serialization import load_checkpoint, load_param_into_net
@@ -61,10 +62,7 @@ if __name__ == '__main__':
     load_param_into_net(model, param_dict_new)
     print('Successfully loading the pre-trained model')
 
-    if config.LMConfig.decoder_type == 'greedy':
-        decoder = MSGreedyDecoder(labels=labels, blank_index=labels.index('_'))
-    else:
-        raise NotImplementedError("Only greedy decoder is supported now")
+    decoder = create_decoder(labels, config.LMConfig)
     target_decoder = MSGreedyDecoder(labels, blank_index=labels.index('_'))
 
     model.set_train(False)
@@ -96,3 +94,4 @@ if __name__ == '__main__':
             num_chars += len(reference.replace(' ', ''))
             print("真实文本:", reference.lower())
             print("预测文本:", transcript.lower())
+    decoder.close()
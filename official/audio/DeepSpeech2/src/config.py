@@ -28,6 +28,11 @@ train_config = ed({
         # "val_manifest": 'data/libri_val_manifest.csv',
         "batch_size": 20,
         "labels_path": "labels.json",
+        # spectrogram cache directory, '' means the spectrograms are computed in every epoch
+        "cache_dir": '',
+        # pad lengths of the input batches, e.g. [250, 500, 750, 1000, 1250], [] means all the batches are padded
+        # to 1250 frames. The data sink mode is turned off when it is set.
+        "bucket_boundaries": [],
 
         "SpectConfig": {
             "sample_rate": 16000,
@@ -82,6 +87,9 @@ eval_config = ed({
         # "test_manifest": 'data/libri_val_manifest.csv',
         "batch_size": 20,
         "labels_path": "labels.json",
+        "cache_dir": '',
+        # pad lengths of the input batches, [] means all the batches are padded to 3500 frames
+        "bucket_boundaries": [500, 1000, 1500, 2000, 2500, 3000, 3500],
 
         "SpectConfig": {
             "sample_rate": 16000,
@@ -0,0 +1,357 @@
+# Copyright 2022 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""
+CTC greedy and prefix beam search decoders with optional n-gram language model
+"""
+import multiprocessing
+
+import numpy as np
+
+from src.ngram_lm import NGramLanguageModel
+
+NEG_INF = -np.inf
+
+
+def edit_distance(s1, s2):
+    """Levenshtein distance between two sequences"""
+    previous = list(range(len(s2) + 1))
+    for i, c1 in enumerate(s1, 1):
+        current = [i]
+        for j, c2 in enumerate(s2, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (c1 != c2)))
+        previous = current
+    return previous[-1]
+
+
+def to_numpy(x):
+    return x.asnumpy() if hasattr(x, 'asnumpy') else np.asarray(x)
+
+
+class Decoder:
+    """
+    Base class of the decoders, which turns the model outputs into strings and measures WER and CER.
+
+    Args:
+        labels (list): Characters of the output classes.
+        blank_index (int): Index of the CTC blank. Default: 0.
+    """
+
+    def __init__(self, labels, blank_index=0):
+        self.labels = labels
+        self.int_to_char = dict(enumerate(labels))
+        self.blank_index = blank_index
+        self.space_index = labels.index(' ') if ' ' in labels else len(labels)
+
+    def wer(self, s1, s2):
+        """Word level edit distance between two sentences"""
+        return edit_distance(s1.split(), s2.split())
+
+    def cer(self, s1, s2):
+        """Character level edit distance between two sentences, without spaces"""
+        return edit_distance(s1.replace(' ', ''), s2.replace(' ', ''))
+
+    def decode(self, probs, sizes=None):
+        raise NotImplementedError
+
+    def close(self):
+        """Release the resources of the decoder"""
+
+
+class GreedyDecoder(Decoder):
+    """Best path decoding, the argmax over the batch and the collapse of the repeats are vectorized."""
+
+    def process_string(self, sequence, size, remove_repetitions=False):
+        """Turn the label ids of a sequence into a string and the positions of the characters."""
+        sequence = np.asarray(sequence[:size], dtype=np.int64).reshape(-1)
+        keep = sequence != self.blank_index
+        if remove_repetitions and len(sequence) > 1:
+            keep[1:] &= sequence[1:] != sequence[:-1]
+        offsets = np.flatnonzero(keep)
+        return ''.join(self.int_to_char[i] for i in sequence[offsets]), offsets.tolist()
+
+    def convert_to_strings(self, sequences, sizes=None, remove_repetitions=False, return_offsets=False):
+        """Turn label id sequences into [[string]] for each sequence, with [[offsets]] if return_offsets."""
+        strings, offsets = [], []
+        for i, sequence in enumerate(sequences):
+            size = int(sizes[i]) if sizes is not None else len(sequence)
+            string, string_offsets = self.process_string(sequence, size, remove_repetitions)
+            strings.append([string])
+            offsets.append([string_offsets])
+        if return_offsets:
+            return strings, offsets
+        return strings
+
+    def decode(self, probs, sizes=None):
+        """
+        Decode the batch of output probabilities.
+
+        Args:
+            probs (Tensor): Probabilities with shape [batch, time, num_labels].
+            sizes (Tensor): Number of valid frames of each utterance. Default: None.
+
+        Returns:
+            [[string]] and [[offsets]] of each utterance.
+        """
+        max_probs = np.argmax(to_numpy(probs), axis=-1)
+        sizes = None if sizes is None else to_numpy(sizes)
+        return self.convert_to_strings(max_probs, sizes, remove_repetitions=True, return_offsets=True)
+
+
+class _PrefixTrie:
+    """The prefixes of the beams, a prefix is a node and a character extends it to a child node."""
+
+    def __init__(self, lm_context):
+        self.parent = np.full(1024, -1, dtype=np.int64)
+        self.char = np.full(1024, -1, dtype=np.int64)
+        self.time = np.zeros(1024, dtype=np.int64)
+        # Language model score of the unfinished word of the node, nan until it is needed
+        self.word_score = np.full(1024, np.nan)
+        self.children = {}
+        # Per node: context of the next word and the unfinished word, only used with the language model
+        self.lm_context = [lm_context]
+        self.word = ['']
+        self.size = 1
+
+    def child(self, node, char, time):
+        key = (node, char)
+        child = self.children.get(key)
+        if child is None:
+            if self.size == len(self.parent):
+                self.parent = np.concatenate([self.parent, np.full(self.size, -1, dtype=np.int64)])
+                self.char = np.concatenate([self.char, np.full(self.size, -1, dtype=np.int64)])
+                self.time = np.concatenate([self.time, np.zeros(self.size, dtype=np.int64)])
+                self.word_score = np.concatenate([self.word_score, np.full(self.size, np.nan)])
+            child = self.size
+            self.size += 1
+            self.parent[child] = node
+            self.char[child] = char
+            self.time[child] = time
+            self.children[key] = child
+            self.lm_context.append(None)
+            self.word.append('')
+        return child
+
+    def path(self, node):
+        chars, times = [], []
+        while node > 0:
+            chars.append(int(self.char[node]))
+            times.append(int(self.time[node]))
+            node = int(self.parent[node])
+        return chars[::-1], times[::-1]
+
+
+class BeamCTCDecoder(Decoder):
+    """
+    CTC prefix beam search with optional shallow fusion of an ARPA n-gram language model.
+
+    In each frame only the cutoff_top_n most likely characters, within the cumulative probability cutoff_prob,
+    extend the beams, and the beam_width best prefixes are kept. The extensions of all the beams are scored at
+    once on [beam_width, num_chars] arrays. With a language model, a word is scored when the space after it is
+    emitted (and the last word at the end), and the score of a prefix is
+    log P_ctc + alpha * log P_lm + beta * num_words. The utterances of a batch are decoded by num_processes
+    worker processes.
+
+    Args:
+        labels (list): Characters of the output classes.
+        lm_path (str): Path of the ARPA language model, None means no language model. Default: None.
+        alpha (float): Weight of the language model. Default: 0.
+        beta (float): Word insertion bonus. Default: 0.
+        cutoff_top_n (int): Number of characters considered in each frame. Default: 40.
+        cutoff_prob (float): Cumulative probability of the characters considered in each frame. Default: 1.0.
+        beam_width (int): Number of prefixes kept. Default: 100.
+        num_processes (int): Number of worker processes, 0 or 1 decodes in this process. Default: 4.
+        blank_index (int): Index of the CTC blank. Default: 0.
+        top_paths (int): Number of decoded strings returned for each utterance. Default: 1.
+    """
+
+    def __init__(self, labels, lm_path=None, alpha=0, beta=0, cutoff_top_n=40, cutoff_prob=1.0,
+                 beam_width=100, num_processes=4, blank_index=0, top_paths=1):
+        super(BeamCTCDecoder, self).__init__(labels, blank_index)
+        self.lm = NGramLanguageModel(lm_path) if lm_path else None
+        self.alpha = alpha
+        self.beta = beta
+        self.cutoff_top_n = cutoff_top_n
+        self.cutoff_prob = cutoff_prob
+        self.beam_width = beam_width
+        self.num_processes = num_processes
+        self.top_paths = top_paths
+        self.pool = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['pool'] = None
+        return state
+
+    def _pruned_chars(self, probs):
+        """The characters considered in a frame, the blank is handled apart from them."""
+        order = np.argsort(-probs, kind='stable')[:self.cutoff_top_n]
+        if self.cutoff_prob < 1.0:
+            cumulative = np.cumsum(probs[order])
+            order = order[:np.searchsorted(cumulative, self.cutoff_prob) + 1]
+        return order[order != self.blank_index]
+
+    def _word_scores(self, trie, nodes):
+        """alpha * log P_lm + beta of the unfinished word of each node, 0 for the nodes without one."""
+        scores = trie.word_score[nodes]
+        for i in np.flatnonzero(np.isnan(scores)):
+            node = nodes[i]
+            scores[i] = 0.0
+            if trie.word[node]:
+                log_prob, _ = self.lm.score(trie.lm_context[node], trie.word[node])
+                scores[i] = self.alpha * log_prob + self.beta
+            trie.word_score[node] = scores[i]
+        return scores
+
+    def decode_utterance(self, probs):
+        """
+        Decode the probabilities of one utterance with shape [time, num_labels].
+
+        Returns:
+            top_paths strings and the frame of each of their characters, in descending order of score.
+        """
+        log_probs = np.log(np.maximum(probs.astype(np.float64), 1e-30))
+        trie = _PrefixTrie(self.lm.start_context() if self.lm is not None else ())
+        # Beams: prefix node, log probability ending in blank and in non-blank, language model score
+        nodes = np.zeros(1, dtype=np.int64)
+        p_b = np.zeros(1)
+        p_nb = np.full(1, NEG_INF)
+        lm_scores = np.zeros(1)
+        position = np.full(1024, -1, dtype=np.int64)
+        for t in range(len(log_probs)):
+            chars = self._pruned_chars(probs[t])
+            char_pos = np.full(len(self.labels), -1, dtype=np.int64)
+            char_pos[chars] = np.arange(len(chars))
+            last = np.where(nodes > 0, trie.char[nodes], -1)
+            p_total = np.logaddexp(p_b, p_nb)
+
+            # The prefix stays: a blank, or a repeat of its last character
+            stay_b = p_total + log_probs[t, self.blank_index]
+            stay_nb = np.where(last >= 0, p_nb + log_probs[t, np.maximum(last, 0)], NEG_INF)
+            # The prefix is extended, a repeated character only follows a blank
+            same = chars[None, :] == last[:, None]
+            ext_nb = np.where(same, p_b[:, None], p_total[:, None]) + log_probs[t, chars][None, :]
+            ext_lm = np.repeat(lm_scores[:, None], len(chars), axis=1)
+            if self.lm is not None and self.space_index in chars:
+                ext_lm[:, char_pos[self.space_index]] += self._word_scores(trie, nodes)
+
+            # An extension which is another beam is merged into that beam
+            if len(position) < trie.size:
+                position = np.full(2 * trie.size, -1, dtype=np.int64)
+            position[nodes] = np.arange(len(nodes))
+            parent_pos = np.where(nodes > 0, position[trie.parent[nodes]], -1)
+            merge = np.flatnonzero((parent_pos >= 0) & (char_pos[np.maximum(last, 0)] >= 0) & (last >= 0))
+            if len(merge):
+                merge_cols = char_pos[last[merge]]
+                stay_nb[merge] = np.logaddexp(stay_nb[merge], ext_nb[parent_pos[merge], merge_cols])
+                ext_nb[parent_pos[merge], merge_cols] = NEG_INF
+            position[nodes] = -1
+
+            stay_score = np.logaddexp(stay_b, stay_nb) + lm_scores
+            scores = np.concatenate([stay_score, (ext_nb + ext_lm).reshape(-1)])
+            keep = min(self.beam_width, np.count_nonzero(scores > NEG_INF))
+            best = np.argpartition(-scores, keep - 1)[:keep] if keep < len(scores) else np.arange(len(scores))
+            best = best[scores[best] > NEG_INF]
+
+            stays = best[best < len(nodes)]
+            exts = best[best >= len(nodes)] - len(nodes)
+            ext_beams, ext_cols = exts // len(chars), exts % len(chars)
+            new_nodes = np.empty(len(exts), dtype=np.int64)
+            for i, (beam, col) in enumerate(zip(ext_beams, ext_cols)):
+                new_nodes[i] = self._extend(trie, int(nodes[beam]), int(chars[col]), t)
+            nodes = np.concatenate([nodes[stays], new_nodes])
+            p_b = np.concatenate([stay_b[stays], np.full(len(exts), NEG_INF)])
+            p_nb = np.concatenate([stay_nb[stays], ext_nb[ext_beams, ext_cols]])
+            lm_scores = np.concatenate([lm_scores[stays], ext_lm[ext_beams, ext_cols]])
+
+        final = np.logaddexp(p_b, p_nb) + lm_scores
+        if self.lm is not None:
+            final += self._word_scores(trie, nodes)
+        results = []
+        for beam in np.argsort(-final, kind='stable')[:self.top_paths]:
+            chars, times = trie.path(int(nodes[beam]))
+            results.append((''.join(self.int_to_char[c] for c in chars), times))
+        return results
+
+    def _extend(self, trie, node, char, time):
+        child = trie.child(node, char, time)
+        if self.lm is not None and trie.lm_context[child] is None:
+            if char == self.space_index:
+                context = trie.lm_context[node]
+                if trie.word[node]:
+                    _, context = self.lm.score(context, trie.word[node])
+                trie.lm_context[child] = context
+                trie.word[child] = ''
+            else:
+                trie.lm_context[child] = trie.lm_context[node]
+                trie.word[child] = trie.word[node] + self.int_to_char[char]
+        return child
+
+    def decode(self, probs, sizes=None):
+        """
+        Decode the batch of output probabilities.
+
+        Args:
+            probs (Tensor): Probabilities with shape [batch, time, num_labels].
+            sizes (Tensor): Number of valid frames of each utterance. Default: None.
+
+        Returns:
+            [[top_paths strings]] and [[frames of their characters]] of each utterance.
+        """
+        probs = to_numpy(probs)
+        sizes = to_numpy(sizes) if sizes is not None else np.full(len(probs), probs.shape[1])
+        utterances = [probs[i, :int(sizes[i])] for i in range(len(probs))]
+        if self.num_processes > 1 and len(utterances) > 1:
+            if self.pool is None:
+                self.pool = multiprocessing.Pool(self.num_processes, _init_worker, (self,))
+            results = self.pool.map(_decode_in_worker, utterances)
+        else:
+            results = [self.decode_utterance(utterance) for utterance in utterances]
+        strings = [[string for string, _ in result] for result in results]
+        offsets = [[times for _, times in result] for result in results]
+        return strings, offsets
+
+    def close(self):
+        """Stop the worker processes"""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+_worker_decoder = None
+
+
+def _init_worker(decoder):
+    global _worker_decoder
+    _worker_decoder = decoder
+
+
+def _decode_in_worker(probs):
+    return _worker_decoder.decode_utterance(probs)
+
+
+def create_decoder(labels, lm_config):
+    """Create the decoder of LMConfig.decoder_type, 'greedy' or 'beam'."""
+    blank_index = labels.index('_')
+    if lm_config.decoder_type == 'greedy':
+        return GreedyDecoder(labels, blank_index=blank_index)
+    if lm_config.decoder_type == 'beam':
+        return BeamCTCDecoder(labels, lm_path=lm_config.get('lm_path'), alpha=lm_config.get('alpha', 0),
+                              beta=lm_config.get('beta', 0), cutoff_top_n=lm_config.get('cutoff_top_n', 40),
+                              cutoff_prob=lm_config.get('cutoff_prob', 1.0),
+                              beam_width=lm_config.get('beam_width', 100),
+                              num_processes=lm_config.get('lm_workers', 4), blank_index=blank_index,
+                              top_paths=lm_config.get('top_paths', 1))
+    raise ValueError("decoder_type should be 'greedy' or 'beam', but got {}".format(lm_config.decoder_type))
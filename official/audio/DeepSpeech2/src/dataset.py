@@ -15,7 +15,10 @@
 """
 Create train or eval dataset.
 """
+import hashlib
+import json
 import math
+import os
 
 import numpy as np
 import mindspore.dataset.engine as de
@@ -27,6 +30,46 @@ TRAIN_LABEL_PAD_LENGTH = 350
 TEST_INPUT_PAD_LENGTH = 3500
 
 
+class SpectrogramCache():
+    """
+    On-disk cache of the spectrograms, each in a .npy file named by the hash of the audio path, size and
+    modification time and of the audio config, so a changed file or config is computed again. The cached
+    spectrograms are loaded memory-mapped.
+
+    Args:
+        cache_dir (str): Directory of the cache.
+        audio_conf: Config containing the sample rate, window and the window length/stride in seconds
+        normalize: Whether the spectrograms are normalized
+    """
+
+    def __init__(self, cache_dir, audio_conf, normalize):
+        self.cache_dir = cache_dir
+        self.conf_key = [audio_conf.sample_rate, audio_conf.window_size, audio_conf.window_stride,
+                         audio_conf.window, bool(normalize)]
+
+    def cache_path(self, audio_path):
+        stat = os.stat(audio_path)
+        key = json.dumps([os.path.abspath(audio_path), stat.st_size, stat.st_mtime_ns] + self.conf_key)
+        key = hashlib.sha1(key.encode('utf8')).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + '.npy')
+
+    def get(self, audio_path, parse_fn):
+        """
+        Load the cached spectrogram of the audio, or compute it with parse_fn and cache it.
+        """
+        path = self.cache_path(audio_path)
+        if os.path.exists(path):
+            return np.load(path, mmap_mode='r')
+        spect = parse_fn(audio_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first, so other workers never read a partial file
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            np.save(f, spect)
+        os.replace(tmp_path, path)
+        return spect
+
+
 class LoadAudioAndTranscript():
     """
     parse audio and transcript
@@ -43,6 +86,7 @@ class LoadAudioAndTranscript():
         self.window = audio_conf.window
         self.is_normalization = normalize
         self.labels = labels
+        self.cache = None
 
     def load_audio(self, path):
         """
@@ -74,6 +118,21 @@ class LoadAudioAndTranscript():
             mag = (mag - mean) / std
         return mag
 
+    def load_spect(self, audio_path):
+        """
+        load the spectrogram from the cache if there is one, otherwise parse the audio
+        """
+        if self.cache is None:
+            return self.parse_audio(audio_path)
+        return self.cache.get(audio_path, self.parse_audio)
+
+    def num_frames(self, audio_path):
+        """
+        number of spectrogram frames of the audio, which only reads the audio header
+        """
+        hop_length = int(self.sample_rate * self.window_stride)
+        return 1 + sf.info(audio_path).frames // hop_length
+
     def parse_transcript(self, transcript_path):
         with open(transcript_path, 'r', encoding='utf8') as transcript_file:
             transcript = transcript_file.read().replace('\n', '')
@@ -91,6 +150,11 @@ class ASRDataset(LoadAudioAndTranscript):
             labels (list): List containing all the possible characters to map to
             normalize: Apply standard mean and deviation Normalization to audio tensor
             batch_size (int): Dataset batch size (default=32)
+            is_training (bool): Whether dataset is use for train or eval (default=True).
+            cache_dir (str): Directory of the spectrogram cache, None or '' means no cache (default=None).
+            bucket_boundaries (list): Ascending pad lengths of the inputs. The utterances are sorted by length
+                before batching and every batch is padded to the smallest boundary not shorter than it, None or
+                empty means the fixed TRAIN_INPUT_PAD_LENGTH / TEST_INPUT_PAD_LENGTH (default=None).
         """
 
     def __init__(self, audio_conf=None,
@@ -98,7 +162,9 @@ class ASRDataset(LoadAudioAndTranscript):
                  labels=None,
                  normalize=False,
                  batch_size=32,
-                 is_training=True):
+                 is_training=True,
+                 cache_dir=None,
+                 bucket_boundaries=None):
         # with open(manifest_filepath) as f:
         #     json_file = json.load(f)
         #
@@ -110,6 +176,14 @@ class ASRDataset(LoadAudioAndTranscript):
 
         ids = [x.strip().split(',') for x in ids]
         self.is_training = is_training
+        self.labels_map = {labels[i]: i for i in range(len(labels))}
+        super(ASRDataset, self).__init__(audio_conf, normalize, self.labels_map)
+        if cache_dir:
+            self.cache = SpectrogramCache(cache_dir, audio_conf, normalize)
+        self.bucket_boundaries = sorted(bucket_boundaries) if bucket_boundaries else []
+        if self.bucket_boundaries:
+            lengths = [self.num_frames(x[0]) for x in ids]
+            ids = [ids[i] for i in np.argsort(lengths, kind='stable')]
         self.ids = ids
         self.blank_id = int(labels.index('_'))
         self.bins = [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
@@ -118,27 +192,37 @@ class ASRDataset(LoadAudioAndTranscript):
             self.bins.append(ids[-batch_size:])
         self.size = len(self.bins)
         self.batch_size = batch_size
-        self.labels_map = {labels[i]: i for i in range(len(labels))}
-        super(ASRDataset, self).__init__(audio_conf, normalize, self.labels_map)
+
+    def pad_length(self, length, max_length):
+        """
+        the smallest bucket boundary not shorter than length, max_length if there is none
+        """
+        for boundary in self.bucket_boundaries:
+            if length <= boundary:
+                return min(boundary, max_length)
+        return max_length
 
     def __getitem__(self, index):
         batch_idx = self.bins[index]
         batch_size = len(batch_idx)
-        batch_spect, batch_script, target_indices = [], [], []
+        batch_spect, batch_script = [], []
         input_length = np.zeros(batch_size, np.float32)
         for data in batch_idx:
             # audio_path, transcript_path = os.path.join(self.root_path, data[0]), os.path.join(self.root_path, data[1])
             audio_path, transcript_path = data[0], data[1]
-            spect = self.parse_audio(audio_path)
+            spect = self.load_spect(audio_path)
             transcript = self.parse_transcript(transcript_path)
             batch_spect.append(spect)
             batch_script.append(transcript)
         freq_size = np.shape(batch_spect[-1])[0]
+        max_length = max(np.shape(spect_)[1] for spect_ in batch_spect)
 
         if self.is_training:
             # 1501 is the max length in train dataset(LibriSpeech).
-            # The length is fixed to this value because Mindspore does not support dynamic shape currently
-            inputs = np.zeros((batch_size, 1, freq_size, TRAIN_INPUT_PAD_LENGTH), dtype=np.float32)
+            # The length is fixed to this value because Mindspore does not support dynamic shape currently,
+            # with bucket_boundaries the batch is padded to one of a few lengths instead
+            pad_length = self.pad_length(max_length, TRAIN_INPUT_PAD_LENGTH)
+            inputs = np.zeros((batch_size, 1, freq_size, pad_length), dtype=np.float32)
             # The target length is fixed to this value because Mindspore does not support dynamic shape currently
             # 350 may be greater than the max length of labels in train dataset(LibriSpeech).
             targets = np.ones((self.batch_size, TRAIN_LABEL_PAD_LENGTH), dtype=np.int32) * self.blank_id
@@ -148,29 +232,33 @@ class ASRDataset(LoadAudioAndTranscript):
                 # input_length[k] = seq_length
                 script_length = len(scripts_)
                 targets[k, :script_length] = scripts_
-                for m in range(350):
-                    target_indices.append([k, m])
-                if seq_length <= TRAIN_INPUT_PAD_LENGTH:
+                if seq_length <= pad_length:
                     input_length[k] = seq_length
                     inputs[k, 0, :, 0:seq_length] = spect_[:, :seq_length]
                 else:
-                    maxstart = seq_length - TRAIN_INPUT_PAD_LENGTH
+                    maxstart = seq_length - pad_length
                     start = np.random.randint(maxstart)
-                    input_length[k] = TRAIN_INPUT_PAD_LENGTH
-                    inputs[k, 0, :, 0:TRAIN_INPUT_PAD_LENGTH] = spect_[:, start:start + TRAIN_INPUT_PAD_LENGTH]
+                    input_length[k] = pad_length
+                    inputs[k, 0, :, 0:pad_length] = spect_[:, start:start + pad_length]
             targets = np.reshape(targets, (-1,))
+            # [k, m] for m in range(TRAIN_LABEL_PAD_LENGTH) of each sample k
+            target_indices = np.stack(np.meshgrid(np.arange(batch_size), np.arange(TRAIN_LABEL_PAD_LENGTH),
+                                                  indexing='ij'), axis=-1).reshape(-1, 2)
         else:
-            inputs = np.zeros((batch_size, 1, freq_size, TEST_INPUT_PAD_LENGTH), dtype=np.float32)
-            targets = []
-            for k, spect_, scripts_ in zip(range(batch_size), batch_spect, batch_script):
+            pad_length = self.pad_length(max_length, TEST_INPUT_PAD_LENGTH)
+            inputs = np.zeros((batch_size, 1, freq_size, pad_length), dtype=np.float32)
+            for k, spect_ in zip(range(batch_size), batch_spect):
                 seq_length = np.shape(spect_)[1]
                 input_length[k] = seq_length
-                targets.extend(scripts_)
-                for m in range(len(scripts_)):
-                    target_indices.append([k, m])
                 inputs[k, 0, :, 0:seq_length] = spect_
+            targets = np.concatenate([np.asarray(scripts_, dtype=np.int32) for scripts_ in batch_script])
+            # [k, m] for m in range(len(scripts_)) of each sample k
+            script_lengths = np.array([len(scripts_) for scripts_ in batch_script], dtype=np.int64)
+            script_starts = np.repeat(np.cumsum(script_lengths) - script_lengths, script_lengths)
+            target_indices = np.stack([np.repeat(np.arange(batch_size), script_lengths),
+                                       np.arange(len(targets)) - script_starts], axis=-1)
 
-        return inputs, input_length, np.array(target_indices, dtype=np.int64), np.array(targets, dtype=np.int32)
+        return inputs, input_length, target_indices.astype(np.int64), targets.astype(np.int32)
 
     def __len__(self):
         return self.size
@@ -208,7 +296,7 @@ class DistributedSampler():
 
 
 def create_dataset(audio_conf, manifest_filepath, labels, normalize, batch_size, train_mode=True,
-                   rank=None, group_size=None):
+                   rank=None, group_size=None, cache_dir=None, bucket_boundaries=None):
     """
     create train dataset
 
@@ -221,13 +309,17 @@ def create_dataset(audio_conf, manifest_filepath, labels, normalize, batch_size,
         batch_size (int): Dataset batch size
         rank (int): The shard ID within num_shards (default=None).
         group_size (int): Number of shards that the dataset should be divided into (default=None).
+        cache_dir (str): Directory of the spectrogram cache, None or '' means no cache (default=None).
+        bucket_boundaries (list): Ascending pad lengths of the inputs, None or empty means the fixed pad length
+            (default=None).
 
     Returns:
         Dataset.
     """
 
     dataset = ASRDataset(audio_conf=audio_conf, manifest_filepath=manifest_filepath, labels=labels, normalize=normalize,
-                         batch_size=batch_size, is_training=train_mode)
+                         batch_size=batch_size, is_training=train_mode, cache_dir=cache_dir,
+                         bucket_boundaries=bucket_boundaries)
 
     sampler = DistributedSampler(dataset, rank, group_size, shuffle=True)
 
@@ -24,6 +24,7 @@ from mindspore.train.callback import Callback
 from src.config import eval_config
 from src.dataset import create_dataset
 from src.deepspeech2 import PredictWithSoftmax, DeepSpeechModel
+from src.ctc_decoder import create_decoder
 from src.greedydecoder import MSGreedyDecoder
 
 
@@ -52,14 +53,12 @@ class SaveCallback(Callback):
         self.ds_eval = create_dataset(audio_conf=self.config.DataConfig.SpectConfig,
                                       manifest_filepath=self.config.DataConfig.test_manifest,
                                       labels=self.labels, normalize=True, train_mode=False,
-                                      batch_size=self.config.DataConfig.batch_size, rank=0, group_size=1)
+                                      batch_size=self.config.DataConfig.batch_size, rank=0, group_size=1,
+                                      cache_dir=self.config.DataConfig.cache_dir,
+                                      bucket_boundaries=self.config.DataConfig.bucket_boundaries)
         self.wer = float('inf')
         self.cer = float('inf')
-        if self.config.LMConfig.decoder_type == 'greedy':
-            self.decoder = MSGreedyDecoder(
-                labels=self.labels, blank_index=self.labels.index('_'))
-        else:
-            raise NotImplementedError("Only greedy decoder is supported now")
+        self.decoder = create_decoder(self.labels, self.config.LMConfig)
         self.target_decoder = MSGreedyDecoder(
             self.labels, blank_index=self.labels.index('_'))
         self.path = path
@@ -146,6 +145,12 @@ class SaveCallback(Callback):
                  {}".format(cur_epoch, self.wer, self.cer)
                 self.logger.info(message)
 
+    def end(self, run_context):
+        """
+        stop the worker processes of the beam search decoder
+        """
+        self.decoder.close()
+
     def init_logger(self):
         self.logger.setLevel(level=logging.INFO)
         handler = logging.FileHandler('eval_callback.log')
@@ -0,0 +1,167 @@
+# Copyright 2022 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""
+ARPA n-gram language model stored in a sorted array trie
+"""
+import math
+
+import numpy as np
+
+LOG_10 = math.log(10)
+# KenLM scores the words out of the vocabulary with log10 probability -100 if the model has no <unk>
+UNK_LOG10_PROB = -100.0
+
+
+class NGramLanguageModel:
+    """
+    Back-off n-gram language model loaded from an ARPA file.
+
+    The n-grams of each order are kept in numpy arrays sorted by key = parent * vocab_size + word, where parent
+    is the index of the (n-1)-gram prefix in the arrays of the previous order and the 1-grams are indexed by the
+    word id, so a lookup is one binary search per order and the model takes about 16 bytes per n-gram.
+
+    Args:
+        arpa_path (str): Path of the ARPA file.
+    """
+
+    def __init__(self, arpa_path):
+        self.vocab = {}
+        self.keys = []
+        self.log_probs = []
+        self.backoffs = []
+        self._load(arpa_path)
+        self.order = len(self.log_probs)
+        self.vocab_size = len(self.vocab)
+        self.unk_id = self.vocab.get('<unk>', -1)
+        self.bos_id = self.vocab.get('<s>', -1)
+        self.eos_id = self.vocab.get('</s>', -1)
+        self.cache = {}
+
+    def _load(self, arpa_path):
+        """Read the ARPA sections order by order, the prefixes of an order are looked up in the previous one."""
+        counts = []
+        with open(arpa_path, encoding='utf-8') as f:
+            line = f.readline()
+            while line and line.strip() != '\\data\\':
+                line = f.readline()
+            for line in f:
+                line = line.strip()
+                if line.startswith('ngram '):
+                    counts.append(int(line.split('=')[1]))
+                elif line.startswith('\\'):
+                    break
+            for order in range(1, len(counts) + 1):
+                words, log_probs, backoffs = [], [], []
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    if line.startswith('\\'):
+                        break
+                    fields = line.split()
+                    log_probs.append(float(fields[0]))
+                    words.append(fields[1:order + 1])
+                    backoffs.append(float(fields[order + 1]) if len(fields) > order + 1 else 0.0)
+                if len(words) != counts[order - 1]:
+                    raise ValueError("{} has {} {}-grams, but the header says {}".format(
+                        arpa_path, len(words), order, counts[order - 1]))
+                self._add_order(order, words, np.array(log_probs, dtype=np.float32),
+                                np.array(backoffs, dtype=np.float32))
+
+    def _add_order(self, order, words, log_probs, backoffs):
+        if order == 1:
+            for (word,) in words:
+                self.vocab.setdefault(word, len(self.vocab))
+            ids = np.array([self.vocab[word] for (word,) in words], dtype=np.int64)
+            # The 1-grams are indexed by the word id directly
+            self.keys.append(np.arange(len(self.vocab), dtype=np.int64))
+            self.log_probs.append(np.full(len(self.vocab), UNK_LOG10_PROB, dtype=np.float32))
+            self.backoffs.append(np.zeros(len(self.vocab), dtype=np.float32))
+            self.log_probs[0][ids] = log_probs
+            self.backoffs[0][ids] = backoffs
+            return
+        ids = np.array([[self.vocab[word] for word in gram] for gram in words], dtype=np.int64)
+        parents = ids[:, 0]
+        for k in range(1, order - 1):
+            parents = self._lookup(k, parents, ids[:, k])
+        if np.any(parents < 0):
+            raise ValueError("the prefixes of some {}-grams are not in the model".format(order))
+        keys = parents * len(self.vocab) + ids[:, order - 1]
+        sort = np.argsort(keys, kind='stable')
+        self.keys.append(keys[sort])
+        self.log_probs.append(log_probs[sort])
+        self.backoffs.append(backoffs[sort])
+
+    def _lookup(self, k, parents, words):
+        """Return the index of the (k + 1)-grams (parent, word) in their arrays, -1 if not found."""
+        keys = self.keys[k]
+        query = parents * len(self.vocab) + words
+        pos = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+        return np.where((parents >= 0) & (keys[pos] == query), pos, -1)
+
+    def _find(self, ids):
+        """Return the index of the n-gram in the arrays of its order, -1 if not found."""
+        if min(ids) < 0:
+            # Out of vocabulary words (id -1 when the model has no <unk>) are in no n-gram, and their packed key
+            # parent * vocab_size - 1 would match the n-gram (parent - 1, vocab_size - 1)
+            return -1
+        node = ids[0]
+        for k in range(1, len(ids)):
+            keys = self.keys[k]
+            key = node * self.vocab_size + ids[k]
+            pos = int(np.searchsorted(keys, key))
+            if pos == len(keys) or keys[pos] != key:
+                return -1
+            node = pos
+        return node
+
+    def word_id(self, word):
+        return self.vocab.get(word, self.unk_id)
+
+    def start_context(self):
+        """Context of the first word of a sentence"""
+        return (self.bos_id,) if self.bos_id >= 0 else ()
+
+    def log10_prob(self, context, word_id):
+        """log10 P(word | context) with back-off, context is a tuple of word ids with the newest last."""
+        if word_id < 0:
+            return UNK_LOG10_PROB
+        context = context[-(self.order - 1):] if self.order > 1 else ()
+        backoff = 0.0
+        for start in range(len(context) + 1):
+            history = context[start:]
+            node = self._find(history + (word_id,))
+            if node >= 0:
+                return backoff + float(self.log_probs[len(history)][node])
+            if history:
+                history_node = self._find(history)
+                if history_node >= 0:
+                    backoff += float(self.backoffs[len(history) - 1][history_node])
+        return backoff + UNK_LOG10_PROB
+
+    def score(self, context, word):
+        """
+        Natural log probability of the word after the context, and the context of the next word.
+
+        Args:
+            context (tuple): Ids of the previous words, see start_context().
+            word (str): The word.
+        """
+        key = (context, word)
+        if key not in self.cache:
+            word_id = self.word_id(word)
+            next_context = (context + (word_id,))[max(0, len(context) + 2 - self.order):]
+            self.cache[key] = (self.log10_prob(context, word_id) * LOG_10, next_context)
+        return self.cache[key]
@@ -46,7 +46,8 @@ if __name__ == '__main__':
     rank_id = 0
     group_size = 1
     config = train_config
-    data_sink = (args.device_target != "CPU")
+    # The batches of different bucket lengths have different shapes, which the data sink mode does not support
+    data_sink = (args.device_target != "CPU") and not config.DataConfig.bucket_boundaries
     context.set_context(mode=context.GRAPH_MODE, device_target=args.device_target, save_graphs=False)
     if args.device_target == "GPU":
         context.set_context(enable_graph_kernel=True)
@@ -64,7 +65,9 @@ if __name__ == '__main__':
     ds_train = create_dataset(audio_conf=config.DataConfig.SpectConfig,
                               manifest_filepath=config.DataConfig.train_manifest,
                               labels=labels, normalize=True, train_mode=True,
-                              batch_size=config.DataConfig.batch_size, rank=rank_id, group_size=group_size)
+                              batch_size=config.DataConfig.batch_size, rank=rank_id, group_size=group_size,
+                              cache_dir=config.DataConfig.cache_dir,
+                              bucket_boundaries=config.DataConfig.bucket_boundaries)
     steps_size = ds_train.get_dataset_size()
 
     lr = get_lr(lr_init=config.OptimConfig.learning_rate, total_epochs=config.TrainingConfig.epochs,
@@ -0,0 +1,217 @@
+# Copyright 2022 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+""" Batched LPCNet synthesis of several feature files at a time """
+import time
+
+import numpy as np
+import mindspore
+
+from src.ulaw import lin2ulaw, ulaw2lin
+
+FRAME_SIZE = 160
+NB_FEATURES = 36
+NB_USED_FEATURES = 20
+ORDER = 16
+SAMPLE_RATE = 16000
+
+
+def load_features(feature_file):
+    """ Load the features of a file with shape [nb_frames, NB_FEATURES] """
+    features = np.fromfile(feature_file, dtype='float32')
+    return np.reshape(features, (-1, NB_FEATURES))
+
+
+def lpc_predict(history, lpc):
+    """ LPC prediction of each stream, history holds the last ORDER samples with the newest first """
+    return -np.sum(lpc * history, axis=1)
+
+
+def sample_ulaw(p, voicing, rng):
+    """
+    Sample the u-law excitation of each stream from the decoder distribution p with shape [batch, 256],
+    with the inverse CDF of a uniform sample instead of a multinomial draw per stream.
+    """
+    p = p.astype('float64')
+    # lower the temperature for voiced frames to reduce noisiness
+    p *= np.power(p, np.maximum(0, 1.5 * voicing - .5)[:, None])
+    p /= 1e-18 + np.sum(p, axis=1, keepdims=True)
+    # cut off the tail of the remaining distribution
+    p = np.maximum(p - 0.002, 0)
+    cdf = np.cumsum(p, axis=1)
+    u = rng.random_sample(len(p)) * cdf[:, -1]
+    return np.minimum(np.sum(cdf <= u[:, None], axis=1), p.shape[1] - 1)
+
+
+class PCMWriter:
+    """ Write the int16 samples of a stream to its file in blocks of at least block_size samples """
+    def __init__(self, out_file, block_size=16000):
+        self.fout = open(out_file, 'wb')
+        self.block_size = block_size
+        self.buffer = []
+        self.buffered = 0
+
+    def write(self, samples):
+        self.buffer.append(samples)
+        self.buffered += len(samples)
+        if self.buffered >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            np.concatenate(self.buffer).tofile(self.fout)
+        self.buffer = []
+        self.buffered = 0
+
+    def close(self):
+        self.flush()
+        self.fout.close()
+
+
+class _Stream:
+    """ Synthesis progress of a feature file """
+    def __init__(self, features, cfeat, writer):
+        self.features = features
+        self.cfeat = cfeat
+        self.writer = writer
+        self.frame = 0
+        # The first ORDER + 1 samples of a file are not synthesized
+        self.skip = ORDER + 1
+
+    @property
+    def done(self):
+        return self.frame >= len(self.features)
+
+
+class BatchSynthesizer:
+    """
+    Synthesize PCM from the features of several files at a time.
+
+    Every slot of the batch synthesizes one file, and a slot takes the next file at the frame boundary after its
+    file ends, so the decoder always runs with the same batch shape. The streams are independent: their rows of
+    the GRU states are not mixed, and the states of a slot are kept at zero until its new file starts, which is
+    the same as decoding each file alone. The LPC prediction, u-law conversion and sampling are vectorized over
+    the streams, and the samples are written to the files in blocks.
+
+    Args:
+        enc (Cell): Frame rate network.
+        dec (Cell): Sample rate network.
+        rnn_units1 (int): Units of the first GRU of dec. Default: 384.
+        rnn_units2 (int): Units of the second GRU of dec. Default: 16.
+        batch_size (int): Number of files synthesized at a time. Default: 8.
+        seed (int): Seed of the sampling. Default: None.
+        block_size (int): Minimum number of samples of each file write. Default: 16000.
+    """
+    def __init__(self, enc, dec, rnn_units1=384, rnn_units2=16, batch_size=8, seed=None, block_size=16000):
+        self.enc = enc
+        self.dec = dec
+        self.rnn_units1 = rnn_units1
+        self.rnn_units2 = rnn_units2
+        self.batch_size = batch_size
+        self.rng = np.random.RandomState(seed)
+        self.block_size = block_size
+        self.coef = 0.85
+
+    def _open(self, feature_file, out_file):
+        features = load_features(feature_file)
+        periods = (.1 + 50 * features[None, :, 18:19] + 100).astype('int32')
+        cfeat = self.enc(mindspore.Tensor(features[None, :, :NB_USED_FEATURES]), mindspore.Tensor(periods))
+        return _Stream(features, cfeat.asnumpy()[0], PCMWriter(out_file, self.block_size))
+
+    def synthesize(self, jobs):
+        """
+        Synthesize the files.
+
+        Args:
+            jobs (iterable): (feature_file, out_file) of each file.
+
+        Returns:
+            number of synthesized samples, elapsed seconds and real-time factor (elapsed / audio duration).
+        """
+        jobs = iter(jobs)
+        batch_size = self.batch_size
+        slots = [None] * batch_size
+        fexc = np.full((batch_size, 3), 128, dtype='int32')
+        history = np.zeros((batch_size, ORDER))
+        mem = np.zeros(batch_size)
+        state1 = mindspore.Tensor(np.zeros((1, batch_size, self.rnn_units1), dtype='float32'))
+        state2 = mindspore.Tensor(np.zeros((1, batch_size, self.rnn_units2), dtype='float32'))
+        cfeat_dim = None
+        num_samples = 0
+        start_time = time.time()
+        while True:
+            keep = np.ones(batch_size, dtype='float32')
+            for b in range(batch_size):
+                while slots[b] is None or slots[b].done:
+                    if slots[b] is not None:
+                        slots[b].writer.close()
+                        slots[b] = None
+                    job = next(jobs, None)
+                    if job is None:
+                        break
+                    slots[b] = self._open(*job)
+                    cfeat_dim = slots[b].cfeat.shape[-1]
+                    fexc[b] = 128
+                    history[b] = 0
+                    mem[b] = 0
+                    keep[b] = 0
+            streams = [(b, s) for b, s in enumerate(slots) if s is not None]
+            if not streams:
+                break
+            if not np.all(keep):
+                # A new file starts from zero states
+                mask = mindspore.Tensor(keep[None, :, None])
+                state1 = state1 * mask
+                state2 = state2 * mask
+
+            cfeat = np.zeros((batch_size, 1, cfeat_dim), dtype=streams[0][1].cfeat.dtype)
+            lpc = np.zeros((batch_size, ORDER))
+            voicing = np.zeros(batch_size)
+            skip = np.full(batch_size, FRAME_SIZE)
+            for b, s in streams:
+                cfeat[b, 0] = s.cfeat[s.frame]
+                lpc[b] = s.features[s.frame, NB_FEATURES - ORDER:]
+                voicing[b] = s.features[s.frame, 19]
+                skip[b] = s.skip
+            cfeat = mindspore.Tensor(cfeat)
+            out = np.zeros((batch_size, FRAME_SIZE))
+            for i in range(np.min(skip), FRAME_SIZE):
+                live = skip <= i
+                pred = lpc_predict(history, lpc)
+                fexc[live, 1] = lin2ulaw(pred[live])
+
+                p, state1, state2 = self.dec(mindspore.Tensor(fexc[:, None, :]), cfeat, state1, state2)
+                if not np.all(live):
+                    # Keep the states of the slots which are not synthesizing at zero
+                    mask = mindspore.Tensor(live.astype('float32')[None, :, None])
+                    state1 = state1 * mask
+                    state2 = state2 * mask
+                exc = sample_ulaw(p.asnumpy()[:, 0, :], voicing, self.rng)
+
+                pcm = pred[live] + ulaw2lin(exc[live])
+                fexc[live, 2] = exc[live]
+                fexc[live, 0] = lin2ulaw(pcm)
+                history[live, 1:] = history[live, :-1]
+                history[live, 0] = pcm
+                mem[live] = self.coef * mem[live] + pcm
+                out[live, i] = np.round(mem[live])
+
+            for b, s in streams:
+                s.writer.write(out[b, s.skip:].astype('int16'))
+                num_samples += FRAME_SIZE - s.skip
+                s.frame += 1
+                s.skip = 0
+
+        elapsed = time.time() - start_time
+        return num_samples, elapsed, elapsed * SAMPLE_RATE / max(num_samples, 1)
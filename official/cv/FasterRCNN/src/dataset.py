@@ -17,6 +17,7 @@
 from __future__ import division
 
 import os
+import threading
 import numpy as np
 from numpy import random
 
@@ -48,27 +49,18 @@ def bbox_overlaps(bboxes1, bboxes2, mode='iou'):
     ious = np.zeros((rows, cols), dtype=np.float32)
     if rows * cols == 0:
         return ious
-    exchange = False
-    if bboxes1.shape[0] > bboxes2.shape[0]:
-        bboxes1, bboxes2 = bboxes2, bboxes1
-        ious = np.zeros((cols, rows), dtype=np.float32)
-        exchange = True
     area1 = (bboxes1[:, 2] - bboxes1[:, 0] + 1) * (bboxes1[:, 3] - bboxes1[:, 1] + 1)
     area2 = (bboxes2[:, 2] - bboxes2[:, 0] + 1) * (bboxes2[:, 3] - bboxes2[:, 1] + 1)
-    for i in range(bboxes1.shape[0]):
-        x_start = np.maximum(bboxes1[i, 0], bboxes2[:, 0])
-        y_start = np.maximum(bboxes1[i, 1], bboxes2[:, 1])
-        x_end = np.minimum(bboxes1[i, 2], bboxes2[:, 2])
-        y_end = np.minimum(bboxes1[i, 3], bboxes2[:, 3])
-        overlap = np.maximum(x_end - x_start + 1, 0) * np.maximum(
-            y_end - y_start + 1, 0)
-        if mode == 'iou':
-            union = area1[i] + area2 - overlap
-        else:
-            union = area1[i] if not exchange else area2
-        ious[i, :] = overlap / union
-    if exchange:
-        ious = ious.T
+    x_start = np.maximum(bboxes1[:, None, 0], bboxes2[None, :, 0])
+    y_start = np.maximum(bboxes1[:, None, 1], bboxes2[None, :, 1])
+    x_end = np.minimum(bboxes1[:, None, 2], bboxes2[None, :, 2])
+    y_end = np.minimum(bboxes1[:, None, 3], bboxes2[None, :, 3])
+    overlap = np.maximum(x_end - x_start + 1, 0) * np.maximum(y_end - y_start + 1, 0)
+    if mode == 'iou':
+        union = area1[:, None] + area2[None, :] - overlap
+    else:
+        union = area1[:, None]
+    np.divide(overlap, union, out=ious)
     return ious
 
 
@@ -79,16 +71,22 @@ class PhotoMetricDistortion:
                  brightness_delta=32,
                  contrast_range=(0.5, 1.5),
                  saturation_range=(0.5, 1.5),
-                 hue_delta=18):
+                 hue_delta=18,
+                 to_rgb=False):
         self.brightness_delta = brightness_delta
         self.contrast_lower, self.contrast_upper = contrast_range
         self.saturation_lower, self.saturation_upper = saturation_range
         self.hue_delta = hue_delta
+        # to_rgb means the input image is in RGB order rather than BGR
+        self.to_hsv = cv2.COLOR_RGB2HSV if to_rgb else cv2.COLOR_BGR2HSV
+        self.from_hsv = cv2.COLOR_HSV2RGB if to_rgb else cv2.COLOR_HSV2BGR
 
     def __call__(self, img, boxes, labels):
-        # random brightness
-        img = img.astype('float32')
+        # float32 images are distorted in place
+        if img.dtype != np.float32:
+            img = img.astype(np.float32)
 
+        # random brightness
         if random.randint(2):
             delta = random.uniform(-self.brightness_delta,
                                    self.brightness_delta)
@@ -103,8 +101,8 @@ class PhotoMetricDistortion:
                                        self.contrast_upper)
                 img *= alpha
 
-        # convert color from BGR to HSV
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+        # convert color to HSV
+        cv2.cvtColor(img, self.to_hsv, img)
 
         # random saturation
         if random.randint(2):
@@ -113,12 +111,13 @@ class PhotoMetricDistortion:
 
         # random hue
         if random.randint(2):
-            img[..., 0] += random.uniform(-self.hue_delta, self.hue_delta)
-            img[..., 0][img[..., 0] > 360] -= 360
-            img[..., 0][img[..., 0] < 0] += 360
+            hue = img[..., 0]
+            hue += random.uniform(-self.hue_delta, self.hue_delta)
+            hue[hue > 360] -= 360
+            hue[hue < 0] += 360
 
-        # convert color from HSV to BGR
-        img = cv2.cvtColor(img, cv2.COLOR_HSV2BGR)
+        # convert color from HSV
+        cv2.cvtColor(img, self.from_hsv, img)
 
         # random contrast
         if mode == 0:
@@ -129,7 +128,7 @@ class PhotoMetricDistortion:
 
         # randomly swap channels
         if random.randint(2):
-            img = img[..., random.permutation(3)]
+            img[...] = img[..., random.permutation(3)]
 
         return img, boxes, labels
 
@@ -160,10 +159,16 @@ class Expand:
         return img, boxes, labels
 
 
-def rescale_with_tuple(img, scale):
-    h, w = img.shape[:2]
+def rescale_size(h, w, scale):
+    """Get the (w, h) size and the scale factor of an image rescaled to fit scale."""
     scale_factor = min(max(scale) / max(h, w), min(scale) / min(h, w))
     new_size = int(w * float(scale_factor) + 0.5), int(h * float(scale_factor) + 0.5)
+    return new_size, scale_factor
+
+
+def rescale_with_tuple(img, scale):
+    h, w = img.shape[:2]
+    new_size, scale_factor = rescale_size(h, w, scale)
     rescaled_img = cv2.resize(img, new_size, interpolation=cv2.INTER_LINEAR)
 
     return rescaled_img, scale_factor
@@ -328,8 +333,119 @@ def expand_column(img, img_shape, gt_bboxes, gt_label, gt_num):
     return (img, img_shape, gt_bboxes, gt_label, gt_num)
 
 
-def preprocess_fn(image, box, is_training, config):
-    """Preprocess function for dataset."""
+class TrainAugmentation:
+    """
+    Fused training augmentation, which does expand, rescale or resize, photometric distortion, imnormalize,
+    flip and transpose in one stage.
+
+    The expanded canvas is never built, only the source image is resized to its place in the output, and the
+    normalized image is written straight into the padded CHW output. The decoded image is kept in RGB order,
+    which is what imnormalize_column converts the BGR image back to. The intermediate resized image is kept in
+    buffers reused by the calls of the same worker thread.
+
+    Args:
+        config: Config of the dataset, which uses img_width, img_height, keep_ratio, flip_ratio, expand_ratio
+            and photo_ratio.
+    """
+
+    def __init__(self, config):
+        self.img_width = config.img_width
+        self.img_height = config.img_height
+        self.keep_ratio = config.keep_ratio
+        self.flip_ratio = config.flip_ratio
+        self.expand_ratio = config.expand_ratio
+        self.photo_ratio = config.photo_ratio
+        self.expand = Expand()
+        self.photo = PhotoMetricDistortion(to_rgb=True)
+        # Computed from random subset of ImageNet training images
+        self.mean = np.array([123.675, 116.28, 103.53], dtype=np.float32)
+        self.std = np.array([58.395, 57.12, 57.375], dtype=np.float32)
+        self._local = threading.local()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def _buffer(self, name, shape, dtype):
+        """Get a view of the reusable buffer of the current thread."""
+        size = int(np.prod(shape))
+        buf = getattr(self._local, name, None)
+        if buf is None or buf.size < size:
+            buf = np.empty(size, dtype=dtype)
+            setattr(self._local, name, buf)
+        return buf[:size].reshape(shape)
+
+    def _expand_params(self, h, w):
+        """Random expand with the same random draws as Expand, return the expanded size and the image offset."""
+        if random.randint(2):
+            return h, w, 0, 0
+        ratio = random.uniform(self.expand.min_ratio, self.expand.max_ratio)
+        left = int(random.uniform(0, w * ratio - w))
+        top = int(random.uniform(0, h * ratio - h))
+        return int(h * ratio), int(w * ratio), left, top
+
+    def _output_scale(self, h, w):
+        """Get the size of the image in the output and the (x, y) scale of the boxes."""
+        if not self.keep_ratio:
+            return self.img_height, self.img_width, self.img_width / w, self.img_height / h
+        (new_w, new_h), scale_factor = rescale_size(h, w, (self.img_width, self.img_height))
+        if new_h > self.img_height:
+            (new_w, new_h), scale_factor2 = rescale_size(new_h, new_w, (self.img_height, self.img_height))
+            scale_factor = scale_factor * scale_factor2
+        return new_h, new_w, scale_factor, scale_factor
+
+    def __call__(self, image, gt_bboxes, gt_label, gt_num):
+        flip = (np.random.rand() < self.flip_ratio)
+        expand = (np.random.rand() < self.expand_ratio)
+        h, w = image.shape[:2]
+        expand_h, expand_w, left, top = self._expand_params(h, w) if expand else (h, w, 0, 0)
+        gt_bboxes = gt_bboxes.astype(np.float64) + np.array([left, top, left, top], dtype=np.float64)
+
+        out_h, out_w, x_scale, y_scale = self._output_scale(expand_h, expand_w)
+        gt_bboxes *= np.array([x_scale, y_scale, x_scale, y_scale])
+        gt_bboxes[:, 0::2] = np.clip(gt_bboxes[:, 0::2], 0, out_w - 1)
+        gt_bboxes[:, 1::2] = np.clip(gt_bboxes[:, 1::2], 0, out_h - 1)
+
+        # place of the source image in the output, the rest of the expanded canvas is filled by padding
+        x0 = min(int(round(left * out_w / expand_w)), out_w - 1)
+        y0 = min(int(round(top * out_h / expand_h)), out_h - 1)
+        x1 = max(min(int(round((left + w) * out_w / expand_w)), out_w), x0 + 1)
+        y1 = max(min(int(round((top + h) * out_h / expand_h)), out_h), y0 + 1)
+        resized = self._buffer("resized", (y1 - y0, x1 - x0, 3), np.uint8)
+        cv2.resize(image, (x1 - x0, y1 - y0), dst=resized, interpolation=cv2.INTER_LINEAR)
+        if self.photo_ratio > 0 and np.random.rand() < self.photo_ratio:
+            distorted = self._buffer("distorted", resized.shape, np.float32)
+            np.copyto(distorted, resized, casting="unsafe")
+            resized, _, _ = self.photo(distorted, gt_bboxes, gt_label)
+
+        # The expand canvas (Expand mean=(0, 0, 0)) and the keep_ratio padding are zero pixels added before
+        # imnormalize, so they are filled with the normalized zero pixel -mean / std, not with 0
+        img_data = np.empty((3, self.img_height, self.img_width), dtype=np.float32)
+        img_data[...] = (-self.mean / self.std).reshape(3, 1, 1)
+        if flip:
+            resized = resized[:, ::-1]
+            x0, x1 = self.img_width - x1, self.img_width - x0
+            flipped = gt_bboxes.copy()
+            flipped[:, 0] = self.img_width - gt_bboxes[:, 2] - 1
+            flipped[:, 2] = self.img_width - gt_bboxes[:, 0] - 1
+            gt_bboxes = flipped
+        for c in range(3):
+            region = img_data[c, y0:y1, x0:x1]
+            np.subtract(resized[..., c], self.mean[c], out=region, casting="unsafe")
+            region *= 1 / self.std[c]
+
+        img_shape = np.array([self.img_height, self.img_width, 1.0], dtype=np.float32)
+        return (img_data, img_shape, gt_bboxes.astype(np.float32), gt_label.astype(np.int32),
+                gt_num.astype(np.bool_))
+
+
+def preprocess_fn(image, box, is_training, config, train_aug=None):
+    """Preprocess function for dataset, train_aug is the TrainAugmentation shared by the calls."""
 
     def _infer_data(image_bgr, image_shape, gt_box_new, gt_label_new, gt_iscrowd_new_revert):
         image_shape = image_shape[:2]
@@ -349,11 +465,6 @@ def preprocess_fn(image, box, is_training, config):
         pad_max_number = config.num_gts
         if pad_max_number < box.shape[0]:
             box = box[:pad_max_number, :]
-        image_bgr = image.copy()
-        image_bgr[:, :, 0] = image[:, :, 2]
-        image_bgr[:, :, 1] = image[:, :, 1]
-        image_bgr[:, :, 2] = image[:, :, 0]
-        image_shape = image_bgr.shape[:2]
         gt_box = box[:, :4]
         gt_label = box[:, 4]
         gt_iscrowd = box[:, 5]
@@ -364,25 +475,13 @@ def preprocess_fn(image, box, is_training, config):
         gt_iscrowd_new_revert = (~(gt_iscrowd_new.astype(np.bool))).astype(np.int32)
 
         if not is_training:
-            return _infer_data(image_bgr, image_shape, gt_box_new, gt_label_new, gt_iscrowd_new_revert)
-
-        flip = (np.random.rand() < config.flip_ratio)
-        expand = (np.random.rand() < config.expand_ratio)
-        input_data = image_bgr, image_shape, gt_box_new, gt_label_new, gt_iscrowd_new_revert
-
-        if expand:
-            input_data = expand_column(*input_data)
-        if config.keep_ratio:
-            input_data = rescale_column(*input_data, config=config)
-        else:
-            input_data = resize_column(*input_data, config=config)
-        input_data = imnormalize_column(*input_data)
-        if flip:
-            input_data = flip_column(*input_data)
+            image_bgr = image[:, :, ::-1].copy()
+            return _infer_data(image_bgr, image_bgr.shape[:2], gt_box_new, gt_label_new, gt_iscrowd_new_revert)
 
-        output_data = transpose_column(*input_data)
-        return output_data
+        return train_aug(image, gt_box_new, gt_label_new, gt_iscrowd_new_revert)
 
+    if is_training and train_aug is None:
+        train_aug = TrainAugmentation(config)
     return _data_aug(image, box, is_training)
 
 
@@ -555,7 +654,9 @@ def create_fasterrcnn_dataset(config, mindrecord_file, batch_size=2, device_num=
                         num_parallel_workers=4, shuffle=is_training)
     decode = ms.dataset.vision.Decode()
     ds = ds.map(input_columns=["image"], operations=decode)
-    compose_map_func = (lambda image, annotation: preprocess_fn(image, annotation, is_training, config=config))
+    train_aug = TrainAugmentation(config) if is_training else None
+    compose_map_func = (lambda image, annotation: preprocess_fn(image, annotation, is_training, config=config,
+                                                                train_aug=train_aug))
 
     if is_training:
         ds = ds.map(input_columns=["image", "annotation"],
@@ -16,10 +16,10 @@
 import sys
 import json
 import os
+import time
 from pathlib import Path
 
 import cv2
-import faiss
 import numpy as np
 from mindspore import context
 from mindspore.train.serialization import load_checkpoint, load_param_into_net
@@ -28,6 +28,7 @@ from sklearn.metrics import roc_auc_score
 
 from src.config import cfg, merge_from_cli_list
 from src.dataset import createDataset
+from src.memory_bank import load_memory_bank
 from src.model import wide_resnet50_2
 from src.oneStep import OneStepCell
 from src.operator import (embedding_concat, normalize, prep_dirs,
@@ -38,6 +39,35 @@ merge_from_cli_list(opts)
 cfg.freeze()
 print(cfg)
 
+
+def score_images(memory_bank, batch, results, sample_path, mean, std):
+    """Search the patches of a batch of images in one query, then score and save each image."""
+    embeddings = np.concatenate([item['embedding'] for item in batch])
+    score_patches_all, _ = memory_bank.search(embeddings, k=9)
+    gt_list_px_lvl, pred_list_px_lvl, gt_list_img_lvl, pred_list_img_lvl, img_path_list = results
+    num_patches = len(batch[0]['embedding'])
+    for i, item in enumerate(batch):
+        score_patches = score_patches_all[i * num_patches:(i + 1) * num_patches]
+        file_name = item['file_name']
+
+        anomaly_map = score_patches[:, 0].reshape((28, 28))
+        N_b = score_patches[np.argmax(score_patches[:, 0])]
+        w = (1 - (np.max(np.exp(N_b)) / np.sum(np.exp(N_b))))
+        score = w * max(score_patches[:, 0])
+        gt_np = item['gt']
+        anomaly_map_resized = cv2.resize(anomaly_map, (224, 224))
+        anomaly_map_resized_blur = gaussian_filter(anomaly_map_resized, sigma=4)
+
+        gt_list_px_lvl.extend(gt_np.ravel())
+        pred_list_px_lvl.extend(anomaly_map_resized_blur.ravel())
+        gt_list_img_lvl.append(item['label'])
+        pred_list_img_lvl.append(score)
+        img_path_list.extend(file_name)
+        img = normalize(item['img'], mean, std)
+        input_img = cv2.cvtColor(np.transpose(img, (0, 2, 3, 1))[0] * 255, cv2.COLOR_BGR2RGB)
+        save_anomaly_map(sample_path, anomaly_map_resized_blur, input_img, gt_np * 255, file_name, item['x_type'])
+
+
 if __name__ == '__main__':
     current_path = os.path.abspath(os.path.dirname(__file__))
     context.set_context(mode=context.GRAPH_MODE, device_target=cfg.platform, device_id=cfg.device_id)
@@ -53,7 +83,8 @@ if __name__ == '__main__':
     step_size = test_dataset.get_dataset_size()
 
     embedding_dir_path, sample_path = prep_dirs(current_path, cfg.category)
-    index = faiss.read_index(os.path.join(embedding_dir_path, 'index.faiss'))
+    bank_options = {'nprobe': cfg.memory_bank_nprobe} if cfg.memory_bank_backend == 'ivf' else {}
+    memory_bank = load_memory_bank(embedding_dir_path, cfg.memory_bank_backend, **bank_options)
 
     # network
     network = wide_resnet50_2()
@@ -71,35 +102,35 @@ if __name__ == '__main__':
     gt_list_img_lvl = []
     pred_list_img_lvl = []
     img_path_list = []
-    for step, data in enumerate(data_iter):
+    results = (gt_list_px_lvl, pred_list_px_lvl, gt_list_img_lvl, pred_list_img_lvl, img_path_list)
+    batch = []
+    feature_time = 0.0
+    search_time = 0.0
+    for data in data_iter:
         step_label = label['{}'.format(data['idx'][0])]
-        file_name = step_label['name']
-        x_type = step_label['img_type']
-
+        start = time.time()
         features = model(data['img'])
         embedding = embedding_concat(features[0].asnumpy(), features[1].asnumpy())
-        embedding_test = reshape_embedding(embedding)
-
-        embedding_test = np.array(embedding_test, dtype=np.float32)
-        score_patches, _ = index.search(embedding_test, k=9)
-
-        anomaly_map = score_patches[:, 0].reshape((28, 28))
-        N_b = score_patches[np.argmax(score_patches[:, 0])]
-        w = (1 - (np.max(np.exp(N_b)) / np.sum(np.exp(N_b))))
-        score = w * max(score_patches[:, 0])
-        gt_np = data['gt'].asnumpy()[0, 0].astype(int)
-        anomaly_map_resized = cv2.resize(anomaly_map, (224, 224))
-        anomaly_map_resized_blur = gaussian_filter(anomaly_map_resized, sigma=4)
-
-        gt_list_px_lvl.extend(gt_np.ravel())
-        pred_list_px_lvl.extend(anomaly_map_resized_blur.ravel())
-        gt_list_img_lvl.append(data['label'].asnumpy()[0])
-        pred_list_img_lvl.append(score)
-        img_path_list.extend(file_name)
-        img = normalize(data['img'], mean, std)
-        input_img = cv2.cvtColor(np.transpose(img, (0, 2, 3, 1))[0] * 255, cv2.COLOR_BGR2RGB)
-        save_anomaly_map(sample_path, anomaly_map_resized_blur, input_img, gt_np * 255, file_name, x_type)
-
+        embedding_test = reshape_embedding(embedding).astype(np.float32)
+        feature_time += time.time() - start
+
+        batch.append({'embedding': embedding_test, 'img': data['img'], 'gt': data['gt'].asnumpy()[0, 0].astype(int),
+                      'label': data['label'].asnumpy()[0], 'file_name': step_label['name'],
+                      'x_type': step_label['img_type']})
+        # The patches of eval_batch_images images are searched in the memory bank at a time
+        if len(batch) == cfg.eval_batch_images:
+            start = time.time()
+            score_images(memory_bank, batch, results, sample_path, mean, std)
+            search_time += time.time() - start
+            batch = []
+    if batch:
+        start = time.time()
+        score_images(memory_bank, batch, results, sample_path, mean, std)
+        search_time += time.time() - start
+
+    num_images = len(gt_list_img_lvl)
+    print("eval latency per image: feature {:.2f}ms, search and scoring {:.2f}ms".format(
+        feature_time * 1000 / num_images, search_time * 1000 / num_images))
     pixel_auc = roc_auc_score(gt_list_px_lvl, pred_list_px_lvl)
     img_auc = roc_auc_score(gt_list_img_lvl, pred_list_img_lvl)
 
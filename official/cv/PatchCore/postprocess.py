@@ -19,7 +19,6 @@ import os
 from pathlib import Path
 
 import cv2
-import faiss
 import numpy as np
 from mindspore.common import set_seed
 from scipy.ndimage import gaussian_filter
@@ -27,6 +26,7 @@ from sklearn.metrics import roc_auc_score
 from sklearn.random_projection import SparseRandomProjection
 
 from src.config import cfg
+from src.memory_bank import create_memory_bank, load_memory_bank
 from src.operator import (embedding_concat, prep_dirs, reshape_embedding,
                           save_anomaly_map)
 from src.sampling_methods.kcenter_greedy import kCenterGreedy
@@ -40,6 +40,12 @@ parser.add_argument('--img_dir', type=str, default='')
 parser.add_argument('--label_dir', type=str, default='')
 parser.add_argument('--category', type=str, default='screw')
 parser.add_argument('--coreset_sampling_ratio', type=float, default=0.01)
+parser.add_argument('--coreset_centers_per_round', type=int, default=1,
+                    help='centers selected in each round of k-center greedy, 1 is exact')
+parser.add_argument('--memory_bank_backend', type=str, default='exact', choices=['exact', 'ivf', 'faiss'],
+                    help='memory bank backend, only faiss needs faiss installed')
+parser.add_argument('--memory_bank_nlist', type=int, default=256, help='number of cells of the ivf memory bank')
+parser.add_argument('--memory_bank_nprobe', type=int, default=8, help='number of cells searched by the ivf memory bank')
 
 args = parser.parse_args()
 
@@ -84,28 +90,30 @@ if __name__ == '__main__':
         features_two = np.fromfile(features_two_path, dtype=np.float32).reshape(1, 1024, 14, 14)
 
         embedding = embedding_concat(features_one, features_two)
-        embedding_list.extend(reshape_embedding(embedding))
+        embedding_list.append(reshape_embedding(embedding).astype(np.float32))
 
-    total_embeddings = np.array(embedding_list, dtype=np.float32)
+    total_embeddings = np.concatenate(embedding_list)
 
     # Random projection
     randomprojector = SparseRandomProjection(n_components='auto', eps=0.9)
     randomprojector.fit(total_embeddings)
 
     # Coreset Subsampling
-    selector = kCenterGreedy(total_embeddings, 0, 0)
+    num_centers = int(total_embeddings.shape[0] * args.coreset_sampling_ratio)
+    selector = kCenterGreedy(total_embeddings, 0, 0, centers_per_round=args.coreset_centers_per_round,
+                             log_interval=max(num_centers // 10, 1))
     selected_idx = selector.select_batch(model=randomprojector,
                                          already_selected=[],
-                                         N=int(total_embeddings.shape[0] * args.coreset_sampling_ratio))
+                                         N=num_centers)
     embedding_coreset = total_embeddings[selected_idx]
 
     print('initial embedding size : {}'.format(total_embeddings.shape))
     print('final embedding size : {}'.format(embedding_coreset.shape))
 
-    # faiss
-    index = faiss.IndexFlatL2(embedding_coreset.shape[1])
-    index.add(embedding_coreset)
-    faiss.write_index(index, os.path.join(embedding_dir_path, 'index.faiss'))
+    # memory bank
+    bank_options = {'nlist': args.memory_bank_nlist} if args.memory_bank_backend == 'ivf' else {}
+    memory_bank = create_memory_bank(embedding_coreset, args.memory_bank_backend, **bank_options)
+    memory_bank.save(embedding_dir_path)
 
     # eval
     gt_list_px_lvl = []
@@ -113,7 +121,8 @@ if __name__ == '__main__':
     gt_list_img_lvl = []
     pred_list_img_lvl = []
     img_path_list = []
-    index = faiss.read_index(os.path.join(embedding_dir_path, 'index.faiss'))
+    bank_options = {'nprobe': args.memory_bank_nprobe} if args.memory_bank_backend == 'ivf' else {}
+    memory_bank = load_memory_bank(embedding_dir_path, args.memory_bank_backend, **bank_options)
     for i in range(int(len(os.listdir(test_result_path)) / 2)):
         test_single_label = test_label['{}'.format(i)]
         gt = test_single_label['gt']
@@ -135,7 +144,7 @@ if __name__ == '__main__':
         embedding_test = reshape_embedding(embedding)
 
         embedding_test = np.array(embedding_test, dtype=np.float32)
-        score_patches, _ = index.search(embedding_test, k=9)
+        score_patches, _ = memory_bank.search(embedding_test, k=9)
 
         anomaly_map = score_patches[:, 0].reshape((28, 28))
         N_b = score_patches[np.argmax(score_patches[:, 0])]
@@ -31,6 +31,14 @@ _C.isModelArts = False
 
 _C.category = "screw"
 _C.coreset_sampling_ratio = 0.01
+# Centers selected in each round of k-center greedy, 1 is exact, > 1 is approximate and faster
+_C.coreset_centers_per_round = 1
+# Memory bank backend in ['exact', 'ivf', 'faiss'], only 'faiss' needs faiss installed
+_C.memory_bank_backend = "exact"
+_C.memory_bank_nlist = 256
+_C.memory_bank_nprobe = 8
+# Number of test images whose patches are searched in the memory bank at a time
+_C.eval_batch_images = 16
 _C.num_epochs = 1
 _C.device_id = 0
 _C.dataset_path = ""
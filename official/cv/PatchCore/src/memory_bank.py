@@ -0,0 +1,258 @@
+# Copyright 2022 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""memory bank of the patch embeddings"""
+import os
+import numpy as np
+
+
+def top_k_smallest(dist, k):
+    """Return the ids of the k smallest distances of each row, in ascending order."""
+    k = min(k, dist.shape[1])
+    ids = np.argpartition(dist, k - 1, axis=1)[:, :k]
+    order = np.argsort(np.take_along_axis(dist, ids, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(ids, order, axis=1)
+
+
+def merge_top_k(best_dist, best_ids, dist, ids, k):
+    """Merge the candidates into the running k nearest neighbours of each query."""
+    dist = np.concatenate([best_dist, dist], axis=1)
+    ids = np.concatenate([best_ids, ids], axis=1)
+    keep = top_k_smallest(dist, k)
+    return np.take_along_axis(dist, keep, axis=1), np.take_along_axis(ids, keep, axis=1)
+
+
+def squared_l2(queries, query_norms, vectors, vector_norms):
+    """Squared L2 distances as |q|^2 - 2qv + |v|^2, which is how faiss computes them for batched queries."""
+    dist = -2 * np.dot(queries, vectors.T)
+    dist += query_norms[:, None]
+    dist += vector_norms[None, :]
+    return np.maximum(dist, 0, out=dist)
+
+
+def kmeans(data, num_clusters, niter=20, max_points_per_cluster=256, seed=1):
+    """Lloyd's k-means trained on at most max_points_per_cluster * num_clusters rows of data."""
+    rng = np.random.RandomState(seed)
+    train = data
+    if len(data) > max_points_per_cluster * num_clusters:
+        train = data[rng.choice(len(data), max_points_per_cluster * num_clusters, replace=False)]
+    train = np.asarray(train, dtype=np.float32)
+    centroids = train[rng.choice(len(train), num_clusters, replace=False)].copy()
+    for _ in range(niter):
+        assign = assign_clusters(train, centroids)
+        counts = np.bincount(assign, minlength=num_clusters)
+        nonempty = counts > 0
+        order = np.argsort(assign, kind='stable')
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums = np.add.reduceat(train[order].astype(np.float64), starts[nonempty], axis=0)
+        centroids[nonempty] = sums / counts[nonempty, None]
+        empty = np.flatnonzero(~nonempty)
+        centroids[empty] = train[rng.choice(len(train), len(empty), replace=False)]
+    return centroids
+
+
+def assign_clusters(data, centroids, block_size=65536):
+    """Return the nearest centroid of each row of data."""
+    assign = np.empty(len(data), dtype=np.int64)
+    centroid_norms = np.sum(centroids * centroids, axis=1)
+    for start in range(0, len(data), block_size):
+        block = np.asarray(data[start:start + block_size], dtype=np.float32)
+        assign[start:start + block_size] = np.argmin(centroid_norms - 2 * np.dot(block, centroids.T), axis=1)
+    return assign
+
+
+class ExactMemoryBank:
+    """
+    Exact k nearest neighbour search in L2 distance, the bank is scanned block by block so only
+    [query_batch_size, block_size] distances are held at a time.
+
+    Args:
+        embeddings (numpy.ndarray): The memory bank with shape [num, dim].
+        block_size (int): Number of bank vectors scored at a time. Default: 65536.
+        query_batch_size (int): Number of queries scored at a time. Default: 4096.
+    """
+    name = 'exact'
+
+    def __init__(self, embeddings, block_size=65536, query_batch_size=4096, norms=None):
+        self.vectors = embeddings
+        self.norms = norms if norms is not None else np.sum(np.square(embeddings, dtype=np.float32), axis=1)
+        self.block_size = block_size
+        self.query_batch_size = query_batch_size
+
+    @property
+    def ntotal(self):
+        return len(self.vectors)
+
+    def search(self, queries, k):
+        """
+        Search the k nearest neighbours of the queries, the same as faiss.IndexFlatL2.search.
+
+        Returns:
+            squared L2 distances with shape [num_queries, k] in ascending order, ids with shape [num_queries, k].
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        k = min(k, self.ntotal)
+        distances = np.empty((len(queries), k), dtype=np.float32)
+        ids = np.empty((len(queries), k), dtype=np.int64)
+        for start in range(0, len(queries), self.query_batch_size):
+            batch = queries[start:start + self.query_batch_size]
+            distances[start:start + len(batch)], ids[start:start + len(batch)] = self._search_batch(batch, k)
+        return distances, ids
+
+    def _search_batch(self, queries, k):
+        query_norms = np.sum(queries * queries, axis=1)
+        best_dist = np.zeros((len(queries), 0), dtype=np.float32)
+        best_ids = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, self.ntotal, self.block_size):
+            dist = squared_l2(queries, query_norms, self.vectors[start:start + self.block_size],
+                              self.norms[start:start + self.block_size])
+            cand = top_k_smallest(dist, k)
+            best_dist, best_ids = merge_top_k(best_dist, best_ids, np.take_along_axis(dist, cand, axis=1),
+                                              cand + start, k)
+        return best_dist, best_ids
+
+    def save(self, path):
+        np.save(os.path.join(path, 'memory_bank.npy'), self.vectors)
+        np.save(os.path.join(path, 'memory_bank_norms.npy'), self.norms)
+
+    @classmethod
+    def load(cls, path, mmap=True, **kwargs):
+        mmap_mode = 'r' if mmap else None
+        return cls(np.load(os.path.join(path, 'memory_bank.npy'), mmap_mode=mmap_mode),
+                   norms=np.load(os.path.join(path, 'memory_bank_norms.npy')), **kwargs)
+
+
+class IVFMemoryBank(ExactMemoryBank):
+    """
+    Approximate k nearest neighbour search with an inverted file: the bank is clustered into nlist cells,
+    and only the vectors in the nprobe cells nearest to a query are scored. The vectors are stored cell by
+    cell, so a cell is one contiguous slice of the (memory-mapped) bank.
+
+    Args:
+        embeddings (numpy.ndarray): The memory bank with shape [num, dim].
+        nlist (int): Number of cells. Default: 256.
+        nprobe (int): Number of cells scored for each query, more cells are scored if these hold less than k
+            vectors. Default: 8.
+        query_batch_size (int): Number of queries scored at a time. Default: 4096.
+    """
+    name = 'ivf'
+
+    def __init__(self, embeddings, nlist=256, nprobe=8, query_batch_size=4096, norms=None, ivf=None):
+        if ivf is None:
+            nlist = min(nlist, len(embeddings))
+            centroids = kmeans(embeddings, nlist)
+            assign = assign_clusters(embeddings, centroids)
+            list_ids = np.argsort(assign, kind='stable')
+            bounds = np.searchsorted(assign[list_ids], np.arange(nlist + 1))
+            embeddings = np.ascontiguousarray(embeddings[list_ids])
+            norms = None
+        else:
+            centroids, bounds, list_ids = ivf
+        super(IVFMemoryBank, self).__init__(embeddings, query_batch_size=query_batch_size, norms=norms)
+        self.centroids = centroids
+        self.bounds = bounds
+        self.list_ids = list_ids
+        self.nprobe = nprobe
+
+    def _search_batch(self, queries, k):
+        """Score the queries cell by cell, each cell against the queries which probe it."""
+        num_queries, nlist = len(queries), len(self.centroids)
+        query_norms = np.sum(queries * queries, axis=1)
+        centroid_dist = squared_l2(queries, query_norms, self.centroids, np.sum(self.centroids ** 2, axis=1))
+        # Probe the nprobe nearest cells of each query, and the next nearest ones until the probed cells hold at
+        # least k vectors, so that every query gets k neighbours (k is at most ntotal)
+        cell_order = np.argsort(centroid_dist, axis=1)
+        probed_sizes = np.cumsum(np.diff(self.bounds)[cell_order], axis=1)
+        num_probes = np.maximum(min(self.nprobe, nlist), np.sum(probed_sizes < k, axis=1) + 1)
+        probe_queries, probe_ranks = np.nonzero(np.arange(nlist)[None, :] < num_probes[:, None])
+        probe_cells = cell_order[probe_queries, probe_ranks]
+        probe_order = np.argsort(probe_cells, kind='stable')
+        probe_queries = probe_queries[probe_order]
+        cell_bounds = np.searchsorted(probe_cells[probe_order], np.arange(nlist + 1))
+        best_dist = np.full((num_queries, k), np.inf, dtype=np.float32)
+        best_pos = np.full((num_queries, k), -1, dtype=np.int64)
+        for cell in np.flatnonzero(np.diff(cell_bounds)):
+            lower, upper = self.bounds[cell], self.bounds[cell + 1]
+            if lower == upper:
+                continue
+            qs = probe_queries[cell_bounds[cell]:cell_bounds[cell + 1]]
+            dist = squared_l2(queries[qs], query_norms[qs], self.vectors[lower:upper], self.norms[lower:upper])
+            cand = top_k_smallest(dist, k)
+            best_dist[qs], best_pos[qs] = merge_top_k(best_dist[qs], best_pos[qs],
+                                                      np.take_along_axis(dist, cand, axis=1), cand + lower, k)
+        return best_dist, self.list_ids[best_pos]
+
+    def save(self, path):
+        super(IVFMemoryBank, self).save(path)
+        np.save(os.path.join(path, 'memory_bank_centroids.npy'), self.centroids)
+        np.save(os.path.join(path, 'memory_bank_bounds.npy'), self.bounds)
+        np.save(os.path.join(path, 'memory_bank_ids.npy'), self.list_ids)
+
+    @classmethod
+    def load(cls, path, mmap=True, **kwargs):
+        mmap_mode = 'r' if mmap else None
+        ivf = tuple(np.load(os.path.join(path, 'memory_bank_{}.npy'.format(name)))
+                    for name in ('centroids', 'bounds', 'ids'))
+        return cls(np.load(os.path.join(path, 'memory_bank.npy'), mmap_mode=mmap_mode),
+                   norms=np.load(os.path.join(path, 'memory_bank_norms.npy')), ivf=ivf, **kwargs)
+
+
+class FaissMemoryBank:
+    """faiss.IndexFlatL2 memory bank saved as index.faiss, faiss is only imported by this backend."""
+    name = 'faiss'
+
+    def __init__(self, embeddings=None, index=None):
+        import faiss
+        self.faiss = faiss
+        if index is None:
+            index = faiss.IndexFlatL2(embeddings.shape[1])
+            index.add(np.ascontiguousarray(embeddings, dtype=np.float32))
+        self.index = index
+
+    @property
+    def ntotal(self):
+        return self.index.ntotal
+
+    def search(self, queries, k):
+        return self.index.search(np.ascontiguousarray(queries, dtype=np.float32), k)
+
+    def save(self, path):
+        self.faiss.write_index(self.index, os.path.join(path, 'index.faiss'))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        import faiss
+        flags = faiss.IO_FLAG_MMAP if mmap else 0
+        return cls(index=faiss.read_index(os.path.join(path, 'index.faiss'), flags))
+
+
+MEMORY_BANKS = {
+    'exact': ExactMemoryBank,
+    'ivf': IVFMemoryBank,
+    'faiss': FaissMemoryBank,
+}
+
+
+def create_memory_bank(embeddings, backend='exact', **kwargs):
+    """Build the memory bank of the backend in MEMORY_BANKS."""
+    if backend not in MEMORY_BANKS:
+        raise ValueError("memory bank backend should be one of {}, but got {}".format(list(MEMORY_BANKS), backend))
+    return MEMORY_BANKS[backend](embeddings, **kwargs)
+
+
+def load_memory_bank(path, backend='exact', mmap=True, **kwargs):
+    """Load the memory bank saved in the directory path, the bank is memory-mapped if mmap is True."""
+    if backend not in MEMORY_BANKS:
+        raise ValueError("memory bank backend should be one of {}, but got {}".format(list(MEMORY_BANKS), backend))
+    return MEMORY_BANKS[backend].load(path, mmap=mmap, **kwargs)
@@ -84,14 +84,10 @@ def embedding_concat(x, y):
 def reshape_embedding(embedding):
     """
     reshape_embedding function
+    input: embedding with shape (B, C, H, W)
+    output: contiguous patch embeddings with shape (B * H * W, C), in the order of (B, H, W)
     """
-    embedding_list = []
-    for k in range(embedding.shape[0]):
-        for i in range(embedding.shape[2]):
-            for j in range(embedding.shape[3]):
-                embedding_list.append(embedding[k, :, i, j])
-
-    return embedding_list
+    return np.ascontiguousarray(np.transpose(embedding, (0, 2, 3, 1)).reshape(-1, embedding.shape[1]))
 
 def prep_dirs(path, category):
     """
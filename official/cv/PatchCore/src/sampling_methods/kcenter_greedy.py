@@ -13,24 +13,84 @@
 # limitations under the License.
 # ============================================================================
 """kCenterGreedy"""
+import time
 import numpy as np
-from sklearn.metrics import pairwise_distances
 from src.sampling_methods.sampling_def import SamplingMethod
 
 class kCenterGreedy(SamplingMethod):
-    """kCenterGreedy"""
-    def __init__(self, X, y, seed, metric='euclidean'):
+    """
+    kCenterGreedy
+
+    The features are kept in one contiguous array and the min distances are updated in place block by block.
+    With centers_per_round = 1 the selection is exact: the distances are computed in float64 and rounded to
+    the feature dtype like sklearn pairwise_distances, so the centers are the same as selecting with it. A
+    float64 copy of the (projected) features is kept for this, instead of upcasting them in every round.
+    With centers_per_round > 1 the selection is approximate: each round takes the centers_per_round farthest
+    points as candidates, selects greedily among them with their mutual distances, and updates the min
+    distances with all the new centers in one matrix product in the feature dtype.
+
+    Args:
+        X: features with shape [num_samples, ...].
+        y: labels, unused.
+        seed: random seed, unused.
+        metric: only 'euclidean' is supported.
+        block_size: number of rows updated at a time.
+        centers_per_round: number of candidates of each round, 1 means exact selection.
+        log_interval: number of centers between two progress logs, 0 means no progress log.
+    """
+    def __init__(self, X, y, seed, metric='euclidean', block_size=65536, centers_per_round=1, log_interval=0):
+        if metric != 'euclidean':
+            raise ValueError("kCenterGreedy only supports euclidean metric, but got {}".format(metric))
         self.X = X
         self.y = y
         self.flat_X = self.flatten_X()
         self.name = 'kcenter'
         self.features = self.flat_X
         self.metric = metric
+        self.block_size = block_size
+        self.centers_per_round = centers_per_round
+        self.log_interval = log_interval
         self.min_distances = None
+        self.norms = None
+        self.features_64 = None
         self.n_obs = self.X.shape[0]
         self.already_selected = []
 
-    def update_distances(self, cluster_centers, only_new=True, reset_dist=False):
+    def _set_features(self, features):
+        self.features = np.ascontiguousarray(features)
+        if self.features.dtype not in (np.float32, np.float64):
+            self.features = self.features.astype(np.float32)
+        self.features_64 = None
+        if self.centers_per_round <= 1:
+            self.features_64 = self.features.astype(np.float64)
+        self.norms = np.empty(self.n_obs, dtype=np.float64)
+        for start in range(0, self.n_obs, self.block_size):
+            block = self.features[start:start + self.block_size].astype(np.float64)
+            self.norms[start:start + self.block_size] = np.einsum('ij,ij->i', block, block)
+        self.min_distances = None
+
+    def _distances(self, start, centers):
+        """Euclidean distances between the rows of a block and the centers, in the order of sklearn."""
+        block = self.features[start:start + self.block_size].astype(np.float64) if self.features_64 is None \
+            else self.features_64[start:start + self.block_size]
+        centers = centers.astype(np.float64)
+        dist = -2 * np.dot(block, centers.T)
+        dist += self.norms[start:start + self.block_size, None]
+        dist += np.einsum('ij,ij->i', centers, centers)[None, :]
+        dist = dist.astype(self.features.dtype)
+        np.maximum(dist, 0, out=dist)
+        return np.sqrt(dist, out=dist)
+
+    def _fast_distances(self, start, centers):
+        """Euclidean distances in the feature dtype, used by the approximate selection."""
+        block = self.features[start:start + self.block_size]
+        dist = -2 * np.dot(block, centers.T)
+        dist += self.norms[start:start + self.block_size, None].astype(dist.dtype)
+        dist += np.sum(centers * centers, axis=1)[None, :]
+        np.maximum(dist, 0, out=dist)
+        return np.sqrt(dist, out=dist)
+
+    def update_distances(self, cluster_centers, only_new=True, reset_dist=False, exact=True):
         """Update min distances given cluster centers.
 
         Args:
@@ -38,21 +98,54 @@ class kCenterGreedy(SamplingMethod):
         only_new: only calculate distance for newly selected points and update
             min_distances.
         rest_dist: whether to reset min_distances.
+        exact: whether to compute the distances in float64 as sklearn does.
         """
         if reset_dist:
             self.min_distances = None
         if only_new:
             cluster_centers = [d for d in cluster_centers
                                if d not in self.already_selected]
-        if cluster_centers:
-            # Update min_distances for all examples given new cluster center.
-            x = self.features[cluster_centers]
-            dist = pairwise_distances(self.features, x, metric=self.metric)
+        if not cluster_centers:
+            return
+        # Update min_distances for all examples given new cluster center.
+        centers = self.features[cluster_centers]
+        distances = self._distances if exact else self._fast_distances
+        if self.min_distances is None:
+            self.min_distances = np.full(self.n_obs, np.inf, dtype=self.features.dtype)
+        for start in range(0, self.n_obs, self.block_size):
+            min_block = self.min_distances[start:start + self.block_size]
+            np.minimum(min_block, np.min(distances(start, centers), axis=1), out=min_block)
 
-            if self.min_distances is None:
-                self.min_distances = np.min(dist, axis=1).reshape(-1, 1)
-            else:
-                self.min_distances = np.minimum(self.min_distances, dist)
+    def _select_candidates(self, num):
+        """Select up to num new centers among the farthest points, greedily with their mutual distances."""
+        num_cand = min(num, self.n_obs)
+        cand = np.argpartition(-self.min_distances, num_cand - 1)[:num_cand]
+        cand = cand[np.argsort(-self.min_distances[cand], kind='stable')]
+        cand_features = self.features[cand]
+        cand_norms = np.sum(cand_features * cand_features, axis=1)
+        mutual = cand_norms[:, None] + cand_norms[None, :] - 2 * np.dot(cand_features, cand_features.T)
+        mutual = np.sqrt(np.maximum(mutual, 0))
+        cand_min = self.min_distances[cand].copy()
+        selected = []
+        for _ in range(num_cand):
+            best = int(np.argmax(cand_min))
+            if cand_min[best] <= 0:
+                break
+            selected.append(int(cand[best]))
+            np.minimum(cand_min, mutual[best], out=cand_min)
+            cand_min[best] = 0
+        return selected
+
+    def _log(self, num_selected, num_total, start_time):
+        elapsed = time.time() - start_time
+        eta = elapsed / max(num_selected, 1) * (num_total - num_selected)
+        block_size = min(self.block_size, self.n_obs)
+        features_64 = 0 if self.features_64 is None else self.features_64.nbytes
+        memory = (self.features.nbytes + features_64 + self.norms.nbytes + self.min_distances.nbytes +
+                  block_size * (self.features.shape[1] + 2 * self.centers_per_round) * 8) / 2 ** 20
+        print('kCenterGreedy: {}/{} centers, elapsed {:.1f}s, eta {:.1f}s, max distance {:.4f}, '
+              'working memory {:.1f}MB'.format(num_selected, num_total, elapsed, eta,
+                                               float(np.max(self.min_distances)), memory), flush=True)
 
     def select_batch_(self, model, already_selected, N, **kwargs):
         """
@@ -72,25 +165,35 @@ class kCenterGreedy(SamplingMethod):
         # Assumes that the transform function takes in original data and not
         # flattened data.
         print('Getting transformed features...')
-        self.features = model.transform(self.X)
+        start_time = time.time()
+        self._set_features(model.transform(self.X))
         print('Calculating distances...')
         self.update_distances(already_selected, only_new=False, reset_dist=True)
 
         new_batch = []
-
-        for _ in range(N):
-            if self.already_selected is None:
-                # Initialize centers with a randomly selected datapoint
-                ind = np.random.choice(np.arange(self.n_obs))
+        selected = set(already_selected)
+        next_log = self.log_interval
+        while len(new_batch) < N:
+            if self.min_distances is None:
+                # The first center is the first datapoint if nothing is selected
+                inds = [0]
+            elif self.centers_per_round > 1:
+                inds = self._select_candidates(min(self.centers_per_round, N - len(new_batch)))
+                if not inds:
+                    break
             else:
-                ind = np.argmax(self.min_distances)
+                inds = [int(np.argmax(self.min_distances))]
             # New examples should not be in already selected since those points
             # should have min_distance of zero to a cluster center.
-            assert ind not in already_selected
+            assert not selected.intersection(inds)
 
-            self.update_distances([ind], only_new=True, reset_dist=False)
-            new_batch.append(ind)
+            self.update_distances(inds, only_new=True, reset_dist=False, exact=self.centers_per_round <= 1)
+            new_batch.extend(inds)
+            if self.log_interval > 0 and len(new_batch) >= next_log:
+                self._log(len(new_batch), N, start_time)
+                next_log += self.log_interval
         print('Maximum distance from cluster centers is %0.2f' % max(self.min_distances))
+        print('Selected {} centers in {:.1f}s'.format(len(new_batch), time.time() - start_time))
 
         self.already_selected = already_selected
 
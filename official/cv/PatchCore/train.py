@@ -18,7 +18,6 @@ import sys
 import datetime
 import os
 import time
-import faiss
 import numpy as np
 from mindspore import context
 from mindspore.common import set_seed
@@ -26,6 +25,7 @@ from mindspore.train.serialization import load_checkpoint, load_param_into_net
 from sklearn.random_projection import SparseRandomProjection
 
 from src.dataset import createDataset
+from src.memory_bank import create_memory_bank
 from src.model import wide_resnet50_2
 from src.oneStep import OneStepCell
 from src.operator import embedding_concat, prep_dirs, reshape_embedding
@@ -90,28 +90,30 @@ if __name__ == '__main__':
             print("step: {}, time: {}ms".format(step, step_time))
 
             embedding = embedding_concat(features[0].asnumpy(), features[1].asnumpy())
-            embedding_list.extend(reshape_embedding(embedding))
+            embedding_list.append(reshape_embedding(embedding).astype(np.float32))
 
-        total_embeddings = np.array(embedding_list, dtype=np.float32)
+        total_embeddings = np.concatenate(embedding_list)
 
         # Random projection
         randomprojector = SparseRandomProjection(n_components='auto', eps=0.9)
         randomprojector.fit(total_embeddings)
 
         # Coreset Subsampling
-        selector = kCenterGreedy(total_embeddings, 0, 0)
+        num_centers = int(total_embeddings.shape[0] * cfg.coreset_sampling_ratio)
+        selector = kCenterGreedy(total_embeddings, 0, 0, centers_per_round=cfg.coreset_centers_per_round,
+                                 log_interval=max(num_centers // 10, 1))
         selected_idx = selector.select_batch(model=randomprojector,
                                              already_selected=[],
-                                             N=int(total_embeddings.shape[0] * cfg.coreset_sampling_ratio))
+                                             N=num_centers)
         embedding_coreset = total_embeddings[selected_idx]
 
         print('initial embedding size : {}'.format(total_embeddings.shape))
         print('final embedding size : {}'.format(embedding_coreset.shape))
 
-        # faiss
-        index = faiss.IndexFlatL2(embedding_coreset.shape[1])
-        index.add(embedding_coreset)
-        faiss.write_index(index, os.path.join(embedding_dir_path, 'index.faiss'))
+        # memory bank
+        bank_options = {'nlist': cfg.memory_bank_nlist} if cfg.memory_bank_backend == 'ivf' else {}
+        memory_bank = create_memory_bank(embedding_coreset, cfg.memory_bank_backend, **bank_options)
+        memory_bank.save(embedding_dir_path)
 
     if cfg.isModelArts:
         mox.file.copy_parallel(src_url='/cache/train_output', dst_url=cfg.train_url)
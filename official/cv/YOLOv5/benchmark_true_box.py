@@ -0,0 +1,64 @@
+# Copyright 2022 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Micro-benchmark of the threaded and the vectorized ground truth target builder."""
+import time
+import numpy as np
+from src.transforms import batch_preprocess_true_box, batch_preprocess_true_box_vectorized
+from model_utils.config import config
+
+
+def random_annos(batch_size, input_shape, max_box, num_classes, rng):
+    """Random padded boxes in the format of the training pipeline."""
+    annos = np.zeros((batch_size, max_box, 5), np.float64)
+    limit = np.array([input_shape[1] - 1, input_shape[0] - 1])
+    for anno in annos:
+        num = rng.integers(1, max_box + 1)
+        box_min = rng.uniform(0, 1, (num, 2)) * limit
+        box_max = np.minimum(box_min + rng.uniform(2, max(input_shape) / 2, (num, 2)), limit)
+        anno[:num, 0:2] = box_min
+        anno[:num, 2:4] = box_max
+        anno[:num, 4] = rng.integers(0, num_classes, num)
+    return annos
+
+
+def run_benchmark(func, repeat):
+    func()
+    start = time.time()
+    for _ in range(repeat):
+        func()
+    return (time.time() - start) / repeat
+
+
+if __name__ == "__main__":
+    input_shape = [640, 640]
+    repeat = 10
+    rng = np.random.default_rng(0)
+    annos = random_annos(config.per_batch_size, input_shape, config.max_box, config.num_classes, rng)
+
+    threaded_out = batch_preprocess_true_box(list(annos), config, input_shape)
+    vectorized_out = batch_preprocess_true_box_vectorized(annos, config.anchor_scales, input_shape,
+                                                          config.num_classes, config.max_box, config.label_smooth,
+                                                          config.label_smooth_factor)
+    for threaded, vectorized in zip(threaded_out, vectorized_out):
+        if not np.array_equal(threaded, vectorized):
+            raise ValueError("The vectorized targets are different from the threaded targets.")
+
+    threaded_time = run_benchmark(lambda: batch_preprocess_true_box(list(annos), config, input_shape), repeat)
+    vectorized_time = run_benchmark(
+        lambda: batch_preprocess_true_box_vectorized(annos, config.anchor_scales, input_shape, config.num_classes,
+                                                     config.max_box, config.label_smooth,
+                                                     config.label_smooth_factor), repeat)
+    print("batch size: {}, threaded: {:.2f} ms, vectorized: {:.2f} ms, speedup: {:.2f}x".format(
+        config.per_batch_size, threaded_time * 1000, vectorized_time * 1000, threaded_time / vectorized_time))
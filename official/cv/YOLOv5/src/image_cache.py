@@ -0,0 +1,141 @@
+# Copyright 2022 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Decoded image cache for YOLOV5 dataset."""
+import os
+import fcntl
+from collections import OrderedDict
+import numpy as np
+import cv2
+
+
+def get_cache_shape(height, width, max_side=0):
+    """Get the shape of the cached image, the longer side is downscaled to max_side if max_side > 0."""
+    scale = 1.0
+    if max_side > 0 and max(height, width) > max_side:
+        scale = max_side / max(height, width)
+    return max(int(round(height * scale)), 1), max(int(round(width * scale)), 1)
+
+
+def downscale_image(img, cache_shape):
+    """Resize the decoded image to cache_shape, only used to shrink images."""
+    if img.shape[:2] == tuple(cache_shape):
+        return img
+    return cv2.resize(img, (cache_shape[1], cache_shape[0]), interpolation=cv2.INTER_AREA)
+
+
+class RamImageCache:
+    """
+    LRU cache of decoded uint8 images in the memory of the current process.
+
+    Args:
+        max_bytes (int): The byte budget of the cached images.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.images = OrderedDict()
+
+    def get(self, key):
+        img = self.images.get(key)
+        if img is not None:
+            self.images.move_to_end(key)
+        return img
+
+    def put(self, key, img):
+        if img.nbytes > self.max_bytes or key in self.images:
+            return
+        self.images[key] = img
+        self.nbytes += img.nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self.images.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+
+class DiskImageCache:
+    """
+    Decoded uint8 images stored in a memory-mapped file, which is shared by all the dataset workers of a host
+    and reused by later runs. The slot of each image is allocated from the image shapes in the annotation, and
+    the image is written by the first worker which decodes it.
+
+    Args:
+        cache_dir (str): The directory of the cache files.
+        keys (list): The keys of the images, e.g. COCO image ids.
+        shapes (numpy.ndarray): The (height, width) of each cached image, with shape (N, 2).
+    """
+    def __init__(self, cache_dir, keys, shapes):
+        self.cache_dir = cache_dir
+        self.slots = {key: i for i, key in enumerate(keys)}
+        shapes = np.asarray(shapes, dtype=np.int64).reshape(-1, 2)
+        sizes = shapes[:, 0] * shapes[:, 1] * 3
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        index = np.concatenate([np.asarray(keys, np.int64).reshape(-1, 1), offsets.reshape(-1, 1), shapes], axis=1)
+        self.index = index
+        self.total_bytes = int(sizes.sum())
+        self._data = None
+        self._filled = None
+
+        os.makedirs(cache_dir, exist_ok=True)
+        index_path = os.path.join(cache_dir, "index.npy")
+        # Several ranks may share the directory, the lock makes sure that only the first of them creates the files,
+        # instead of each rank truncating the files which the others are filling
+        with open(os.path.join(cache_dir, "lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if not os.path.exists(index_path) or not np.array_equal(np.load(index_path), index):
+                # The layout changes, so the cached images are invalid
+                np.memmap(self._data_path, dtype=np.uint8, mode="w+", shape=(max(self.total_bytes, 1),)).flush()
+                np.memmap(self._filled_path, dtype=np.uint8, mode="w+", shape=(max(len(keys), 1),)).flush()
+                np.save(index_path, index)
+
+    @property
+    def _data_path(self):
+        return os.path.join(self.cache_dir, "images.u8")
+
+    @property
+    def _filled_path(self):
+        return os.path.join(self.cache_dir, "filled.u8")
+
+    def _open(self):
+        # The memory maps are opened lazily in each worker process rather than pickled
+        if self._data is None:
+            self._data = np.memmap(self._data_path, dtype=np.uint8, mode="r+")
+            self._filled = np.memmap(self._filled_path, dtype=np.uint8, mode="r+")
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_data"] = None
+        state["_filled"] = None
+        return state
+
+    def get(self, key):
+        slot = self.slots.get(key)
+        if slot is None:
+            return None
+        self._open()
+        if not self._filled[slot]:
+            return None
+        _, offset, height, width = self.index[slot]
+        return self._data[offset:offset + height * width * 3].reshape(height, width, 3)
+
+    def put(self, key, img):
+        slot = self.slots.get(key)
+        if slot is None:
+            return
+        _, offset, height, width = self.index[slot]
+        if img.shape != (height, width, 3) or img.dtype != np.uint8:
+            return
+        self._open()
+        self._data[offset:offset + img.size] = img.reshape(-1)
+        # Mark the slot after the image is written, so a reader never sees a partial image
+        self._filled[slot] = 1
@@ -588,3 +588,118 @@ def batch_preprocess_true_box_single(annos, config, input_shape):
 
     return np.array(batch_bbox_true_1), np.array(batch_bbox_true_2), np.array(batch_bbox_true_3), \
            np.array(batch_gt_box1), np.array(batch_gt_box2), np.array(batch_gt_box3)
+
+
+def batch_preprocess_true_box_vectorized(annos, anchors, in_shape, num_classes, max_boxes, label_smooth,
+                                         label_smooth_factor=0.1, iou_threshold=0.213):
+    """
+    Vectorized _preprocess_true_boxes for a whole batch of padded ground truth boxes.
+
+    The anchor iou, grid assignment and label smoothing of all boxes in the batch are computed at once, and
+    the outputs are the same as batch_preprocess_true_box.
+
+    Args:
+        annos (numpy.ndarray): Ground truth boxes with shape [batch, boxes, 5], x_min, y_min, x_max, y_max, class_id.
+        anchors (list): Anchor scales.
+        in_shape (list): Input shape [h, w] shared by the batch.
+        num_classes (int): Number of classes.
+        max_boxes (int): Number of padded gt boxes of each layer.
+        label_smooth (bool): Whether to use label smoothing.
+        label_smooth_factor (float): Label smoothing factor. Default: 0.1.
+        iou_threshold (float): Iou threshold of the top-k anchors. Default: 0.213.
+
+    Returns:
+        Tuple of numpy.ndarray, bbox1, bbox2, bbox3, gt_box1, gt_box2, gt_box3 of the batch.
+    """
+    anchors = np.array(anchors)
+    num_layers = anchors.shape[0] // 3
+    anchor_mask = [[6, 7, 8], [3, 4, 5], [0, 1, 2]]
+    true_boxes = np.array(annos, dtype='float32')
+    batch_size = true_boxes.shape[0]
+    input_shape = np.array(in_shape, dtype='int32')
+    boxes_xy = (true_boxes[..., 0:2] + true_boxes[..., 2:4]) // 2.
+    boxes_wh = true_boxes[..., 2:4] - true_boxes[..., 0:2]
+    true_boxes[..., 0:2] = boxes_xy / input_shape[::-1]
+    true_boxes[..., 2:4] = boxes_wh / input_shape[::-1]
+    grid_shapes = [input_shape // 32, input_shape // 16, input_shape // 8]
+    y_true = [np.zeros((batch_size, grid_shapes[l][0], grid_shapes[l][1], len(anchor_mask[l]),
+                        5 + num_classes), dtype='float32') for l in range(num_layers)]
+
+    valid_mask = boxes_wh[..., 0] > 0
+    batch_index = valid_mask.nonzero()[0]
+    if batch_index.size != 0:
+        # As _preprocess_true_boxes, the k-th valid box of an image is written with the k-th box of the image
+        box_index = np.arange(batch_index.size) - np.searchsorted(batch_index, batch_index)
+        wh = np.expand_dims(boxes_wh[valid_mask], -2)
+        anchors = np.expand_dims(anchors, 0)
+        anchors_max = anchors / 2.
+        anchors_min = -anchors_max
+        boxes_max = wh / 2.
+        boxes_min = -boxes_max
+        intersect_min = np.maximum(boxes_min, anchors_min)
+        intersect_max = np.minimum(boxes_max, anchors_max)
+        intersect_wh = np.maximum(intersect_max - intersect_min, 0.)
+        intersect_area = intersect_wh[..., 0] * intersect_wh[..., 1]
+        box_area = wh[..., 0] * wh[..., 1]
+        anchor_area = anchors[..., 0] * anchors[..., 1]
+        iou = intersect_area / (box_area + anchor_area - intersect_area)
+
+        # topk iou, then best anchor for gt, in the order they are written by _preprocess_true_boxes
+        topk = 4
+        topk_flag = iou.argsort()
+        topk_flag = topk_flag >= topk_flag.shape[1] - topk
+        t, n = topk_flag.nonzero()
+        keep = iou[t, n] >= iou_threshold
+        t = np.concatenate([t[keep], np.arange(iou.shape[0])])
+        n = np.concatenate([n[keep], np.argmax(iou, axis=-1)])
+        boxes = true_boxes[batch_index[t], box_index[t]]
+        for l in range(num_layers):
+            layer_mask = np.isin(n, anchor_mask[l])
+            if not layer_mask.any():
+                continue
+            layer_boxes = boxes[layer_mask]
+            i = np.floor(layer_boxes[:, 0].astype(np.float64) * grid_shapes[l][1]).astype('int32')  # grid_y
+            j = np.floor(layer_boxes[:, 1].astype(np.float64) * grid_shapes[l][0]).astype('int32')  # grid_x
+            k = np.searchsorted(anchor_mask[l], n[layer_mask])
+            c = layer_boxes[:, 4].astype('int32')
+            cells = np.ravel_multi_index((batch_index[t[layer_mask]], j, i, k), y_true[l].shape[:4], mode='wrap')
+            # the last write of a cell wins, as the sequential writes of _preprocess_true_boxes
+            _, last = np.unique(cells[::-1], return_index=True)
+            last = cells.size - 1 - last
+            y_flat = y_true[l].reshape(-1, 5 + num_classes)
+            y_flat[cells[last], 0:4] = layer_boxes[last, 0:4]
+            y_flat[cells[last], 4] = 1.
+
+            # lable-smooth
+            if label_smooth:
+                sigma = label_smooth_factor / (num_classes - 1)
+                y_flat[cells[last], 5:] = sigma
+                y_flat[cells[last], 5 + c[last]] = 1 - label_smooth_factor
+            else:
+                y_flat[cells, 5 + c] = 1.
+
+    # pad_gt_boxes for avoiding dynamic shape, top N of each pad_gt_box is real box, and after are pad by zero
+    pad_gt_boxes = []
+    for l in range(num_layers):
+        mask = np.reshape(y_true[l][..., 4], [batch_size, -1]) == 1
+        gt_box = np.reshape(y_true[l][..., 0:4], [batch_size, -1, 4])
+        rank = np.cumsum(mask, axis=1) - 1
+        image_index, cell_index = (mask & (rank < max_boxes)).nonzero()
+        pad_gt_box = np.zeros(shape=[batch_size, max_boxes, 4], dtype=np.float32)
+        pad_gt_box[image_index, rank[image_index, cell_index]] = gt_box[image_index, cell_index]
+        pad_gt_boxes.append(pad_gt_box)
+    return y_true[0], y_true[1], y_true[2], pad_gt_boxes[0], pad_gt_boxes[1], pad_gt_boxes[2]
+
+
+class PreprocessTrueBoxBatch(PreprocessTrueBox):
+    """
+    Vectorized PreprocessTrueBox for a whole batch, which is used as the per_batch_map of dataset.batch.
+    All images in the batch share the same input size.
+    """
+    def __call__(self, annos, input_shapes, batch_info):
+        bbox_true_1, bbox_true_2, bbox_true_3, gt_box1, gt_box2, gt_box3 = \
+            batch_preprocess_true_box_vectorized(annos=np.stack(annos), anchors=self.anchor_scales,
+                                                 in_shape=input_shapes[0], num_classes=self.num_classes,
+                                                 max_boxes=self.max_box, label_smooth=self.label_smooth,
+                                                 label_smooth_factor=self.label_smooth_factor)
+        return annos, bbox_true_1, bbox_true_2, bbox_true_3, gt_box1, gt_box2, gt_box3
@@ -22,7 +22,8 @@ from PIL import Image
 from pycocotools.coco import COCO
 import mindspore.dataset as ds
 from src.distributed_sampler import DistributedSampler
-from src.transforms import reshape_fn, MultiScaleTrans, PreprocessTrueBox
+from src.transforms import reshape_fn, MultiScaleTrans, PreprocessTrueBoxBatch
+from src.image_cache import RamImageCache, DiskImageCache, get_cache_shape, downscale_image
 
 
 min_keypoints_per_image = 10
@@ -58,7 +59,8 @@ def has_valid_annotation(anno):
 class COCOYoloDataset:
     """YOLOV5 Dataset for COCO."""
     def __init__(self, root, ann_file, remove_images_without_annotations=True,
-                 filter_crowd_anno=True, is_training=True):
+                 filter_crowd_anno=True, is_training=True, image_cache="", image_cache_ram_mb=4096,
+                 image_cache_dir="./image_cache", image_cache_max_side=0):
         self.coco = COCO(ann_file)
         self.root = root
         self.img_ids = list(sorted(self.coco.imgs.keys()))
@@ -85,6 +87,52 @@ class COCOYoloDataset:
         }
         self.count = 0
 
+        # Decoded images are cached when training, the ram cache lives in each worker process,
+        # while the disk cache is a memory-mapped file shared by all the workers
+        self.image_cache_max_side = 0
+        self.image_cache = None
+        self.targets = {}
+        if is_training and image_cache == "ram":
+            self.image_cache = RamImageCache(image_cache_ram_mb << 20)
+        elif is_training and image_cache == "disk":
+            shapes = [get_cache_shape(self.coco.imgs[img_id]["height"], self.coco.imgs[img_id]["width"],
+                                      image_cache_max_side) for img_id in self.img_ids]
+            self.image_cache = DiskImageCache(image_cache_dir, self.img_ids, shapes)
+        if self.image_cache is not None:
+            # Only the cached images are downscaled, the same on the mosaic and the single image paths
+            self.image_cache_max_side = image_cache_max_side
+
+    def _load_image(self, img_id):
+        """Load the decoded RGB image and the scale of it against the original image."""
+        img_info = self.coco.imgs[img_id]
+        cache_shape = get_cache_shape(img_info["height"], img_info["width"], self.image_cache_max_side)
+        img = self.image_cache.get(img_id) if self.image_cache is not None else None
+        if img is None:
+            img = np.array(Image.open(os.path.join(self.root, img_info["file_name"])).convert("RGB"))
+            if self.image_cache_max_side > 0:
+                img = downscale_image(img, cache_shape)
+            if self.image_cache is not None:
+                self.image_cache.put(img_id, img)
+        scale = img.shape[1] / img_info["width"] if self.image_cache_max_side > 0 else 1.0
+        return img, scale
+
+    def _load_target(self, img_id):
+        """Load the boxes of an image as an array of [x_min y_min x_max y_max, label], cached per worker."""
+        target = self.targets.get(img_id)
+        if target is None:
+            annos = self.coco.loadAnns(self.coco.getAnnIds(imgIds=img_id))
+            # filter crowd annotations
+            if self.filter_crowd_anno:
+                annos = [anno for anno in annos if anno["iscrowd"] == 0]
+            target = np.zeros((len(annos), 5), dtype=np.float64)
+            if annos:
+                target[:, :4] = [anno["bbox"] for anno in annos]
+                # convert to [x_min y_min x_max y_max]
+                target[:, 2:4] += target[:, 0:2]
+                target[:, 4] = [self.cat_ids_to_continuous_ids[anno["category_id"]] for anno in annos]
+            self.targets[img_id] = target
+        return target
+
     def _mosaic_preprocess(self, index, input_size):
         labels4 = []
         s = 384
@@ -92,11 +140,8 @@ class COCOYoloDataset:
         yc, xc = [int(random.uniform(-x, 2 * s + x)) for x in self.mosaic_border]
         indices = [index] + [random.randint(0, len(self.img_ids) - 1) for _ in range(3)]
         for i, img_ids_index in enumerate(indices):
-            coco = self.coco
             img_id = self.img_ids[img_ids_index]
-            img_path = coco.loadImgs(img_id)[0]["file_name"]
-            img = Image.open(os.path.join(self.root, img_path)).convert("RGB")
-            img = np.array(img)
+            img, scale = self._load_image(img_id)
             h, w = img.shape[:2]
 
             if i == 0:  # top left
@@ -118,43 +163,11 @@ class COCOYoloDataset:
             padw = x1a - x1b
             padh = y1a - y1b
 
-            ann_ids = coco.getAnnIds(imgIds=img_id)
-            target = coco.loadAnns(ann_ids)
-            # filter crowd annotations
-            if self.filter_crowd_anno:
-                annos = [anno for anno in target if anno["iscrowd"] == 0]
-            else:
-                annos = [anno for anno in target]
-
-            target = {}
-            boxes = [anno["bbox"] for anno in annos]
-            target["bboxes"] = boxes
-
-            classes = [anno["category_id"] for anno in annos]
-            classes = [self.cat_ids_to_continuous_ids[cl] for cl in classes]
-            target["labels"] = classes
-
-            bboxes = target['bboxes']
-            labels = target['labels']
-            out_target = []
-
-            for bbox, label in zip(bboxes, labels):
-                tmp = []
-                # convert to [x_min y_min x_max y_max]
-                bbox = self._convetTopDown(bbox)
-                tmp.extend(bbox)
-                tmp.append(int(label))
-                # tmp [x_min y_min x_max y_max, label]
-                out_target.append(tmp)  # 这里out_target是label的实际宽高，对应于图片中的实际度量
-
-            labels = out_target.copy()
-            labels = np.array(labels)
-            out_target = np.array(out_target)
-
-            labels[:, 0] = out_target[:, 0] + padw
-            labels[:, 1] = out_target[:, 1] + padh
-            labels[:, 2] = out_target[:, 2] + padw
-            labels[:, 3] = out_target[:, 3] + padh
+            # labels [x_min y_min x_max y_max, label] in the pixels of the mosaic image
+            labels = self._load_target(img_id).copy()
+            labels[:, :4] *= scale
+            labels[:, [0, 2]] += padw
+            labels[:, [1, 3]] += padh
             labels4.append(labels)
 
         if labels4:
@@ -182,47 +195,20 @@ class COCOYoloDataset:
         input_size = [640, 640]
         if self.mosaic and random.random() < 0.5:
             return self._mosaic_preprocess(index, input_size)
+        out_target = self._load_target(img_id)
+        if self.image_cache is not None:
+            # The image is decoded already, so the flag tells MultiScaleTrans to skip decoding
+            img, scale = self._load_image(img_id)
+            out_target = out_target.copy()
+            out_target[:, :4] *= scale
+            return np.array(img), out_target.tolist(), input_size, np.array([1])
         img = np.fromfile(os.path.join(self.root, img_path), dtype='int8')
-        ann_ids = coco.getAnnIds(imgIds=img_id)
-        target = coco.loadAnns(ann_ids)
-        # filter crowd annotations
-        if self.filter_crowd_anno:
-            annos = [anno for anno in target if anno["iscrowd"] == 0]
-        else:
-            annos = [anno for anno in target]
-
-        target = {}
-        boxes = [anno["bbox"] for anno in annos]
-        target["bboxes"] = boxes
-
-        classes = [anno["category_id"] for anno in annos]
-        classes = [self.cat_ids_to_continuous_ids[cl] for cl in classes]
-        target["labels"] = classes
-
-        bboxes = target['bboxes']
-        labels = target['labels']
-        out_target = []
-        for bbox, label in zip(bboxes, labels):
-            tmp = []
-            # convert to [x_min y_min x_max y_max]
-            bbox = self._convetTopDown(bbox)
-            tmp.extend(bbox)
-            tmp.append(int(label))
-            # tmp [x_min y_min x_max y_max, label]
-            out_target.append(tmp)
         flag = np.array([0])
-        return img, out_target, input_size, flag
+        return img, out_target.tolist(), input_size, flag
 
     def __len__(self):
         return len(self.img_ids)
 
-    def _convetTopDown(self, bbox):
-        x_min = bbox[0]
-        y_min = bbox[1]
-        w = bbox[2]
-        h = bbox[3]
-        return [x_min, y_min, x_min+w, y_min+h]
-
 
 def create_yolo_dataset(image_dir, anno_path, batch_size, device_num, rank,
                         config=None, is_training=True, shuffle=True):
@@ -237,7 +223,10 @@ def create_yolo_dataset(image_dir, anno_path, batch_size, device_num, rank,
         remove_empty_anno = False
 
     yolo_dataset = COCOYoloDataset(root=image_dir, ann_file=anno_path, filter_crowd_anno=filter_crowd,
-                                   remove_images_without_annotations=remove_empty_anno, is_training=is_training)
+                                   remove_images_without_annotations=remove_empty_anno, is_training=is_training,
+                                   image_cache=config.image_cache, image_cache_ram_mb=config.image_cache_ram_mb,
+                                   image_cache_dir=config.image_cache_dir,
+                                   image_cache_max_side=config.image_cache_max_side)
     distributed_sampler = DistributedSampler(len(yolo_dataset), device_num, rank, shuffle=shuffle)
     yolo_dataset.size = len(distributed_sampler)
 
@@ -261,11 +250,10 @@ def create_yolo_dataset(image_dir, anno_path, batch_size, device_num, rank,
         dataset = dataset.map(operations=multi_scale_trans, input_columns=dataset_column_names,
                               output_columns=map1_out_column_names,
                               num_parallel_workers=min(12, num_parallel_workers), python_multiprocessing=True)
-        dataset = dataset.map(operations=PreprocessTrueBox(config), input_columns=map2_in_column_names,
-                              output_columns=map2_out_column_names,
-                              num_parallel_workers=min(4, num_parallel_workers), python_multiprocessing=False)
+        dataset = dataset.batch(batch_size, per_batch_map=PreprocessTrueBoxBatch(config),
+                                input_columns=map2_in_column_names, output_columns=map2_out_column_names,
+                                num_parallel_workers=min(4, num_parallel_workers), drop_remainder=True)
         dataset = dataset.project(output_column_names)
-        dataset = dataset.batch(batch_size, num_parallel_workers=min(4, num_parallel_workers), drop_remainder=True)
     else:
         dataset = ds.GeneratorDataset(yolo_dataset, column_names=["image", "img_id"],
                                       sampler=distributed_sampler)
@@ -21,13 +21,12 @@ import argparse
 import numpy as np
 import mindspore.nn as nn
 import mindspore.dataset as ds
-import mindspore.common.dtype as mstype
 from mindspore.train.serialization import load_checkpoint
 from mindspore import Tensor
 from mindspore import Model, context
 
 from src.config import ConfigGCN
-from src.dataset import get_adj_features_labels, get_mask
+from src.dataset import get_adj_features_labels, get_mask, to_adj_tensor
 from src.metrics import Loss_Gpu
 from src.gcn import GCN_GPU
 
@@ -47,18 +46,18 @@ def run_gcn_infer():
     context.set_context(mode=context.GRAPH_MODE,
                         device_target=args_opt.device_target, save_graphs=False)
     config = ConfigGCN()
-    adj, feature, label_onehot, _ = get_adj_features_labels(args_opt.data_dir)
+    adj, feature, label_onehot, _ = get_adj_features_labels(args_opt.data_dir, sparse=config.sparse_adj)
     feature_d = np.expand_dims(feature, axis=0)
     label_onehot_d = np.expand_dims(label_onehot, axis=0)
     data = {"feature": feature_d, "label": label_onehot_d}
     dataset = ds.NumpySlicesDataset(data=data)
-    adj = Tensor(adj, dtype=mstype.float32)
+    adj = to_adj_tensor(adj, config.sparse_adj)
     feature = Tensor(feature)
     nodes_num = label_onehot.shape[0]
     test_mask = get_mask(nodes_num, nodes_num - args_opt.test_nodes_num, nodes_num)
     class_num = label_onehot.shape[1]
     input_dim = feature.shape[1]
-    gcn_net_test = GCN_GPU(config, input_dim, class_num, adj)
+    gcn_net_test = GCN_GPU(config, input_dim, class_num, adj, sparse_adj=config.sparse_adj)
     load_checkpoint(args_opt.model_ckpt, net=gcn_net_test)
     eval_metrics = {'Acc': nn.Accuracy()}
     criterion = Loss_Gpu(test_mask, config.weight_decay, gcn_net_test.trainable_params()[0])
@@ -33,3 +33,5 @@ class ConfigGCN():
     eval_start_epoch = 100
     save_best_ckpt = True
     eval_interval = 1
+    # Feed the normalized adjacency matrix as COO indices and values instead of a dense N x N matrix
+    sparse_adj = True
@@ -27,6 +27,8 @@ In this example, we use dataset splits provided by https://github.com/kimiyoung/
 import numpy as np
 import scipy.sparse as sp
 import mindspore.dataset as ds
+import mindspore.common.dtype as mstype
+from mindspore import Tensor
 
 
 def normalize_adj(adj):
@@ -38,8 +40,14 @@ def normalize_adj(adj):
     return adj.dot(d_mat_inv_sqrt).transpose().dot(d_mat_inv_sqrt).tocoo()
 
 
-def get_adj_features_labels(data_dir):
-    """Get adjacency matrix, node features and labels from dataset."""
+def get_adj_features_labels(data_dir, sparse=False):
+    """
+    Get adjacency matrix, node features and labels from dataset.
+
+    The adjacency matrix is built as CSR without any dense N x N intermediate. If sparse is True, the normalized
+    adjacency matrix is returned as COO (indices, values), otherwise it is densified for the export and inference
+    scripts, which need a fixed shape input.
+    """
     g = ds.GraphData(data_dir)
     nodes = g.get_all_nodes(0)
     nodes_list = nodes.tolist()
@@ -52,21 +60,41 @@ def get_adj_features_labels(data_dir):
     labels_onehot = np.eye(nodes_num, class_num)[labels].astype(np.float32)
 
     neighbor = g.get_all_neighbors(nodes_list, 0)
-    node_map = {node_id: index for index, node_id in enumerate(nodes_list)}
-    adj = np.zeros([nodes_num, nodes_num], dtype=np.float32)
-    for index, value in np.ndenumerate(neighbor):
-        # The first column of neighbor is node_id, second column to last column are neighbors of the first column.
-        # So we only care index[1] > 1.
-        # If the node does not have that many neighbors, -1 is padded. So if value < 0, we will not deal with it.
-        if value >= 0 and index[1] > 0:
-            adj[node_map[neighbor[index[0], 0]], node_map[value]] = 1
-    adj = sp.coo_matrix(adj)
+    # The first column of neighbor is node_id, second column to last column are neighbors of the first column.
+    # If the node does not have that many neighbors, -1 is padded.
+    node_index = np.full(nodes.max() + 1, -1, dtype=np.int64)
+    node_index[nodes] = np.arange(nodes_num)
+    neighbor_ids = neighbor[:, 1:]
+    valid = neighbor_ids >= 0
+    rows = node_index[np.broadcast_to(neighbor[:, :1], neighbor_ids.shape)[valid]]
+    cols = node_index[neighbor_ids[valid]]
+    adj = sp.csr_matrix((np.ones(rows.shape[0], dtype=np.float32), (rows, cols)), shape=(nodes_num, nodes_num))
+    # Duplicated edges are summed by csr_matrix, but the adjacency matrix is binary
+    adj.data[:] = 1
     adj = adj + adj.T.multiply(adj.T > adj) + sp.eye(nodes_num)
     nor_adj = normalize_adj(adj)
+    if sparse:
+        return sparse_adj_to_coo(nor_adj), features, labels_onehot, labels
     nor_adj = np.array(nor_adj.todense())
     return nor_adj, features, labels_onehot, labels
 
 
+def sparse_adj_to_coo(adj):
+    """Convert a scipy sparse matrix to the COO indices with shape (nnz, 2) and values with shape (nnz,)."""
+    adj = adj.tocoo()
+    indices = np.stack([adj.row, adj.col], axis=1).astype(np.int32)
+    values = adj.data.astype(np.float32)
+    return indices, values
+
+
+def to_adj_tensor(adj, sparse=False):
+    """Convert the adjacency matrix from get_adj_features_labels to the input of the GCN layers."""
+    if sparse:
+        indices, values = adj
+        return Tensor(indices, mstype.int32), Tensor(values, mstype.float32)
+    return Tensor(adj, dtype=mstype.float32)
+
+
 def get_mask(total, begin, end):
     """Generate mask."""
     mask = np.zeros([total]).astype(np.float32)
@@ -35,9 +35,11 @@ class GraphConvolution(nn.Cell):
         feature_out_dim (int): The output feature dimension.
         dropout_ratio (float): Dropout ratio for the dropout layer. Default: None.
         activation (str): Activation function applied to the output of the layer, eg. 'relu'. Default: None.
+        sparse_adj (bool): Whether adj is given as COO (indices, values) instead of a dense matrix. Default: False.
 
     Inputs:
-        - **adj** (Tensor) - Tensor of shape :math:`(N, N)`.
+        - **adj** (Union[Tensor, tuple]) - Tensor of shape :math:`(N, N)`, or a tuple of COO indices of shape
+          :math:`(E, 2)` and values of shape :math:`(E,)` if sparse_adj is True.
         - **input_feature** (Tensor) - Tensor of shape :math:`(N, C)`.
 
     Outputs:
@@ -48,7 +50,8 @@ class GraphConvolution(nn.Cell):
                  feature_in_dim,
                  feature_out_dim,
                  dropout_ratio=None,
-                 activation=None):
+                 activation=None,
+                 sparse_adj=False):
         super(GraphConvolution, self).__init__()
         self.in_dim = feature_in_dim
         self.out_dim = feature_out_dim
@@ -64,6 +67,17 @@ class GraphConvolution(nn.Cell):
         self.activation = get_activation(activation)
         self.activation_flag = self.activation is not None
         self.matmul = P.MatMul()
+        self.sparse_adj = sparse_adj
+        self.gather = P.Gather()
+        self.expand_dims = P.ExpandDims()
+        self.unsorted_segment_sum = P.UnsortedSegmentSum()
+        self.shape = P.Shape()
+
+    def sparse_matmul(self, adj, fc):
+        """Multiply the COO adjacency matrix with fc, the memory is linear with the number of edges."""
+        indices, values = adj
+        message = self.gather(fc, indices[:, 1], 0) * self.expand_dims(values, 1)
+        return self.unsorted_segment_sum(message, indices[:, 0], self.shape(fc)[0])
 
     def construct(self, adj, input_feature):
         """
@@ -74,7 +88,10 @@ class GraphConvolution(nn.Cell):
             dropout = self.dropout(dropout)
 
         fc = self.fc(dropout)
-        output_feature = self.matmul(adj, fc)
+        if self.sparse_adj:
+            output_feature = self.sparse_matmul(adj, fc)
+        else:
+            output_feature = self.matmul(adj, fc)
 
         if self.activation_flag:
             output_feature = self.activation(output_feature)
@@ -90,12 +107,14 @@ class GCN(nn.Cell):
         adj (numpy.ndarray): Numbers of block in different layers.
         feature (numpy.ndarray): Input channel in each layer.
         output_dim (int): The number of output channels, equal to classes num.
+        sparse_adj (bool): Whether adj is given as COO (indices, values). Default: False.
     """
 
-    def __init__(self, config, input_dim, output_dim):
+    def __init__(self, config, input_dim, output_dim, sparse_adj=False):
         super(GCN, self).__init__()
-        self.layer0 = GraphConvolution(input_dim, config.hidden1, activation="relu", dropout_ratio=config.dropout)
-        self.layer1 = GraphConvolution(config.hidden1, output_dim, dropout_ratio=None)
+        self.layer0 = GraphConvolution(input_dim, config.hidden1, activation="relu", dropout_ratio=config.dropout,
+                                       sparse_adj=sparse_adj)
+        self.layer1 = GraphConvolution(config.hidden1, output_dim, dropout_ratio=None, sparse_adj=sparse_adj)
 
     def construct(self, adj, feature):
         output0 = self.layer0(adj, feature)
@@ -111,12 +130,14 @@ class GCN_GPU(nn.Cell):
         adj (numpy.ndarray): Numbers of block in different layers.
         feature (numpy.ndarray): Input channel in each layer.
         output_dim (int): The number of output channels, equal to classes num.
+        sparse_adj (bool): Whether adj is given as COO (indices, values). Default: False.
     """
 
-    def __init__(self, config, input_dim, output_dim, adj):
+    def __init__(self, config, input_dim, output_dim, adj, sparse_adj=False):
         super(GCN_GPU, self).__init__()
-        self.layer0 = GraphConvolution(input_dim, config.hidden1, activation="relu", dropout_ratio=config.dropout)
-        self.layer1 = GraphConvolution(config.hidden1, output_dim, dropout_ratio=None)
+        self.layer0 = GraphConvolution(input_dim, config.hidden1, activation="relu", dropout_ratio=config.dropout,
+                                       sparse_adj=sparse_adj)
+        self.layer1 = GraphConvolution(config.hidden1, output_dim, dropout_ratio=None, sparse_adj=sparse_adj)
         self.adj = adj
     def construct(self, feature):
         output0 = self.layer0(self.adj, feature)
@@ -26,7 +26,6 @@ from sklearn import manifold
 from mindspore import Tensor
 import mindspore.dataset as ds
 import mindspore.nn as nn
-import mindspore.common.dtype as mstype
 from mindspore.train.serialization import save_checkpoint, load_checkpoint
 from mindspore.train.callback import ModelCheckpoint, CheckpointConfig, TimeMonitor, LossMonitor
 from mindspore import Model, context
@@ -34,7 +33,7 @@ from mindspore import Model, context
 from src.gcn import GCN, GCN_GPU
 from src.metrics import LossAccuracyWrapper, TrainNetWrapper, Loss_Gpu
 from src.config import ConfigGCN
-from src.dataset import get_adj_features_labels, get_mask
+from src.dataset import get_adj_features_labels, get_mask, to_adj_tensor
 
 from model_utils.config import config as default_args
 from model_utils.moxing_adapter import moxing_wrapper
@@ -119,7 +118,7 @@ def run_gpu_train():
     config = ConfigGCN()
     if not os.path.exists(config.ckpt_dir):
         os.mkdir(config.ckpt_dir)
-    adj, feature, label_onehot, _ = get_adj_features_labels(default_args.data_dir)
+    adj, feature, label_onehot, _ = get_adj_features_labels(default_args.data_dir, sparse=config.sparse_adj)
     feature_d = np.expand_dims(feature, axis=0)
     label_onehot_d = np.expand_dims(label_onehot, axis=0)
     data = {"feature": feature_d, "label": label_onehot_d}
@@ -129,13 +128,13 @@ def run_gpu_train():
                          default_args.train_nodes_num + default_args.eval_nodes_num)
     class_num = label_onehot.shape[1]
     input_dim = feature.shape[1]
-    adj = Tensor(adj, dtype=mstype.float32)
+    adj = to_adj_tensor(adj, config.sparse_adj)
     ckpt_config = CheckpointConfig(save_checkpoint_steps=config.save_ckpt_steps,
                                    keep_checkpoint_max=config.keep_ckpt_max)
     ckpoint_cb = ModelCheckpoint(prefix='ckpt_gcn',
                                  directory=config.ckpt_dir,
                                  config=ckpt_config)
-    gcn_net = GCN_GPU(config, input_dim, class_num, adj)
+    gcn_net = GCN_GPU(config, input_dim, class_num, adj, sparse_adj=config.sparse_adj)
     cb = [TimeMonitor(), LossMonitor(), ckpoint_cb]
     opt = nn.Adam(gcn_net.trainable_params(), learning_rate=config.learning_rate)
     criterion = Loss_Gpu(eval_mask, config.weight_decay, gcn_net.trainable_params()[0])
@@ -157,7 +156,7 @@ def run_train():
     context.set_context(mode=context.GRAPH_MODE,
                         device_target=default_args.device_target, save_graphs=False)
     config = ConfigGCN()
-    adj, feature, label_onehot, label = get_adj_features_labels(default_args.data_dir)
+    adj, feature, label_onehot, label = get_adj_features_labels(default_args.data_dir, sparse=config.sparse_adj)
 
     nodes_num = label_onehot.shape[0]
     train_mask = get_mask(nodes_num, 0, default_args.train_nodes_num)
@@ -167,10 +166,10 @@ def run_train():
 
     class_num = label_onehot.shape[1]
     input_dim = feature.shape[1]
-    gcn_net = GCN(config, input_dim, class_num)
+    gcn_net = GCN(config, input_dim, class_num, sparse_adj=config.sparse_adj)
     gcn_net.add_flags_recursive(fp16=True)
 
-    adj = Tensor(adj)
+    adj = to_adj_tensor(adj, config.sparse_adj)
     feature = Tensor(feature)
 
     eval_net = LossAccuracyWrapper(gcn_net, label_onehot, eval_mask, config.weight_decay)
@@ -217,7 +216,7 @@ def run_train():
         os.makedirs(default_args.save_ckptpath)
     ckpt_path = os.path.join(default_args.save_ckptpath, "gcn.ckpt")
     save_checkpoint(gcn_net, ckpt_path)
-    gcn_net_test = GCN(config, input_dim, class_num)
+    gcn_net_test = GCN(config, input_dim, class_num, sparse_adj=config.sparse_adj)
     load_checkpoint(ckpt_path, net=gcn_net_test)
     gcn_net_test.add_flags_recursive(fp16=True)
 
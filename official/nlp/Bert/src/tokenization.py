@@ -19,6 +19,9 @@ Tokenization.
 
 import unicodedata
 import collections
+import functools
+import multiprocessing
+import numpy as np
 
 def convert_to_unicode(text):
     """
@@ -78,6 +81,25 @@ def whitespace_tokenize(text):
     return tokens
 
 
+@functools.lru_cache(maxsize=None)
+def load_vocab(vocab_file):
+    """
+    Loads a vocab file only once per process.
+    Args:
+        vocab_file: path to vocab.txt.
+
+    Returns:
+        a dict whose key is token, and an array of tokens indexed by id.
+    """
+    tokens = []
+    with open(vocab_file, "r") as reader:
+        for line in reader:
+            tokens.append(convert_to_unicode(line).strip())
+    vocab_dict = {token: index for index, token in enumerate(tokens)}
+    id_to_token = np.array(tokens, dtype=object)
+    return vocab_dict, id_to_token
+
+
 def convert_tokens_to_ids(vocab_file, tokens):
     """
     Convert tokens to ids.
@@ -88,11 +110,8 @@ def convert_tokens_to_ids(vocab_file, tokens):
     Returns:
         list of ids.
     """
-    vocab_dict = vocab_to_dict_key_token(vocab_file)
-    output = []
-    for token in tokens:
-        output.append(vocab_dict[token])
-    return output
+    vocab_dict, _ = load_vocab(vocab_file)
+    return [vocab_dict[token] for token in tokens]
 
 
 def convert_ids_to_tokens(vocab_file, ids):
@@ -105,22 +124,34 @@ def convert_ids_to_tokens(vocab_file, ids):
     Returns:
         list of tokens.
     """
-    vocab_dict = vocab_to_dict_key_id(vocab_file)
-    output = []
-    for _id in ids:
-        output.append(vocab_dict[_id])
-    return output
+    _, id_to_token = load_vocab(vocab_file)
+    return id_to_token[np.asarray(ids, dtype=np.int64)].tolist()
+
+
+_worker_tokenizer = None
+
+
+def _init_tokenize_worker(vocab_file, do_lower_case, cache_size):
+    """Builds the tokenizer once in each worker process."""
+    global _worker_tokenizer
+    _worker_tokenizer = FullTokenizer(vocab_file, do_lower_case, cache_size)
+
+
+def _tokenize_in_worker(text):
+    return _worker_tokenizer.tokenize(text)
 
 
 class FullTokenizer():
     """
     Full tokenizer
     """
-    def __init__(self, vocab_file, do_lower_case=True):
-        self.vocab_dict = vocab_to_dict_key_token(vocab_file)
+    def __init__(self, vocab_file, do_lower_case=True, cache_size=1 << 18):
+        self.vocab_file = vocab_file
+        self.vocab_dict, self.id_to_token = load_vocab(vocab_file)
         self.do_lower_case = do_lower_case
+        self.cache_size = cache_size
         self.basic_tokenize = BasicTokenizer(do_lower_case)
-        self.wordpiece_tokenize = WordpieceTokenizer(self.vocab_dict)
+        self.wordpiece_tokenize = WordpieceTokenizer(self.vocab_dict, cache_size=cache_size)
 
     def tokenize(self, text):
         """
@@ -138,6 +169,32 @@ class FullTokenizer():
             tokens_ret.extend(wordpiece_tokens)
         return tokens_ret
 
+    def tokenize_batch(self, texts, num_workers=None, chunksize=64):
+        """
+        Do full tokenization on a list of texts with a process pool.
+        Args:
+            texts: list of str.
+            num_workers: number of worker processes, default is the cpu count. Run in the current process if 1.
+            chunksize: number of texts sent to a worker at a time.
+
+        Returns:
+            list of token lists, in the same order as texts.
+        """
+        num_workers = num_workers or multiprocessing.cpu_count()
+        if num_workers <= 1 or len(texts) <= chunksize:
+            return [self.tokenize(text) for text in texts]
+        with multiprocessing.Pool(num_workers, initializer=_init_tokenize_worker,
+                                  initargs=(self.vocab_file, self.do_lower_case, self.cache_size)) as pool:
+            return pool.map(_tokenize_in_worker, texts, chunksize=chunksize)
+
+    def convert_tokens_to_ids(self, tokens):
+        """Convert tokens to ids with the loaded vocab."""
+        return [self.vocab_dict[token] for token in tokens]
+
+    def convert_ids_to_tokens(self, ids):
+        """Convert ids to tokens with the loaded vocab."""
+        return self.id_to_token[np.asarray(ids, dtype=np.int64)].tolist()
+
 
 class BasicTokenizer():
     """
@@ -249,10 +306,54 @@ class BasicTokenizer():
 
 class WordpieceTokenizer():
     """
-    Wordpiece tokenizer
+    Wordpiece tokenizer, the longest-match-first search runs on prefix tries of the vocab,
+    and the pieces of recently seen words are kept in a LRU cache.
     """
-    def __init__(self, vocab):
+    _END = ""
+
+    def __init__(self, vocab, cache_size=1 << 18):
         self.vocab_dict = vocab
+        # One trie for the pieces at the start of a word, one for the "##" continuation pieces
+        self.start_trie = {}
+        self.suffix_trie = {}
+        for token in vocab:
+            if token.startswith("##"):
+                if len(token) > 2:
+                    self._insert(self.suffix_trie, token[2:], token)
+            elif token:
+                self._insert(self.start_trie, token, token)
+        self._tokenize_word = functools.lru_cache(maxsize=cache_size)(self._tokenize_word_uncached)
+
+    def _insert(self, trie, key, token):
+        node = trie
+        for char in key:
+            node = node.setdefault(char, {})
+        node[self._END] = token
+
+    def _longest_match(self, trie, word, start):
+        """Returns the longest piece starting at start and its end, or (None, start) if no piece matches."""
+        node = trie
+        piece, piece_end = None, start
+        for i in range(start, len(word)):
+            node = node.get(word[i])
+            if node is None:
+                break
+            if self._END in node:
+                piece, piece_end = node[self._END], i + 1
+        return piece, piece_end
+
+    def _tokenize_word_uncached(self, word):
+        output_tokens = []
+        start = 0
+        len_chars = len(word)
+        while start < len_chars:
+            trie = self.start_trie if start == 0 else self.suffix_trie
+            piece, start = self._longest_match(trie, word, start)
+            if piece is None:
+                output_tokens.append("[UNK]")
+                break
+            output_tokens.append(piece)
+        return tuple(output_tokens)
 
     def tokenize(self, tokens):
         """
@@ -266,24 +367,7 @@ class WordpieceTokenizer():
         output_tokens = []
         tokens = convert_to_unicode(tokens)
         for token in whitespace_tokenize(tokens):
-            chars = list(token)
-            len_chars = len(chars)
-            start = 0
-            end = len_chars
-            while start < len_chars:
-                while start < end:
-                    substr = "".join(token[start:end])
-                    if start != 0:
-                        substr = "##" + substr
-                    if substr in self.vocab_dict:
-                        output_tokens.append(substr)
-                        start = end
-                        end = len_chars
-                    else:
-                        end = end - 1
-                if start == end and start != len_chars:
-                    output_tokens.append("[UNK]")
-                    break
+            output_tokens.extend(self._tokenize_word(token))
         return output_tokens
 
 
@@ -106,9 +106,9 @@ def load_model(args_opt):
 
     per_batch_size = args_opt.per_batch_size
     batch_size = per_batch_size * data_parallel_num
-    # Now only support single batch_size for predict
+    # Batched predict is only supported with state reuse
     if args_opt.run_type == "predict":
-        batch_size = 1
+        batch_size = args_opt.predict_batch_size if use_past else 1
     config = PanguAlphaConfig(
         batch_size=batch_size,
         seq_length=args_opt.seq_length,
@@ -141,7 +141,7 @@ def load_model(args_opt):
     model_predict = Model(eval_net)
     # Compile network and obtain tensor layout for loading ckpt
     inputs_np = Tensor(np.ones(shape=(config.batch_size, config.seq_length)), mstype.int32)
-    current_index = Tensor(np.array([0]), mstype.int32)
+    current_index = Tensor(np.zeros(config.batch_size), mstype.int32)
 
     if args_opt.distribute == "false":
         predict_layout = None
@@ -149,7 +149,7 @@ def load_model(args_opt):
         # Compiling only needs the shape
         predict_layout = model_predict.infer_predict_layout(inputs_np, inputs_np)
     elif config.use_past:
-        batch_valid_length = Tensor(np.array([0]), mstype.int32)
+        batch_valid_length = Tensor(np.zeros(config.batch_size), mstype.int32)
         init_true = Tensor([True], mstype.bool_)
         inputs_np_1 = Tensor(np.ones(shape=(config.batch_size, 1)), mstype.int32)
         model_predict.predict_network.add_flags_recursive(is_first_iteration=True)
@@ -180,9 +180,9 @@ def export_mindir(model_predict, config, export_eval_loss=False):
         export(model_predict.predict_network, inputs_np, inputs_np,
                file_name='pangu_alpha_1024_eval_loss', file_format='MINDIR')
     else:
-        current_index = Tensor(np.array([0]), mstype.int32)
+        current_index = Tensor(np.zeros(config.batch_size), mstype.int32)
 
-        batch_valid_length = Tensor(np.array([0]), mstype.int32)
+        batch_valid_length = Tensor(np.zeros(config.batch_size), mstype.int32)
         init_true = Tensor([True], mstype.bool_)
         inputs_np_1 = Tensor(np.ones(shape=(config.batch_size, 1)), mstype.int32)
 
@@ -197,7 +197,7 @@ def export_mindir(model_predict, config, export_eval_loss=False):
 
 def run_predict(model_predict, config, args_opt):
     """run predict"""
-    from src.generate import generate, generate_increment
+    from src.generate import generate, generate_increment, generate_increment_batch
     # Define tokenizer
     tokenizer = JIEBATokenizer(os.path.join(args_opt.tokenizer_path, 'vocab.model'))
 
@@ -206,6 +206,18 @@ def run_predict(model_predict, config, args_opt):
     tokenized_token = tokenizer.tokenize(sample)
     start_sentence = tokenizer.convert_tokens_to_ids(tokenized_token)
     input_ids = np.array(start_sentence).reshape(1, -1)
+    if config.batch_size > 1:
+        # Serve the prompts together, reusing the key/value states of every row
+        point = TimePoint()
+        point.set_start()
+        output_ids = generate_increment_batch(model_predict, [input_ids[0]] * config.batch_size, args_opt)
+        point.set_end()
+        generated_num = sum(len(ids) for ids in output_ids) - input_ids.size * config.batch_size
+        print(f"Generated {generated_num} tokens in {point.get_spend_time()} seconds, "
+              f"{generated_num / point.get_spend_time()} tokens per second", flush=True)
+        for ids in output_ids:
+            print('Output is:', tokenizer.decode(ids.tolist()), flush=True)
+        return
     # Call inference
     generate_func = generate_increment if config.use_past else generate
     output_ids = generate_func(model_predict, input_ids, args_opt)
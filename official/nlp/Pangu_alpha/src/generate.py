@@ -65,65 +65,98 @@ def get_scores(model_predict, item, tokenizer, pad_length=1024):
 
 
 def topk_fun(logits, topk=5):
-    """Get topk"""
-    target_column = logits[0].tolist()
-    sorted_array = [(k, v) for k, v in enumerate(target_column)]
-    sorted_array.sort(key=lambda x: x[1], reverse=True)
-    topk_array = sorted_array[:topk]
-    index, value = zip(*topk_array)
-    index = np.array([index])
-    value = np.array([value])
+    """Get topk of each row, sorted in descending order"""
+    logits = np.asarray(logits)
+    topk = min(topk, logits.shape[-1])
+    # Select the topk candidates in linear time and only sort the selected ones
+    index = np.argpartition(-logits, topk - 1, axis=-1)[:, :topk]
+    value = np.take_along_axis(logits, index, axis=-1)
+    order = np.argsort(-value, axis=-1, kind='stable')
+    value = np.take_along_axis(value, order, axis=-1)
+    index = np.take_along_axis(index, order, axis=-1)
     return value, index
 
 
-def sampler(log_probs_revised, top_p, top_k_num, use_pynative=False):
-    """Convert the log_probs to probability"""
+def batch_sampler(log_probs_revised, top_p, top_k_num, use_pynative=False, temperature=1.0):
+    """
+    Convert the log_probs of a batch to the probability of the candidate tokens
+
+    Inputs:
+        log_probs_revised: the revised log_probs with shape [batch_size, vocab_size]
+        top_p: top_p sampling threshold, enabled if less than 1.0
+        top_k_num: the number for top_k sampling
+        use_pynative: whether use pynative op for topk
+        temperature: the temperature applied on the log_probs
+
+    Returns:
+        p: the normalized probability of the candidates with shape [batch_size, k]
+        p_args: the token ids of the candidates with shape [batch_size, k]
+    """
+    log_probs_revised = np.asarray(log_probs_revised, np.float32).reshape(-1, np.shape(log_probs_revised)[-1])
+    if temperature != 1.0:
+        # Re-normalize the scaled log_probs with log-softmax, so that the top_p cut sees probabilities summing to 1
+        log_probs_revised = log_probs_revised / temperature
+        max_log_probs = np.max(log_probs_revised, axis=-1, keepdims=True)
+        log_probs_revised = log_probs_revised - max_log_probs - np.log(
+            np.sum(np.exp(log_probs_revised - max_log_probs), axis=-1, keepdims=True))
+    # If top_p is less than 1.0, only consider the 5000 largest logits to reduce computation
+    topk = 5000 if top_p < 1.0 else top_k_num
     if use_pynative:
-        logits = P.Pow()(np.e, Tensor(log_probs_revised, mstype.float32))
+        logits = P.Exp()(Tensor(log_probs_revised, mstype.float32))
+        probs, p_args = P.TopK(sorted=True)(logits, min(topk, log_probs_revised.shape[-1]))
+        probs = probs.asnumpy()
+        p_args = p_args.asnumpy()
     else:
-        logits = np.power(np.e, np.array(log_probs_revised, np.float32))
+        sorted_log_probs, p_args = topk_fun(log_probs_revised, topk)
+        probs = np.exp(sorted_log_probs)
 
-        # If top_p is less than 1.0, use top_p sampling
     if top_p < 1.0:
-        # Only consider the 5000 largest logits to reduce computation
-        if use_pynative:
-            sorted_logits, index = P.TopK(sorted=True)(logits, 5000)
-            cumsum_logits = P.CumSum()(sorted_logits, 1)
-            cumsum_logits = cumsum_logits.asnumpy()
-            index = index.asnumpy()
-            sorted_logits = sorted_logits.asnumpy()
-        else:
-            sorted_logits, index = topk_fun(logits, 5000)
-            cumsum_logits = np.cumsum(sorted_logits, 1)
-        cumsum_logits = cumsum_logits[0]
-        index = index[0]
-        sorted_logits = sorted_logits[0]
-        top_p_num = sum(cumsum_logits < top_p) + 1
-        # In case the probability is smooth, the sum of 5000 largest probabilities are not large enough
-        if top_p_num == 0:
-            top_p_num = 5000
-        # Get the corresponding probs and indices
-        probs = sorted_logits[:top_p_num]
-        p_args = index[:top_p_num]
-        p = probs / sum(probs)
-        # if top_p is set to 1.0, use top_k sampling
-    else:
-        # Get the corresponding probs and indices
-        if use_pynative:
-            probs, p_args = P.TopK(sorted=True)(logits, top_k_num)
-            probs = probs.asnumpy()
-            p_args = p_args.asnumpy()
-        else:
-            probs, p_args = topk_fun(logits, top_k_num)
-        probs = probs[0]
-        p_args = p_args[0]
-        # Avoid rounding error
-        if sum(probs) == 0:
-            probs = np.array([1 / top_k_num for _ in range(top_k_num)])
-        p = probs / sum(probs)
+        # Keep the smallest prefix whose cumulative probability reaches top_p
+        cumsum_probs = np.cumsum(probs, axis=-1)
+        top_p_num = np.sum(cumsum_probs < top_p, axis=-1, keepdims=True) + 1
+        probs = np.where(np.arange(probs.shape[-1]) < top_p_num, probs, 0)
+    # Avoid rounding error, use uniform distribution over the candidates instead
+    probs_sum = np.sum(probs, axis=-1, keepdims=True)
+    zero_rows = probs_sum[:, 0] == 0
+    if zero_rows.any():
+        valid_num = top_p_num[zero_rows] if top_p < 1.0 else probs.shape[-1]
+        probs[zero_rows] = np.arange(probs.shape[-1]) < valid_num
+        probs_sum = np.sum(probs, axis=-1, keepdims=True)
+    p = probs / probs_sum
     return p, p_args
 
 
+def sample_from_probs(p, p_args, num_samples=1, rngs=None):
+    """
+    Draw tokens from the candidates of each row with the inverse CDF
+
+    Inputs:
+        p: the normalized probability of the candidates with shape [batch_size, k]
+        p_args: the token ids of the candidates with shape [batch_size, k]
+        num_samples: the number of samples drawn for each row
+        rngs: optional list of np.random.Generator, one per row, for reproducible sampling
+
+    Returns:
+        tokens: the sampled token ids with shape [batch_size, num_samples]
+    """
+    batch_size, candidate_num = p.shape
+    if rngs is None:
+        uniform = np.random.random_sample((batch_size, num_samples))
+    else:
+        uniform = np.stack([rng.random(num_samples) for rng in rngs])
+    cdf = np.cumsum(p, axis=-1)
+    # The index of the first candidate whose cdf exceeds the uniform sample
+    choice = np.sum(cdf[:, None, :] <= uniform[:, :, None] * cdf[:, None, -1:], axis=-1)
+    choice = np.minimum(choice, candidate_num - 1)
+    return np.take_along_axis(p_args, choice, axis=-1)
+
+
+def sampler(log_probs_revised, top_p, top_k_num, use_pynative=False):
+    """Convert the log_probs to probability"""
+    p, p_args = batch_sampler(log_probs_revised, top_p, top_k_num, use_pynative)
+    return p[0], p_args[0]
+
+
 def generate(model, origin_inputs, config):
     """
     Text generation
@@ -153,7 +186,7 @@ def generate(model, origin_inputs, config):
     target_length = seq_length if target_length > seq_length else target_length
 
     # A list of the frequency of each token
-    frequency_list = np.array([[0 for _ in range(config.vocab_size)]])
+    frequency_list = np.zeros((1, config.vocab_size), dtype=np.int32)
     pad_length = seq_length - origin_inputs.shape[-1]
     # Pad original inputs to seq_length
     input_ids = np.pad(origin_inputs, ((0, 0), (0, pad_length)), 'constant', constant_values=(0, 0))
@@ -221,7 +254,7 @@ def generate_increment(model, origin_inputs, config):
     target_length = seq_length if target_length > seq_length else target_length
 
     # A list of the frequency of each token
-    frequency_list = np.array([[0 for _ in range(config.vocab_size)]])
+    frequency_list = np.zeros((1, config.vocab_size), dtype=np.int32)
     pad_length = seq_length - origin_inputs.shape[-1]
     # Pad original inputs to seq_length
     input_ids = np.pad(origin_inputs, ((0, 0), (0, pad_length)), 'constant', constant_values=(0, 0))
@@ -275,3 +308,112 @@ def generate_increment(model, origin_inputs, config):
         logits = model.predict(input_id, current_index, init, batch_valid_length)
     # Return valid outputs out of padded outputs
     return np.array(outputs)
+
+
+def pad_batch_inputs(origin_inputs, seq_length, pad=0):
+    """
+    Pad a list of prompts with different lengths into a single batch
+
+    Inputs:
+        origin_inputs: a list of 1-D token id arrays
+        seq_length: the padded length of each row
+        pad: the id used for padding
+
+    Returns:
+        input_ids: the padded ids with shape [batch_size, seq_length]
+        valid_length: the number of valid tokens in each row
+    """
+    batch_size = len(origin_inputs)
+    valid_length = np.array([min(len(ids), seq_length) for ids in origin_inputs], np.int32)
+    input_ids = np.full((batch_size, seq_length), pad, np.int32)
+    for i, ids in enumerate(origin_inputs):
+        input_ids[i, :valid_length[i]] = np.asarray(ids).reshape(-1)[:valid_length[i]]
+    return input_ids, valid_length
+
+
+def generate_increment_batch(model, origin_inputs, config):
+    """
+    Batched text generation for incremental inference. The prompts can have different lengths, and the
+    key/value states of all the rows are reused between steps as generate_increment does.
+
+    Inputs:
+        model: the model for inferencing, compiled with batch size equal to len(origin_inputs)
+        origin_inputs: a list of 1-D token id arrays based on which the model will continue writing
+        config: inference configurations
+
+    Returns:
+        outputs: a list of the ids for the generated text, one array per prompt
+    """
+    # Get configurations for inference
+    frequency_penalty = config.frequency_penalty
+    presence_penalty = config.presence_penalty
+    top_p = config.top_p
+    top_k_num = config.top_k_num
+    max_generate_length = config.max_generate_length
+    seq_length = config.seq_length
+    end_token = config.end_token
+    use_pynative = config.use_pynative_op
+    vocab_size = config.vocab_size
+    temperature = config.temperature
+    # Seed a generator for each row to make the sampling reproducible
+    rngs = [np.random.default_rng(config.sample_seed + i) for i in range(len(origin_inputs))] \
+        if config.sample_seed >= 0 else None
+
+    batch_size = len(origin_inputs)
+    input_ids, valid_length = pad_batch_inputs(origin_inputs, seq_length)
+    # Init outputs with original inputs
+    outputs = [input_ids[i, :valid_length[i]].tolist() for i in range(batch_size)]
+    # If target length exceeds seq_length, use seq_length instead
+    target_length = np.minimum(valid_length + max_generate_length, seq_length)
+    # The frequency of each token for each row
+    frequency_list = np.zeros((batch_size, vocab_size), dtype=np.int32)
+    # Rows which are still generating, finished rows are skipped in the post process
+    active = valid_length < target_length
+
+    # Indicate the exact token position of each row in the flattened [batch_size * seq_length] logits
+    current_index = np.maximum(valid_length - 1, 0).astype(np.int32)
+    batch_valid_length = Tensor(current_index, mstype.int32)
+    flatten_index = Tensor(np.arange(batch_size, dtype=np.int32) * seq_length + current_index, mstype.int32)
+    # For first graph, not_init should be false
+    init_true = Tensor([True], mstype.bool_)
+    init_false = Tensor([False], mstype.bool_)
+    # Claim the first graph
+    model.predict_network.add_flags_recursive(is_first_iteration=True)
+    # Call a single inference with input size of (bs, seq_length)
+    logits = model.predict(Tensor(input_ids, mstype.int32), flatten_index, init_false, batch_valid_length)
+
+    # Claim the second graph and set not_init to true
+    model.predict_network.add_flags_recursive(is_first_iteration=False)
+    step_index = Tensor(np.arange(batch_size, dtype=np.int32), mstype.int32)
+    next_tokens = np.zeros((batch_size, 1), np.int32)
+
+    # A single loop generates one token for each active row, loop until all rows reach target length or eod token
+    while active.any():
+        rows = np.flatnonzero(active)
+        log_probs = logits.asnumpy().reshape(batch_size, vocab_size)[rows]
+        # Get the revised log_probs considering frequency and presence penalty to eliminate duplicate in generated results
+        frequency = frequency_list[rows]
+        log_probs_revised = log_probs - frequency * frequency_penalty - (frequency > 0) * presence_penalty
+
+        p, p_args = batch_sampler(log_probs_revised, top_p, top_k_num, use_pynative, temperature)
+        # Random select a token for each active row as final output for this round
+        targets = sample_from_probs(p, p_args, rngs=[rngs[row] for row in rows] if rngs else None)[:, 0]
+        for row, target in zip(rows, targets):
+            # Stop judgment
+            if target == end_token or valid_length[row] == target_length[row] - 1:
+                active[row] = False
+                continue
+            # Update frequency list and outputs with current generated token
+            frequency_list[row, target] += 1
+            outputs[row].append(int(target))
+            next_tokens[row, 0] = target
+            valid_length[row] += 1
+
+        if not active.any():
+            break
+        # Finished rows keep their last position, their outputs are ignored
+        batch_valid_length = Tensor(valid_length - 1, mstype.int32)
+        # Call a single inference with input size of (bs, 1)
+        logits = model.predict(Tensor(next_tokens, mstype.int32), step_index, init_true, batch_valid_length)
+    # Return valid outputs for each prompt
+    return [np.array(output) for output in outputs]
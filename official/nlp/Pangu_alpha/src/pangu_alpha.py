@@ -518,7 +518,7 @@ class EvalNet(nn.Cell):
         generate: enable generate mode
     Inputs:
         input_ids: the tokenized inpus
-        current_index: the index of current token
+        current_index: the index of current token, one flattened index per batch row
         init_reset: whether reset saved states
     Returns:
         outputs: Tensor, corresponding output for different tasks
@@ -552,7 +552,7 @@ class EvalNet(nn.Cell):
                                init_reset, batch_valid_length)
         log_probs = self.log_softmax(logits)
 
-        index = current_index.view(1,)
+        index = current_index.view(-1,)
         logits = self.gather(log_probs, index, 0)
         logits = logits.view(bs, 1, -1)
         return logits
@@ -312,6 +312,18 @@ def add_inference_params(opt):
                      default="true",
                      choices=["true", "false"],
                      help="Whether enable state reuse")
+    opt.add_argument("--predict_batch_size",
+                     type=int,
+                     default=1,
+                     help="the number of prompts generated together when state reuse is enabled")
+    opt.add_argument("--temperature",
+                     type=float,
+                     default=1.0,
+                     help="the temperature applied on the log_probs before sampling")
+    opt.add_argument("--sample_seed",
+                     type=int,
+                     default=-1,
+                     help="the seed of per-prompt random generators for batched sampling, disabled if negative")
 
 
 def add_training_params(opt):
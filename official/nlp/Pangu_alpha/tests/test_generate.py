@@ -0,0 +1,44 @@
+# Copyright 2022 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Test the top_p sampling of src/generate.py"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+pytest.importorskip("mindspore")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from src.generate import batch_sampler  # pylint: disable=wrong-import-position
+
+
+def log_softmax(x):
+    x = x - np.max(x, axis=-1, keepdims=True)
+    return x - np.log(np.sum(np.exp(x), axis=-1, keepdims=True))
+
+
+@pytest.mark.parametrize("temperature", [0.5, 1.0, 2.0])
+def test_top_p_keeps_the_nucleus_mass(temperature):
+    """top_p keeps the smallest prefix of the tempered distribution whose mass reaches top_p, at any temperature."""
+    top_p = 0.9
+    log_probs = log_softmax(np.random.RandomState(0).randn(4, 3000).astype(np.float32) * 2)
+    p, p_args = batch_sampler(log_probs, top_p, top_k_num=5000, temperature=temperature)
+    tempered = np.exp(log_softmax(log_probs.astype(np.float64) / temperature))
+    for row in range(len(log_probs)):
+        kept = p_args[row][p[row] > 0]
+        kept_mass = np.sum(tempered[row, kept])
+        assert kept_mass >= top_p - 1e-4
+        assert kept_mass - np.min(tempered[row, kept]) < top_p + 1e-4
+        assert np.allclose(p[row][p[row] > 0], tempered[row, kept] / kept_mass, atol=1e-5)
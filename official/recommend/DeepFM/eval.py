@@ -21,7 +21,8 @@ from mindspore import context
 from mindspore.train.model import Model
 from mindspore.train.serialization import load_checkpoint, load_param_into_net
 
-from src.deepfm import ModelBuilder, AUCMetric
+from src.deepfm import ModelBuilder
+from src.metrics import AUCMetric
 from src.dataset import create_dataset, DataType
 
 from src.model_utils.config import config
@@ -24,7 +24,8 @@ from mindspore.train.callback import ModelCheckpoint, CheckpointConfig, TimeMoni
 from mindspore.common import set_seed
 import moxing as mox
 
-from src.deepfm import ModelBuilder, AUCMetric
+from src.deepfm import ModelBuilder
+from src.metrics import AUCMetric
 from src.dataset import create_dataset, DataType
 from src.callback import EvalCallBack, LossCallBack
 from src.model_utils.config import config
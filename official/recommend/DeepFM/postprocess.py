@@ -16,7 +16,7 @@
 import os
 import numpy as np
 from mindspore import Tensor
-from src.deepfm import AUCMetric
+from src.metrics import AUCMetric
 from src.model_utils.config import config
 
 
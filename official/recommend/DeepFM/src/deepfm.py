@@ -16,7 +16,6 @@
 
 import os
 import numpy as np
-from sklearn.metrics import roc_auc_score
 
 import mindspore.common.dtype as mstype
 from mindspore.ops import functional as F
@@ -24,7 +23,6 @@ from mindspore.ops import composite as C
 from mindspore.ops import operations as P
 from mindspore.nn import Dropout
 from mindspore.nn.optim import Adam
-from mindspore.nn.metrics import Metric
 from mindspore import nn, Tensor, ParameterTuple, Parameter
 from mindspore.common.initializer import Uniform, initializer
 from mindspore.train.callback import ModelCheckpoint, CheckpointConfig
@@ -33,37 +31,11 @@ from mindspore.communication.management import get_group_size
 from mindspore.nn.wrap.grad_reducer import DistributedGradReducer
 
 from src.callback import EvalCallBack, LossCallBack
+from src.metrics import AUCMetric
 
 np_type = np.float32
 ms_type = mstype.float32
 
-class AUCMetric(Metric):
-    """
-    Metric method
-    """
-    def __init__(self):
-        super(AUCMetric, self).__init__()
-        self.pred_probs = []
-        self.true_labels = []
-
-    def clear(self):
-        """Clear the internal evaluation result."""
-        self.pred_probs = []
-        self.true_labels = []
-
-    def update(self, *inputs):
-        batch_predict = inputs[1].asnumpy()
-        batch_label = inputs[2].asnumpy()
-        self.pred_probs.extend(batch_predict.flatten().tolist())
-        self.true_labels.extend(batch_label.flatten().tolist())
-
-    def eval(self):
-        if len(self.true_labels) != len(self.pred_probs):
-            raise RuntimeError('true_labels.size() is not equal to pred_probs.size()')
-        auc = roc_auc_score(self.true_labels, self.pred_probs)
-        return auc
-
-
 def init_method(method, shape, name, max_val=1.0):
     if method in ['uniform']:
         params = Parameter(initializer(Uniform(max_val), shape, ms_type), name=name)
@@ -0,0 +1,134 @@
+# Copyright 2022 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""
+Area under curve metric of DeepFM
+"""
+
+import numpy as np
+from mindspore.nn.metrics import Metric
+
+
+def _auc_from_histograms(pos_hist, neg_hist):
+    """AUC of scores bucketed into ascending bins, ties inside a bin count as half."""
+    pos_total = pos_hist.sum()
+    neg_total = neg_hist.sum()
+    if pos_total == 0 or neg_total == 0:
+        raise ValueError("Only one class present in labels. AUC is not defined in that case.")
+    pos_below = np.cumsum(pos_hist) - pos_hist
+    area = np.sum(neg_hist * (pos_total - pos_below - pos_hist), dtype=np.float64) \
+        + 0.5 * np.sum(neg_hist * pos_hist, dtype=np.float64)
+    return float(area / (float(pos_total) * float(neg_total)))
+
+
+def _auc_from_sorted_run(scores, labels):
+    """Exact AUC of ascending sorted scores, equal scores get their average rank."""
+    pos_total = np.count_nonzero(labels)
+    neg_total = labels.size - pos_total
+    if pos_total == 0 or neg_total == 0:
+        raise ValueError("Only one class present in labels. AUC is not defined in that case.")
+    # Average rank of each group of tied scores
+    group_start = np.flatnonzero(np.r_[True, scores[1:] != scores[:-1]])
+    group_size = np.diff(np.r_[group_start, scores.size])
+    group_rank = group_start + (group_size + 1) / 2.0
+    ranks = np.repeat(group_rank, group_size)
+    pos_rank_sum = np.sum(ranks[labels], dtype=np.float64)
+    return float((pos_rank_sum - pos_total * (pos_total + 1) / 2.0) / (float(pos_total) * float(neg_total)))
+
+
+def _merge_runs(run_a, run_b):
+    """Merge two sorted runs of (scores, labels)."""
+    scores = np.concatenate((run_a[0], run_b[0]))
+    labels = np.concatenate((run_a[1], run_b[1]))
+    # Timsort detects the two sorted runs, so the merge is linear
+    order = np.argsort(scores, kind='stable')
+    return scores[order], labels[order]
+
+
+class AUCMetric(Metric):
+    """
+    Metric method
+
+    By default each batch is kept as a sorted run of float32 scores, and the runs are merged like a binary counter,
+    which gives the same result as sklearn's roc_auc_score. With exact=False, the scores are accumulated into
+    fixed-bin histograms of positive and negative samples instead, so the memory does not grow with the size of the
+    dataset, and pairs of scores in the same bin count as ties.
+
+    Args:
+        num_bins (int): Number of histogram bins over the score range [0, 1], used if exact is False. Default: 100000.
+        exact (bool): Whether to compute the exact AUC with sorted runs instead of histograms. Default: True.
+        report_interval (int): Print the intermediate AUC every report_interval updates, disabled if 0. Default: 0.
+    """
+
+    def __init__(self, num_bins=100000, exact=True, report_interval=0):
+        super(AUCMetric, self).__init__()
+        self.num_bins = num_bins
+        self.exact = exact
+        self.report_interval = report_interval
+        self.clear()
+
+    def clear(self):
+        """Clear the internal evaluation result."""
+        self.pos_hist = np.zeros(self.num_bins, np.int64)
+        self.neg_hist = np.zeros(self.num_bins, np.int64)
+        self.runs = []
+        self.steps = 0
+
+    def update(self, *inputs):
+        """Update histograms or sorted runs of predicts and labels."""
+        all_predict = inputs[1].asnumpy().reshape(-1)
+        all_label = inputs[2].asnumpy().reshape(-1)
+        if all_label.size != all_predict.size:
+            raise RuntimeError('true_labels.size() is not equal to pred_probs.size()')
+        is_pos = all_label > 0.5
+        if self.exact:
+            order = np.argsort(all_predict, kind='stable')
+            self._push_run((all_predict[order].astype(np.float32), is_pos[order]))
+        else:
+            bins = np.clip((all_predict * self.num_bins).astype(np.int64), 0, self.num_bins - 1)
+            self.pos_hist += np.bincount(bins[is_pos], minlength=self.num_bins)
+            self.neg_hist += np.bincount(bins[~is_pos], minlength=self.num_bins)
+        self.steps += 1
+        if self.report_interval and self.steps % self.report_interval == 0:
+            print("auc_metric step: {}, auc: {}".format(self.steps, self._compute()))
+
+    def _push_run(self, run):
+        # Merge the runs with similar sizes, which keeps O(log n) runs alive
+        while self.runs and self.runs[-1][0].size <= run[0].size:
+            run = _merge_runs(self.runs.pop(), run)
+        self.runs.append(run)
+
+    def merge(self, other):
+        """Merge the accumulated state of another AUCMetric, e.g. the one gathered from another rank."""
+        if self.exact != other.exact or self.num_bins != other.num_bins:
+            raise ValueError("Only AUCMetric with the same mode and num_bins can be merged.")
+        self.pos_hist += other.pos_hist
+        self.neg_hist += other.neg_hist
+        for run in other.runs:
+            self._push_run(run)
+        self.steps += other.steps
+
+    def _compute(self):
+        if self.exact:
+            if not self.runs:
+                raise ValueError("AUCMetric has not been updated.")
+            while len(self.runs) > 1:
+                run = self.runs.pop()
+                self.runs[-1] = _merge_runs(self.runs[-1], run)
+            return _auc_from_sorted_run(*self.runs[0])
+        return _auc_from_histograms(self.pos_hist, self.neg_hist)
+
+    def eval(self):
+        auc = self._compute()
+        return auc
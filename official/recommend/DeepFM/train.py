@@ -23,7 +23,8 @@ from mindspore.train.model import Model
 from mindspore.train.callback import ModelCheckpoint, CheckpointConfig, TimeMonitor
 from mindspore.common import set_seed
 
-from src.deepfm import ModelBuilder, AUCMetric
+from src.deepfm import ModelBuilder
+from src.metrics import AUCMetric
 from src.dataset import create_dataset, DataType
 from src.callback import EvalCallBack, LossCallBack
 from src.model_utils.config import config
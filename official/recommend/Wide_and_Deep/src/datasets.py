@@ -16,6 +16,8 @@
 
 import os
 import math
+import json
+import threading
 from enum import Enum
 import numpy as np
 import pandas as pd
@@ -30,6 +32,7 @@ class DataType(Enum):
     MINDRECORD = 1
     TFRECORD = 2
     H5 = 3
+    NPY = 4
 
 
 class H5Dataset():
@@ -165,6 +168,123 @@ def _get_h5_dataset(data_dir, train_mode=True, batch_size=1000):
     return data_set
 
 
+class NpyDataset():
+    """
+    NpyDataset, the columnar version of H5Dataset. Each part is stored as raw .npy shards of ids, weights
+    and labels, and a manifest records the rows of every part, so the shards can be memory-mapped and
+    every batch is a contiguous slice of them. With rank_size, every part is split into rank_size equal row
+    ranges (the last rows % rank_size rows of a part are dropped), so all the ranks get the same number of
+    batches like the shard_equal_rows option of the TFRecord dataset.
+    """
+    input_length = 39
+    manifest_name = '{}_manifest.json'
+    shard_name = '{}_{}_part_{}.npy'
+    columns = ('ids', 'weights', 'labels')
+
+    def __init__(self, data_path, train_mode=True, rank_size=None, rank_id=None, prefetch=True):
+        self._data_dir = data_path
+        self._file_prefix = 'train' if train_mode else 'test'
+        self._prefetch = prefetch
+        with open(os.path.join(data_path, self.manifest_name.format(self._file_prefix)), 'r') as f:
+            part_rows = json.load(f)['part_rows']
+        self._parts = list(range(len(part_rows)))
+        self._row_offset = {p: 0 for p in self._parts}
+        if rank_size is not None and rank_id is not None:
+            part_rows = [rows // rank_size for rows in part_rows]
+            self._row_offset = {p: rank_id * part_rows[p] for p in self._parts}
+        self.part_rows = {p: part_rows[p] for p in self._parts}
+        self.data_size = sum(self.part_rows.values())
+        print("data_size: {}".format(self.data_size))
+
+    def _shard_path(self, column, part):
+        return os.path.join(self._data_dir, self.shard_name.format(self._file_prefix, column, part))
+
+    def _open_part(self, part):
+        """Memory-map the rows of the part read by this rank."""
+        start, stop = self._row_offset[part], self._row_offset[part] + self.part_rows[part]
+        return [np.load(self._shard_path(column, part), mmap_mode='r')[start:stop] for column in self.columns]
+
+    def _warm_up_part(self, part, chunk_size=1 << 24):
+        """Read the rows of a part once, so that they are in the page cache when the part is used."""
+        for shard in self._open_part(part):
+            chunk_rows = max(1, chunk_size // max(1, shard.itemsize * shard.shape[1]))
+            for start in range(0, len(shard), chunk_rows):
+                np.array(shard[start:start + chunk_rows])
+
+    def batch_generator(self, batch_size=1000, random_sample=False, shuffle_block=False):
+        """
+        :param batch_size
+        :param random_sample: if True, shuffle the order of the batch blocks inside a part
+        :param shuffle_block: shuffle the order of the parts at every round
+        :return:
+        """
+        parts = np.array(self._parts)
+        prefetcher = None
+        while True:
+            if shuffle_block:
+                np.random.shuffle(parts)
+            for i, part in enumerate(parts):
+                if self._prefetch:
+                    if prefetcher is not None:
+                        prefetcher.join()
+                    next_part = parts[(i + 1) % len(parts)]
+                    prefetcher = threading.Thread(target=self._warm_up_part, args=(next_part,), daemon=True)
+                    prefetcher.start()
+                ids, weights, labels = self._open_part(part)
+                # Only the indices of the blocks are shuffled, each batch stays a contiguous slice
+                starts = np.arange(0, self.part_rows[part], batch_size)
+                if random_sample:
+                    np.random.shuffle(starts)
+                for start in starts:
+                    stop = start + batch_size
+                    yield np.array(ids[start:stop]), np.array(weights[start:stop]), np.array(labels[start:stop])
+
+
+def convert_h5_to_npy(data_dir, output_dir, train_num_of_parts=21, test_num_of_parts=3):
+    """
+    Convert the h5 parts of H5Dataset to the .npy shards and manifest used by NpyDataset, see the
+    h5_data_path option of src/preprocess_data.py.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    for file_prefix, num_of_parts in (('train', train_num_of_parts), ('test', test_num_of_parts)):
+        part_rows = []
+        for part in range(num_of_parts):
+            x = pd.read_hdf(os.path.join(data_dir, '{}_input_part_{}.h5'.format(file_prefix, part))).values
+            y = pd.read_hdf(os.path.join(data_dir, '{}_output_part_{}.h5'.format(file_prefix, part))).values
+            shards = (x[:, :NpyDataset.input_length].astype(np.int32),
+                      x[:, NpyDataset.input_length:].astype(np.float32),
+                      y.reshape(-1, 1).astype(np.float32))
+            for column, shard in zip(NpyDataset.columns, shards):
+                np.save(os.path.join(output_dir, NpyDataset.shard_name.format(file_prefix, column, part)),
+                        np.ascontiguousarray(shard))
+            part_rows.append(int(x.shape[0]))
+        with open(os.path.join(output_dir, NpyDataset.manifest_name.format(file_prefix)), 'w') as f:
+            json.dump({'part_rows': part_rows}, f)
+
+
+def _get_npy_dataset(data_dir, train_mode=True, batch_size=1000, rank_size=None, rank_id=None):
+    """
+    get_npy_dataset
+    """
+    data_para = {
+        'batch_size': batch_size,
+    }
+    if train_mode:
+        data_para['random_sample'] = True
+        data_para['shuffle_block'] = True
+
+    npy_dataset = NpyDataset(data_path=data_dir, train_mode=train_mode, rank_size=rank_size, rank_id=rank_id)
+    numbers_of_batch = sum(math.ceil(rows / batch_size) for rows in npy_dataset.part_rows.values())
+
+    def _iter_npy_data():
+        train_eval_gen = npy_dataset.batch_generator(**data_para)
+        for _ in range(0, numbers_of_batch, 1):
+            yield train_eval_gen.__next__()
+
+    data_set = ds.GeneratorDataset(_iter_npy_data(), ["ids", "weights", "labels"])
+    return data_set
+
+
 def _padding_func(batch_size, manual_shape, target_column, field_size=39):
     """
     get padding_func
@@ -346,6 +466,8 @@ def create_dataset(data_dir, train_mode=True, batch_size=1000,
         return _get_mindrecord_dataset(data_dir, train_mode, batch_size,
                                        line_per_sample, rank_size=rank_size, rank_id=rank_id,
                                        manual_shape=manual_shape, target_column=target_column)
+    if data_type == DataType.NPY:
+        return _get_npy_dataset(data_dir, train_mode, batch_size, rank_size=rank_size, rank_id=rank_id)
 
     if rank_size > 1:
         raise RuntimeError("please use tfrecord dataset.")
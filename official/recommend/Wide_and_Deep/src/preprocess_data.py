@@ -15,10 +15,14 @@
 """Download raw data and preprocessed data."""
 import os
 import pickle
+import itertools
 import collections
+import multiprocessing
 import numpy as np
+import pandas as pd
 from mindspore.mindrecord import FileWriter
 from model_utils.config import config
+from datasets import convert_h5_to_npy
 
 class StatsDict():
     """preprocessed data"""
@@ -131,59 +135,173 @@ class StatsDict():
             weight_list.append(1.0)
         return id_list, weight_list
 
+    def stats_chunk(self, val_max, val_min, cat_counts):
+        """Merge the statistics of a chunk computed by _stats_chunk"""
+        for i, key in enumerate(self.val_cols):
+            self.val_max_dict[key] = float(np.fmax(self.val_max_dict[key], val_max[i]))
+            self.val_min_dict[key] = float(np.fmin(self.val_min_dict[key], val_min[i]))
+        for key, (uniques, counts) in zip(self.cat_cols, cat_counts):
+            cat_count_d = self.cat_count_dict[key]
+            for cat, cnt in zip(uniques.tolist(), counts.tolist()):
+                cat_count_d[cat] += cnt
+
+    def get_cat2id_lookup(self):
+        """
+        Get the per column lookup of cat2id_dict, which is used by map_chunk.
+
+        Returns:
+            a list of (categories, ids, oov_id) for each cat column, categories is a pandas Index.
+        """
+        cats = [[] for _ in self.cat_cols]
+        ids = [[] for _ in self.cat_cols]
+        for key, cat_id in self.cat2id_dict.items():
+            if not key.startswith("cat_"):
+                continue
+            _, col, cat_str = key.split("_", 2)
+            cats[int(col) - 1].append(cat_str)
+            ids[int(col) - 1].append(cat_id)
+        return [(pd.Index(cats[i], dtype=object), np.array(ids[i], dtype=np.int64),
+                 self.cat2id_dict[self.oov_prefix + col]) for i, col in enumerate(self.cat_cols)]
+
+    def map_chunk(self, values, cats, cat2id_lookup):
+        """
+        Cat to id for a whole chunk, the vectorized version of map_cat2id.
+
+        Args:
+            values: float array with shape [rows, dense_dim], nan for the missing values.
+            cats: object array of strings with shape [rows, slot_dim].
+            cat2id_lookup: the lookup returned by get_cat2id_lookup.
+
+        Returns:
+            ids with shape [rows, field_size] and weights with shape [rows, field_size].
+        """
+        rows = values.shape[0]
+        val_max = np.array([self.val_max_dict[key] for key in self.val_cols], dtype=np.float64)
+        ids = np.empty((rows, self.dense_dim + self.slot_dim), dtype=np.int64)
+        weights = np.ones((rows, self.dense_dim + self.slot_dim), dtype=np.float64)
+        # The id of a missing value is its column index, which is also the id of the value column
+        ids[:, :self.dense_dim] = np.array([self.cat2id_dict[key] for key in self.val_cols])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            weights[:, :self.dense_dim] = np.where(np.isnan(values), 0, values / val_max)
+        for i, (categories, cat_ids, oov_id) in enumerate(cat2id_lookup):
+            index = categories.get_indexer(cats[:, i])
+            found = index >= 0
+            col_ids = np.full(rows, oov_id, dtype=np.int64)
+            if self.skip_id_convert is True:
+                # Regard the synthetic data id as the final id, see map_cat2id
+                col_ids[found] = cats[found, i].astype(np.int64)
+            else:
+                col_ids[found] = cat_ids[index[found]]
+            ids[:, self.dense_dim + i] = col_ids
+        return ids, weights
+
+
+def _read_chunks(file_path, chunk_lines):
+    """Yield (start_line, lines) of the raw file, chunk by chunk."""
+    with open(file_path, encoding="utf-8") as file_in:
+        start = 0
+        while True:
+            lines = list(itertools.islice(file_in, chunk_lines))
+            if not lines:
+                break
+            yield start, lines
+            start += len(lines)
+
+
+def _split_chunk(lines, dense_dim, slot_dim):
+    """Split the lines of a chunk into columns, the lines with wrong length are dropped."""
+    series = pd.Series(lines, dtype=object).str.strip("\n")
+    valid = (series.str.count("\t") == dense_dim + slot_dim).to_numpy()
+    items = series[valid].str.split("\t", expand=True) if valid.any() else \
+        pd.DataFrame(np.empty((0, 1 + dense_dim + slot_dim), dtype=object))
+    labels = items.iloc[:, 0].to_numpy(dtype=np.float64) if valid.any() else np.empty(0, dtype=np.float64)
+    values = items.iloc[:, 1:1 + dense_dim].replace("", np.nan).to_numpy(dtype=np.float64)
+    cats = items.iloc[:, 1 + dense_dim:].to_numpy(dtype=object)
+    return valid, labels, values, cats
+
+
+def _stats_chunk(args):
+    """Compute the max/min of values and the count of each category of a chunk."""
+    (_, lines), dense_dim, slot_dim = args
+    valid, _, values, cats = _split_chunk(lines, dense_dim, slot_dim)
+    val_max = np.fmax.reduce(values, axis=0, initial=-np.inf)
+    val_min = np.fmin.reduce(values, axis=0, initial=np.inf)
+    cat_counts = []
+    for i in range(slot_dim):
+        # Factorized codes keep the order of the first appearance, the same as the row by row counting
+        codes, uniques = pd.factorize(cats[:, i])
+        cat_counts.append((uniques, np.bincount(codes, minlength=len(uniques))))
+    return len(lines), int(np.count_nonzero(~valid)), val_max, val_min, cat_counts
+
+
+_map_context = {}
+
+
+def _init_map_worker(stats_dict):
+    _map_context["stats"] = stats_dict
+    _map_context["lookup"] = stats_dict.get_cat2id_lookup()
+
+
+def _map_chunk(args):
+    """Map a chunk to ids and weights, returns the line index of each valid row as well."""
+    (start, lines), dense_dim, slot_dim = args
+    valid, labels, values, cats = _split_chunk(lines, dense_dim, slot_dim)
+    ids, weights = _map_context["stats"].map_chunk(values, cats, _map_context["lookup"])
+    line_index = start + np.flatnonzero(valid)
+    return start, len(lines), line_index, ids, weights, labels
+
+
+def _imap_window(pool, func, iterable, window):
+    """Ordered imap which keeps at most window items of iterable in flight, to bound the memory."""
+    pending = collections.deque()
+    for item in iterable:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
 
 def mkdir_path(file_path):
     if not os.path.exists(file_path):
         os.makedirs(file_path)
 
 
-def statsdata(file_path, dict_output_path, recommendation_dataset_stats_dict, dense_dim=13, slot_dim=26):
+def statsdata(file_path, dict_output_path, recommendation_dataset_stats_dict, dense_dim=13, slot_dim=26,
+              chunk_lines=100000, num_workers=None):
     """Preprocess data and save data"""
-    with open(file_path, encoding="utf-8") as file_in:
-        errorline_list = []
-        count = 0
-        for line in file_in:
-            count += 1
-            line = line.strip("\n")
-            items = line.split("\t")
-            if len(items) != (dense_dim + slot_dim + 1):
-                errorline_list.append(count)
-                print("Found line length: {}, suppose to be {}, the line is {}".format(len(items),
-                                                                                       dense_dim + slot_dim + 1, line))
-                continue
-            if count % 1000000 == 0:
-                print("Have handled {}w lines.".format(count // 10000))
-            values = items[1: dense_dim + 1]
-            cats = items[dense_dim + 1:]
-
-            assert len(values) == dense_dim, "values.size: {}".format(len(values))
-            assert len(cats) == slot_dim, "cats.size: {}".format(len(cats))
-            recommendation_dataset_stats_dict.stats_vals(values)
-            recommendation_dataset_stats_dict.stats_cats(cats)
+    num_workers = num_workers or multiprocessing.cpu_count()
+    chunks = ((chunk, dense_dim, slot_dim) for chunk in _read_chunks(file_path, chunk_lines))
+    error_count = 0
+    count = 0
+    with multiprocessing.Pool(num_workers) as pool:
+        for lines_num, chunk_error, val_max, val_min, cat_counts in _imap_window(pool, _stats_chunk, chunks,
+                                                                                 num_workers):
+            recommendation_dataset_stats_dict.stats_chunk(val_max, val_min, cat_counts)
+            error_count += chunk_error
+            count += lines_num
+            print("Have handled {}w lines.".format(count // 10000))
+    print("Found {} lines with wrong length, suppose to be {}.".format(error_count, dense_dim + slot_dim + 1))
     recommendation_dataset_stats_dict.save_dict(dict_output_path)
 
 
 def random_split_trans2mindrecord(input_file_path, output_file_path, recommendation_dataset_stats_dict,
                                   part_rows=2000000, line_per_sample=1000, train_line_count=None,
-                                  test_size=0.1, seed=2020, dense_dim=13, slot_dim=26):
+                                  test_size=0.1, seed=2020, dense_dim=13, slot_dim=26,
+                                  chunk_lines=100000, num_workers=None):
     """Random split data and save mindrecord"""
     if train_line_count is None:
         raise ValueError("Please provide training file line count")
     test_size = int(train_line_count * test_size)
-    all_indices = [i for i in range(train_line_count)]
+    all_indices = np.arange(train_line_count)
     np.random.seed(seed)
     np.random.shuffle(all_indices)
     print("all_indices.size:{}".format(len(all_indices)))
-    test_indices_set = set(all_indices[:test_size])
-    print("test_indices_set.size:{}".format(len(test_indices_set)))
+    test_mask = np.zeros(train_line_count, dtype=bool)
+    test_mask[all_indices[:test_size]] = True
+    print("test_indices_set.size:{}".format(np.count_nonzero(test_mask)))
     print("-----------------------" * 10 + "\n" * 2)
 
-    train_data_list = []
-    test_data_list = []
-    ids_list = []
-    wts_list = []
-    label_list = []
-
     writer_train = FileWriter(os.path.join(output_file_path, "train_input_part.mindrecord"), 21)
     writer_test = FileWriter(os.path.join(output_file_path, "test_input_part.mindrecord"), 3)
 
@@ -192,89 +310,77 @@ def random_split_trans2mindrecord(input_file_path, output_file_path, recommendat
     writer_train.add_schema(schema, "CRITEO_TRAIN")
     writer_test.add_schema(schema, "CRITEO_TEST")
 
-    with open(input_file_path, encoding="utf-8") as file_in:
-        items_error_size_lineCount = []
-        count = 0
-        train_part_number = 0
-        test_part_number = 0
-        for i, line in enumerate(file_in):
-            count += 1
-            if count % 1000000 == 0:
-                print("Have handle {}w lines.".format(count // 10000))
-            line = line.strip("\n")
-            items = line.split("\t")
-            if len(items) != (1 + dense_dim + slot_dim):
-                items_error_size_lineCount.append(i)
-                continue
-            label = float(items[0])
-            values = items[1:1 + dense_dim]
-            cats = items[1 + dense_dim:]
-
-            assert len(values) == dense_dim, "values.size: {}".format(len(values))
-            assert len(cats) == slot_dim, "cats.size: {}".format(len(cats))
-
-            ids, wts = recommendation_dataset_stats_dict.map_cat2id(values, cats)
-
-            ids_list.extend(ids)
-            wts_list.extend(wts)
-            label_list.append(label)
-
-            if count % line_per_sample == 0:
-                if i not in test_indices_set:
-                    train_data_list.append({"feat_ids": np.array(ids_list, dtype=np.int32),
-                                            "feat_vals": np.array(wts_list, dtype=np.float32),
-                                            "label": np.array(label_list, dtype=np.float32)
-                                            })
-                else:
-                    test_data_list.append({"feat_ids": np.array(ids_list, dtype=np.int32),
-                                           "feat_vals": np.array(wts_list, dtype=np.float32),
-                                           "label": np.array(label_list, dtype=np.float32)
-                                           })
-                if train_data_list and len(train_data_list) % part_rows == 0:
-                    writer_train.write_raw_data(train_data_list)
-                    train_data_list.clear()
-                    train_part_number += 1
-
-                if test_data_list and len(test_data_list) % part_rows == 0:
-                    writer_test.write_raw_data(test_data_list)
-                    test_data_list.clear()
-                    test_part_number += 1
-
-                ids_list.clear()
-                wts_list.clear()
-                label_list.clear()
-
-        if train_data_list:
-            writer_train.write_raw_data(train_data_list)
-        if test_data_list:
-            writer_test.write_raw_data(test_data_list)
+    num_workers = num_workers or multiprocessing.cpu_count()
+    chunks = ((chunk, dense_dim, slot_dim) for chunk in _read_chunks(input_file_path, chunk_lines))
+    items_error_size_line_count = []
+    train_data_list = []
+    test_data_list = []
+    # The rows after the last sample end of a chunk, which belong to a sample of the next chunks
+    carry_ids, carry_wts, carry_labels = None, None, None
+    with multiprocessing.Pool(num_workers, initializer=_init_map_worker,
+                              initargs=(recommendation_dataset_stats_dict,)) as pool:
+        for start, lines_num, line_index, ids, wts, labels in _imap_window(pool, _map_chunk, chunks, num_workers):
+            valid = np.zeros(lines_num, dtype=bool)
+            valid[line_index - start] = True
+            items_error_size_line_count.extend((start + np.flatnonzero(~valid)).tolist())
+            if carry_labels is not None:
+                ids = np.concatenate([carry_ids, ids])
+                wts = np.concatenate([carry_wts, wts])
+                labels = np.concatenate([carry_labels, labels])
+            # A sample ends at every line_per_sample-th line of the file, if that line is valid. Otherwise its
+            # rows go on to the next sample end, and the tail rows after the last end are dropped.
+            sample_end = line_index[(line_index + 1) % line_per_sample == 0]
+            bounds = np.r_[0, len(labels) - len(line_index) + np.searchsorted(line_index, sample_end, side="right")]
+            # The split of a sample is decided by its last line
+            is_test = (sample_end < train_line_count) & test_mask[np.minimum(sample_end, train_line_count - 1)]
+            for k in range(len(sample_end)):
+                row_start, row_end = bounds[k], bounds[k + 1]
+                data = {"feat_ids": ids[row_start:row_end].reshape(-1).astype(np.int32),
+                        "feat_vals": wts[row_start:row_end].reshape(-1).astype(np.float32),
+                        "label": labels[row_start:row_end].astype(np.float32)}
+                (test_data_list if is_test[k] else train_data_list).append(data)
+            carry_ids, carry_wts, carry_labels = ids[bounds[-1]:], wts[bounds[-1]:], labels[bounds[-1]:]
+            if len(train_data_list) >= part_rows:
+                writer_train.write_raw_data(train_data_list)
+                train_data_list.clear()
+            if len(test_data_list) >= part_rows:
+                writer_test.write_raw_data(test_data_list)
+                test_data_list.clear()
+            print("Have handle {}w lines.".format((start + lines_num) // 10000))
+    if train_data_list:
+        writer_train.write_raw_data(train_data_list)
+    if test_data_list:
+        writer_test.write_raw_data(test_data_list)
     writer_train.commit()
     writer_test.commit()
 
     print("-------------" * 10)
-    print("items_error_size_lineCount.size(): {}.".format(len(items_error_size_lineCount)))
+    print("items_error_size_lineCount.size(): {}.".format(len(items_error_size_line_count)))
     print("-------------" * 10)
-    np.save("items_error_size_lineCount.npy", items_error_size_lineCount)
+    np.save("items_error_size_lineCount.npy", items_error_size_line_count)
 
 
 if __name__ == '__main__':
 
     data_path = config.data_path
-
-    target_field_size = config.dense_dim + config.slot_dim
-    stats = StatsDict(field_size=target_field_size, dense_dim=config.dense_dim, slot_dim=config.slot_dim,
-                      skip_id_convert=config.skip_id_convert)
-    data_file_path = data_path + "origin_data/train.txt"
-    stats_output_path = data_path + "stats_dict/"
-    mkdir_path(stats_output_path)
-    statsdata(data_file_path, stats_output_path, stats, dense_dim=config.dense_dim, slot_dim=config.slot_dim)
-
-    stats.load_dict(dict_path=stats_output_path, prefix="")
-    stats.get_cat2id(threshold=config.threshold)
-
-    in_file_path = data_path + "origin_data/train.txt"
-    output_path = data_path + "mindrecord/"
-    mkdir_path(output_path)
-    random_split_trans2mindrecord(in_file_path, output_path, stats, part_rows=2000000,
-                                  train_line_count=config.train_line_count, line_per_sample=1000,
-                                  test_size=0.1, seed=2020, dense_dim=config.dense_dim, slot_dim=config.slot_dim)
+    if config.h5_data_path:
+        # Convert the hd5 parts to the npy shards of --dataset_type=npy instead of preprocessing the raw data
+        convert_h5_to_npy(config.h5_data_path, data_path + "npy/")
+    else:
+        target_field_size = config.dense_dim + config.slot_dim
+        stats = StatsDict(field_size=target_field_size, dense_dim=config.dense_dim, slot_dim=config.slot_dim,
+                          skip_id_convert=config.skip_id_convert)
+        data_file_path = data_path + "origin_data/train.txt"
+        stats_output_path = data_path + "stats_dict/"
+        mkdir_path(stats_output_path)
+        statsdata(data_file_path, stats_output_path, stats, dense_dim=config.dense_dim, slot_dim=config.slot_dim)
+
+        stats.load_dict(dict_path=stats_output_path, prefix="")
+        stats.get_cat2id(threshold=config.threshold)
+
+        in_file_path = data_path + "origin_data/train.txt"
+        output_path = data_path + "mindrecord/"
+        mkdir_path(output_path)
+        random_split_trans2mindrecord(in_file_path, output_path, stats, part_rows=2000000,
+                                      train_line_count=config.train_line_count, line_per_sample=1000,
+                                      test_size=0.1, seed=2020, dense_dim=config.dense_dim, slot_dim=config.slot_dim)
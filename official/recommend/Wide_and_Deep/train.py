@@ -68,6 +68,8 @@ def test_train(configure):
         dataset_type = DataType.TFRECORD
     elif configure.dataset_type == "mindrecord":
         dataset_type = DataType.MINDRECORD
+    elif configure.dataset_type == "npy":
+        dataset_type = DataType.NPY
     else:
         dataset_type = DataType.H5
     ds_train = create_dataset(data_path, train_mode=True,
@@ -73,6 +73,8 @@ def test_train_eval(config):
         dataset_type = DataType.TFRECORD
     elif config.dataset_type == "mindrecord":
         dataset_type = DataType.MINDRECORD
+    elif config.dataset_type == "npy":
+        dataset_type = DataType.NPY
     else:
         dataset_type = DataType.H5
     ds_train = create_dataset(data_path, train_mode=True,
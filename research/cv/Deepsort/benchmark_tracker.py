@@ -0,0 +1,90 @@
+# Copyright 2022 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Per-frame latency benchmark of the tracker on a synthetic crowded scene."""
+from __future__ import division, print_function, absolute_import
+
+import argparse
+import time
+import numpy as np
+
+from src.sort import nn_matching
+from src.sort.detection import Detection
+from src.sort.tracker import Tracker
+
+
+def synthetic_scene(num_targets, num_frames, feature_dim, seed=0):
+    """Generate detections of targets walking with constant velocity.
+
+    Each target has its own appearance feature, observed with noise, and
+    one in ten detections is missed in each frame.
+    """
+    rng = np.random.RandomState(seed)
+    positions = rng.uniform(0, 1920, size=(num_targets, 2))
+    velocities = rng.uniform(-3, 3, size=(num_targets, 2))
+    sizes = np.stack([rng.uniform(30, 60, num_targets), rng.uniform(80, 160, num_targets)], axis=1)
+    appearances = rng.randn(num_targets, feature_dim).astype(np.float32)
+    for frame_idx in range(num_frames):
+        positions += velocities
+        visible = rng.uniform(size=num_targets) > 0.1
+        detections = []
+        for i in np.flatnonzero(visible):
+            tlwh = np.r_[positions[i], sizes[i]]
+            feature = appearances[i] + 0.1 * rng.randn(feature_dim).astype(np.float32)
+            detections.append(Detection(tlwh, 1.0, feature))
+        yield frame_idx, detections
+
+
+def run(num_targets, num_frames, feature_dim, max_cosine_distance, nn_budget, warmup):
+    """Run the tracker on the synthetic scene and print the per-frame latency."""
+    metric = nn_matching.NearestNeighborDistanceMetric(
+        "cosine", max_cosine_distance, nn_budget)
+    tracker = Tracker(metric)
+    latencies = []
+    for frame_idx, detections in synthetic_scene(num_targets, num_frames, feature_dim):
+        start = time.time()
+        tracker.predict()
+        tracker.update(detections)
+        if frame_idx >= warmup:
+            latencies.append(time.time() - start)
+    latencies = np.array(latencies) * 1000
+    num_confirmed = sum(track.is_confirmed() for track in tracker.tracks)
+    print("targets: {}, confirmed tracks: {}, frame latency mean: {:.2f} ms, p50: {:.2f} ms, p95: {:.2f} ms".format(
+        num_targets, num_confirmed, latencies.mean(), np.percentile(latencies, 50), np.percentile(latencies, 95)))
+
+
+def parse_args():
+    """ Parse command line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Tracker latency benchmark")
+    parser.add_argument(
+        "--num_targets", help="Number of people in the scene.", type=int, default=150)
+    parser.add_argument(
+        "--num_frames", help="Number of frames to track.", type=int, default=300)
+    parser.add_argument(
+        "--feature_dim", help="Dimension of the appearance descriptors.", type=int, default=128)
+    parser.add_argument(
+        "--max_cosine_distance", help="Gating threshold for cosine distance "
+        "metric (object appearance).", type=float, default=0.2)
+    parser.add_argument(
+        "--nn_budget", help="Maximum size of the appearance descriptors "
+        "gallery.", type=int, default=100)
+    parser.add_argument(
+        "--warmup", help="Number of frames excluded from the latency.", type=int, default=10)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(args.num_targets, args.num_frames, args.feature_dim, args.max_cosine_distance, args.nn_budget, args.warmup)
@@ -0,0 +1,91 @@
+# Copyright 2022 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Check the batched Kalman filter steps against the per-track steps on random tracks."""
+from __future__ import division, print_function, absolute_import
+
+import argparse
+import numpy as np
+
+from src.sort.kalman_filter import KalmanFilter
+
+
+def random_tracks(kf, num_tracks, rng):
+    """Initiate tracks from random boxes and run a few per-track steps on each."""
+    means, covariances = [], []
+    for _ in range(num_tracks):
+        box = np.r_[rng.uniform(0, 1920, 2), rng.uniform(0.3, 0.7), rng.uniform(80, 160)]
+        mean, covariance = kf.initiate(box)
+        for _ in range(rng.randint(1, 6)):
+            mean, covariance = kf.predict(mean, covariance)
+            box = box + np.r_[rng.randn(2) * 3, rng.randn() * 0.01, rng.randn()]
+            mean, covariance = kf.update(mean, covariance, box)
+        means.append(mean)
+        covariances.append(covariance)
+    return np.stack(means), np.stack(covariances)
+
+
+def random_measurements(means, rng):
+    """Boxes around the track positions in format (x, y, a, h)."""
+    return means[:, :4] + np.c_[rng.randn(len(means), 2) * 5, rng.randn(len(means)) * 0.02,
+                                rng.randn(len(means)) * 2]
+
+
+def check(num_tracks, num_measurements, seed):
+    """Assert that multi_predict/multi_update/multi_gating_distance match predict/update/gating_distance."""
+    rng = np.random.RandomState(seed)
+    kf = KalmanFilter()
+    means, covariances = random_tracks(kf, num_tracks, rng)
+
+    multi_means, multi_covariances = kf.multi_predict(means.copy(), covariances.copy())
+    for i in range(num_tracks):
+        mean, covariance = kf.predict(means[i].copy(), covariances[i].copy())
+        assert np.allclose(multi_means[i], mean) and np.allclose(multi_covariances[i], covariance), \
+            "multi_predict differs from predict on track {}".format(i)
+    means, covariances = multi_means, multi_covariances
+
+    measurements = random_measurements(means, rng)
+    multi_means, multi_covariances = kf.multi_update(means, covariances, measurements)
+    for i in range(num_tracks):
+        mean, covariance = kf.update(means[i], covariances[i], measurements[i])
+        assert np.allclose(multi_means[i], mean) and np.allclose(multi_covariances[i], covariance), \
+            "multi_update differs from update on track {}".format(i)
+
+    measurements = random_measurements(means[rng.randint(0, num_tracks, num_measurements)], rng)
+    for only_position in (False, True):
+        distances = kf.multi_gating_distance(means, covariances, measurements, only_position)
+        for i in range(num_tracks):
+            distance = kf.gating_distance(means[i], covariances[i], measurements, only_position)
+            assert np.allclose(distances[i], distance), \
+                "multi_gating_distance differs from gating_distance on track {}".format(i)
+    print("tracks: {}, measurements: {}, the batched and per-track Kalman filter steps agree".format(
+        num_tracks, num_measurements))
+
+
+def parse_args():
+    """ Parse command line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Batched Kalman filter check")
+    parser.add_argument(
+        "--num_tracks", help="Number of random tracks.", type=int, default=200)
+    parser.add_argument(
+        "--num_measurements", help="Number of random measurements.", type=int, default=50)
+    parser.add_argument(
+        "--seed", help="Seed of the random tracks.", type=int, default=0)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    check(args.num_tracks, args.num_measurements, args.seed)
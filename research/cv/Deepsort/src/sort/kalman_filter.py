@@ -235,3 +235,135 @@ class KalmanFilter:
             overwrite_b=True)
         squared_maha = np.sum(z * z, axis=0)
         return squared_maha
+
+    def multi_predict(self, mean, covariance):
+        """Run Kalman filter prediction step of N tracks at once.
+
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional mean vectors of the object states at the
+            previous time step.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices of the object states at
+            the previous time step.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the mean vectors and covariance matrices of the predicted
+            states, the same as `predict` of each track.
+
+        """
+        std = np.stack([
+            self._std_weight_position * mean[:, 3],
+            self._std_weight_position * mean[:, 3],
+            np.full(len(mean), 1e-2),
+            self._std_weight_position * mean[:, 3],
+            self._std_weight_velocity * mean[:, 3],
+            self._std_weight_velocity * mean[:, 3],
+            np.full(len(mean), 1e-5),
+            self._std_weight_velocity * mean[:, 3]], axis=1)
+        motion_cov = np.square(std)[:, :, None] * np.eye(8)
+
+        mean = np.dot(mean, self._motion_mat.T)
+        covariance = np.matmul(np.matmul(self._motion_mat, covariance), self._motion_mat.T) + motion_cov
+        return mean, covariance
+
+    def multi_project(self, mean, covariance):
+        """Project the state distributions of N tracks to measurement space.
+
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional mean vectors of the states.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices of the states.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the Nx4 projected means and Nx4x4 covariance matrices.
+
+        """
+        std = np.stack([
+            self._std_weight_position * mean[:, 3],
+            self._std_weight_position * mean[:, 3],
+            np.full(len(mean), 1e-1),
+            self._std_weight_position * mean[:, 3]], axis=1)
+        innovation_cov = np.square(std)[:, :, None] * np.eye(4)
+
+        mean = np.dot(mean, self._update_mat.T)
+        covariance = np.matmul(np.matmul(self._update_mat, covariance), self._update_mat.T)
+        return mean, covariance + innovation_cov
+
+    def multi_update(self, mean, covariance, measurement):
+        """Run Kalman filter correction step of N tracks at once.
+
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional mean vectors of the predicted states.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices of the states.
+        measurement : ndarray
+            The Nx4 dimensional measurement vectors (x, y, a, h).
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the measurement-corrected state distributions, the same
+            as `update` of each track.
+
+        """
+        projected_mean, projected_cov = self.multi_project(mean, covariance)
+
+        # Kalman gain K = P H^T S^-1 from the Cholesky factor L of the projected covariance S,
+        # by solving L X = H P and then L^T K^T = X with np.linalg.solve (numpy has no batched
+        # triangular solver, so both are general LU solves).
+        chol_factor = np.linalg.cholesky(projected_cov)
+        cov_ht = np.swapaxes(np.matmul(covariance, self._update_mat.T), 1, 2)
+        kalman_gain = np.linalg.solve(chol_factor, cov_ht)
+        kalman_gain = np.linalg.solve(np.swapaxes(chol_factor, 1, 2), kalman_gain)
+        kalman_gain = np.swapaxes(kalman_gain, 1, 2)
+        innovation = measurement - projected_mean
+
+        new_mean = mean + np.matmul(kalman_gain, innovation[:, :, None])[:, :, 0]
+        new_covariance = covariance - np.matmul(
+            np.matmul(kalman_gain, projected_cov), np.swapaxes(kalman_gain, 1, 2))
+        return new_mean, new_covariance
+
+    def multi_gating_distance(self, mean, covariance, measurements,
+                              only_position=False):
+        """Compute gating distance between the state distributions of N
+        tracks and M measurements at once, see `gating_distance`.
+
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional mean vectors of the states.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices of the states.
+        measurements : ndarray
+            An Mx4 dimensional matrix of M measurements in format (x, y, a, h).
+        only_position : Optional[bool]
+            If True, distance computation is done with respect to the bounding
+            box center position only.
+
+        Returns
+        -------
+        ndarray
+            Returns an NxM matrix, where element (i, j) contains the squared
+            Mahalanobis distance between the i-th track and `measurements[j]`.
+
+        """
+        mean, covariance = self.multi_project(mean, covariance)
+        if only_position:
+            mean, covariance = mean[:, :2], covariance[:, :2, :2]
+            measurements = measurements[:, :2]
+
+        cholesky_factor = np.linalg.cholesky(covariance)
+        d = measurements[None, :, :] - mean[:, None, :]
+        z = np.linalg.solve(cholesky_factor, np.swapaxes(d, 1, 2))
+        squared_maha = np.sum(z * z, axis=1)
+        return squared_maha
@@ -73,11 +73,12 @@ def min_cost_matching(
     row_indices, col_indices = linear_assignment(cost_matrix)
 
     matches, unmatched_tracks, unmatched_detections = [], [], []
+    matched_cols, matched_rows = set(col_indices.tolist()), set(row_indices.tolist())
     for col, detection_idx in enumerate(detection_indices):
-        if col not in col_indices:
+        if col not in matched_cols:
             unmatched_detections.append(detection_idx)
     for row, track_idx in enumerate(track_indices):
-        if row not in row_indices:
+        if row not in matched_rows:
             unmatched_tracks.append(track_idx)
     for row, col in zip(row_indices, col_indices):
         track_idx = track_indices[row]
@@ -197,9 +198,11 @@ def gate_cost_matrix(
     gating_threshold = kalman_filter.chi2inv95[gating_dim]
     measurements = np.asarray(
         [detections[i].to_xyah() for i in detection_indices])
-    for row, track_idx in enumerate(track_indices):
-        track = tracks[track_idx]
-        gating_distance = kf.gating_distance(
-            track.mean, track.covariance, measurements, only_position)
-        cost_matrix[row, gating_distance > gating_threshold] = gated_cost
+    if not len(track_indices) or not len(detection_indices):
+        return cost_matrix
+    means = np.stack([tracks[i].mean for i in track_indices])
+    covariances = np.stack([tracks[i].covariance for i in track_indices])
+    gating_distance = kf.multi_gating_distance(
+        means, covariances, measurements, only_position)
+    cost_matrix[gating_distance > gating_threshold] = gated_cost
     return cost_matrix
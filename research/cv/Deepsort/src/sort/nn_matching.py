@@ -114,6 +114,11 @@ class NearestNeighborDistanceMetric:
     A nearest neighbor distance metric that, for each target, returns
     the closest distance to any sample that has been observed so far.
 
+    The samples are kept in a gallery of shape
+    [num_slots, budget, feature_dim], where each target owns a slot that is
+    used as a ring buffer of its most recent samples. The distances of all
+    targets are computed by one matrix product against the gallery.
+
     Parameters
     ----------
     metric : str
@@ -123,29 +128,71 @@ class NearestNeighborDistanceMetric:
         invalid match.
     budget : Optional[int]
         If not None, fix samples per class to at most this number. Removes
-        the oldest samples when the budget is reached.
+        the oldest samples when the budget is reached. If None, the ring
+        buffers grow to keep all samples.
 
     Attributes
     ----------
     samples : Dict[int -> List[ndarray]]
         A dictionary that maps from target identities to the list of samples
-        that have been observed so far.
+        that have been observed so far, oldest first. Samples of the cosine
+        metric are normalized to unit length.
 
     """
 
     def __init__(self, metric, matching_threshold, budget=None):
-
-
-        if metric == "euclidean":
-            self._metric = _nn_euclidean_distance
-        elif metric == "cosine":
-            self._metric = _nn_cosine_distance
-        else:
+        if metric not in ("euclidean", "cosine"):
             raise ValueError(
                 "Invalid metric; must be either 'euclidean' or 'cosine'")
+        self.metric = metric
         self.matching_threshold = matching_threshold
         self.budget = budget
-        self.samples = {}
+
+        self._gallery = None
+        # Number of samples and the next write position of each slot.
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._heads = np.zeros(0, dtype=np.int64)
+        self._slots = {}
+        self._free_slots = []
+
+    @property
+    def samples(self):
+        samples = {}
+        capacity = 0 if self._gallery is None else self._gallery.shape[1]
+        for target, slot in self._slots.items():
+            count = self._counts[slot]
+            order = (self._heads[slot] - count + np.arange(count)) % capacity
+            samples[target] = list(self._gallery[slot, order])
+        return samples
+
+    def _allocate(self, feature_dim, dtype):
+        """Get a free slot of the gallery, the gallery is doubled when it is full."""
+        if self._gallery is None:
+            capacity = int(self.budget) if self.budget is not None else 16
+            self._gallery = np.zeros((16, capacity, feature_dim), dtype=dtype)
+            self._counts = np.zeros(16, dtype=np.int64)
+            self._heads = np.zeros(16, dtype=np.int64)
+            self._free_slots = list(range(15, -1, -1))
+        if not self._free_slots:
+            num_slots = self._gallery.shape[0]
+            self._gallery = np.concatenate([self._gallery, np.zeros_like(self._gallery)])
+            self._counts = np.concatenate([self._counts, np.zeros(num_slots, dtype=np.int64)])
+            self._heads = np.concatenate([self._heads, np.zeros(num_slots, dtype=np.int64)])
+            self._free_slots = list(range(2 * num_slots - 1, num_slots - 1, -1))
+        return self._free_slots.pop()
+
+    def _grow(self, capacity):
+        """Grow the ring buffers of an unbounded gallery to hold `capacity` samples, keeping the sample order."""
+        old_capacity = self._gallery.shape[1]
+        new_capacity = max(capacity, 2 * old_capacity)
+        gallery = np.zeros((self._gallery.shape[0], new_capacity, self._gallery.shape[2]),
+                           dtype=self._gallery.dtype)
+        for slot in self._slots.values():
+            count = self._counts[slot]
+            order = (self._heads[slot] - count + np.arange(count)) % old_capacity
+            gallery[slot, :count] = self._gallery[slot, order]
+            self._heads[slot] = count
+        self._gallery = gallery
 
     def partial_fit(self, features, targets, active_targets):
         """Update the distance metric with new data.
@@ -160,11 +207,35 @@ class NearestNeighborDistanceMetric:
             A list of targets that are currently present in the scene.
 
         """
-        for feature, target in zip(features, targets):
-            self.samples.setdefault(target, []).append(feature)
-            if self.budget is not None:
-                self.samples[target] = self.samples[target][-int(self.budget):]
-        self.samples = {k: self.samples[k] for k in active_targets}
+        features = np.asarray(features)
+        targets = np.asarray(targets)
+        if len(features):
+            if self.metric == "cosine":
+                # Samples are stored normalized, so the distance is a plain matrix product.
+                features = features / np.linalg.norm(features, axis=1, keepdims=True)
+            for target in dict.fromkeys(targets.tolist()):
+                target_features = features[targets == target]
+                slot = self._slots.get(target)
+                if slot is None:
+                    slot = self._allocate(features.shape[1], features.dtype)
+                    self._slots[target] = slot
+                    self._counts[slot] = 0
+                    self._heads[slot] = 0
+                capacity = self._gallery.shape[1]
+                if self.budget is None and self._counts[slot] + len(target_features) > capacity:
+                    self._grow(self._counts[slot] + len(target_features))
+                    capacity = self._gallery.shape[1]
+                target_features = target_features[-capacity:]
+                positions = (self._heads[slot] + np.arange(len(target_features))) % capacity
+                self._gallery[slot, positions] = target_features
+                self._heads[slot] = (self._heads[slot] + len(target_features)) % capacity
+                self._counts[slot] = min(self._counts[slot] + len(target_features), capacity)
+
+        active_targets = set(active_targets)
+        for target in [k for k in self._slots if k not in active_targets]:
+            slot = self._slots.pop(target)
+            self._counts[slot] = 0
+            self._free_slots.append(slot)
 
     def distance(self, features, targets):
         """Compute distance between features and targets.
@@ -184,7 +255,22 @@ class NearestNeighborDistanceMetric:
             `targets[i]` and `features[j]`.
 
         """
-        cost_matrix = np.zeros((len(targets), len(features)))
-        for i, target in enumerate(targets):
-            cost_matrix[i, :] = self._metric(self.samples[target], features)
-        return cost_matrix
+        features = np.asarray(features)
+        if len(targets) == 0 or len(features) == 0:
+            return np.zeros((len(targets), len(features)))
+        slots = np.array([self._slots[target] for target in targets])
+        counts = self._counts[slots]
+        # The samples of a slot always fill a prefix of its ring buffer.
+        num_targets, capacity = len(slots), int(counts.max())
+        samples = self._gallery[slots, :capacity].reshape(num_targets * capacity, -1)
+        if self.metric == "cosine":
+            features = features / np.linalg.norm(features, axis=1, keepdims=True)
+            distances = 1. - np.dot(samples, features.T)
+        else:
+            distances = -2. * np.dot(samples, features.T) + np.square(samples).sum(axis=1)[:, None] + \
+                        np.square(features).sum(axis=1)[None, :]
+            distances = np.maximum(0.0, distances)
+        distances = distances.reshape(num_targets, capacity, len(features))
+        # Unused positions of the ring buffers never win the minimum.
+        distances[np.arange(capacity)[None, :] >= counts[:, None]] = np.inf
+        return distances.min(axis=1).astype(np.float64)
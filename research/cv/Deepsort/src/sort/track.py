@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ============================================================================
+import numpy as np
+
 
 class TrackState:
     """
@@ -149,6 +151,59 @@ class Track:
         """
         self.mean, self.covariance = kf.update(
             self.mean, self.covariance, detection.to_xyah())
+        self._mark_hit(detection)
+
+    @staticmethod
+    def multi_predict(tracks, kf):
+        """Run the Kalman filter prediction step of all tracks at once, see
+        `predict`.
+
+        Parameters
+        ----------
+        tracks : List[Track]
+            The tracks to propagate.
+        kf : kalman_filter.KalmanFilter
+            The Kalman filter.
+
+        """
+        if not tracks:
+            return
+        multi_mean, multi_covariance = kf.multi_predict(
+            np.asarray([track.mean for track in tracks]),
+            np.asarray([track.covariance for track in tracks]))
+        for track, mean, covariance in zip(tracks, multi_mean, multi_covariance):
+            track.mean, track.covariance = mean, covariance
+            track.age += 1
+            track.time_since_update += 1
+
+    @staticmethod
+    def multi_update(tracks, kf, detections):
+        """Run the Kalman filter measurement update step of all tracks at
+        once, see `update`.
+
+        Parameters
+        ----------
+        tracks : List[Track]
+            The tracks to update.
+        kf : kalman_filter.KalmanFilter
+            The Kalman filter.
+        detections : List[Detection]
+            The associated detection of each track.
+
+        """
+        if not tracks:
+            return
+        multi_mean, multi_covariance = kf.multi_update(
+            np.asarray([track.mean for track in tracks]),
+            np.asarray([track.covariance for track in tracks]),
+            np.asarray([detection.to_xyah() for detection in detections]))
+        for track, detection, mean, covariance in zip(tracks, detections, multi_mean, multi_covariance):
+            track.mean, track.covariance = mean, covariance
+            track._mark_hit(detection)
+
+    def _mark_hit(self, detection):
+        """Update the feature cache and the track state after a measurement
+        update."""
         self.features.append(detection.feature)
 
         self.hits += 1
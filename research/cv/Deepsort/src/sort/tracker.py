@@ -66,8 +66,7 @@ class Tracker:
 
         This function should be called once every time step, before `update`.
         """
-        for track in self.tracks:
-            track.predict(self.kf)
+        Track.multi_predict(self.tracks, self.kf)
 
     def update(self, detections):
         """Perform measurement update and track management.
@@ -83,9 +82,9 @@ class Tracker:
             self._match(detections)
 
         # Update track set.
-        for track_idx, detection_idx in matches:
-            self.tracks[track_idx].update(
-                self.kf, detections[detection_idx])
+        Track.multi_update(
+            [self.tracks[track_idx] for track_idx, _ in matches], self.kf,
+            [detections[detection_idx] for _, detection_idx in matches])
         for track_idx in unmatched_tracks:
             self.tracks[track_idx].mark_missed()
         for detection_idx in unmatched_detections:
@@ -174,15 +174,10 @@ class KalmanFilter:
             1e-5 * np.ones_like(mean[:, 3]),
             self._std_weight_velocity * mean[:, 3]]
         sqr = np.square(np.r_[std_pos, std_vel]).T
-
-        motion_cov = []
-        for i in range(len(mean)):
-            motion_cov.append(np.diag(sqr[i]))
-        motion_cov = np.asarray(motion_cov)
+        motion_cov = sqr[:, :, None] * np.eye(8)
 
         mean = np.dot(mean, self._motion_mat.T)
-        left = np.dot(self._motion_mat, covariance).transpose((1, 0, 2))
-        covariance = np.dot(left, self._motion_mat.T) + motion_cov
+        covariance = np.matmul(np.matmul(self._motion_mat, covariance), self._motion_mat.T) + motion_cov
 
         return mean, covariance
 
@@ -257,3 +252,86 @@ class KalmanFilter:
             return squared_maha
 
         raise ValueError('invalid distance metric')
+
+    def multi_project(self, mean, covariance):
+        """
+        Project state distributions to measurement space (Vectorized version).
+
+        Args:
+            mean (np.array): The Nx8 dim mean matrix of the object states.
+            covariance (np.array): The Nx8x8 dim covariance matrix of the object states.
+
+        Returns:
+            mean (np.array): Nx4 projected means of the given state estimates.
+            covariance (np.array): Nx4x4 projected covariance matrices of the given state estimates.
+        """
+        std = np.stack([
+            self._std_weight_position * mean[:, 3],
+            self._std_weight_position * mean[:, 3],
+            1e-1 * np.ones_like(mean[:, 3]),
+            self._std_weight_position * mean[:, 3]], axis=1)
+        innovation_cov = np.square(std)[:, :, None] * np.eye(4)
+
+        mean = np.dot(mean, self._update_mat.T)
+        covariance = np.matmul(np.matmul(self._update_mat, covariance), self._update_mat.T)
+        return mean, covariance + innovation_cov
+
+    def multi_update(self, mean, covariance, measurement):
+        """
+        Run Kalman filter correction step (Vectorized version).
+
+        Args:
+            mean (np.array): The Nx8 dim mean matrix of the predicted states.
+            covariance (np.array): The Nx8x8 dim covariance matrix of the states.
+            measurement (np.array): The Nx4 dim measurement matrix (x, y, a, h).
+
+        Returns:
+            new_mean (np.array): Measurement-corrected state means.
+            new_covariance (np.array): Measurement-corrected state covariances.
+        """
+        projected_mean, projected_cov = self.multi_project(mean, covariance)
+
+        # Kalman gain K = P H^T S^-1 from the Cholesky factor L of the projected covariance S,
+        # by solving L X = H P and then L^T K^T = X with np.linalg.solve (numpy has no batched
+        # triangular solver, so both are general LU solves).
+        chol_factor = np.linalg.cholesky(projected_cov)
+        cov_ht = np.swapaxes(np.matmul(covariance, self._update_mat.T), 1, 2)
+        kalman_gain = np.linalg.solve(chol_factor, cov_ht)
+        kalman_gain = np.swapaxes(np.linalg.solve(np.swapaxes(chol_factor, 1, 2), kalman_gain), 1, 2)
+        innovation = measurement - projected_mean
+
+        new_mean = mean + np.matmul(kalman_gain, innovation[:, :, None])[:, :, 0]
+        new_covariance = covariance - np.matmul(np.matmul(kalman_gain, projected_cov), np.swapaxes(kalman_gain, 1, 2))
+        return new_mean, new_covariance
+
+    def multi_gating_distance(self, mean, covariance, measurements, only_position=False, metric='maha'):
+        """
+        Compute gating distance between N state distributions and M measurements (Vectorized version).
+
+        Args:
+            mean (np.array): The Nx8 dim mean matrix of the predicted states.
+            covariance (np.array): The Nx8x8 dim covariance matrix of the states.
+            measurements (np.array): An Mx4 dimensional matrix of M measurements in format (x, y, a, h).
+            only_position (bool): If True, distance computation is done with
+                respect to the bounding box center position only.
+            metric (str): Compute selected metric.
+
+        Returns:
+            (np.array): NxM matrix, where element (i, j) is the gating distance of
+                the i-th state distribution and `measurements[j]`.
+        """
+        mean, covariance = self.multi_project(mean, covariance)
+        if only_position:
+            mean, covariance = mean[:, :2], covariance[:, :2, :2]
+            measurements = measurements[:, :2]
+
+        d = measurements[None, :, :] - mean[:, None, :]
+        if metric == 'gaussian':
+            return np.sum(d * d, axis=2)
+
+        if metric == 'maha':
+            cholesky_factor = np.linalg.cholesky(covariance)
+            z = np.linalg.solve(cholesky_factor, np.swapaxes(d, 1, 2))
+            return np.sum(z * z, axis=1)
+
+        raise ValueError('invalid distance metric')
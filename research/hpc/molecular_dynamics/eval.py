@@ -18,7 +18,8 @@ import mindspore.common.dtype as mstype
 from mindspore import Tensor
 from mindspore import context
 from mindspore.train.serialization import load_checkpoint, load_param_into_net
-from src.network import Network
+from src.network import Network, rcut_r, sel_a
+from src.neighbor_list import load_inputs
 from src.model_utils.config import config
 from src.model_utils.moxing_adapter import moxing_wrapper
 
@@ -36,8 +37,7 @@ def model_eval():
     infer network
     """
     # get input data
-    r = np.load(config.dataset_path)
-    d_coord, d_nlist, avg, std, atype, nlist = r['d_coord'], r['d_nlist'], r['avg'], r['std'], r['atype'], r['nlist']
+    d_coord, d_nlist, avg, std, atype, nlist = load_inputs(config.dataset_path, rcut_r, sel_a)
     batch_size = 1
     atype_tensor = Tensor(atype)
     avg_tensor = Tensor(avg)
@@ -47,10 +47,10 @@ def model_eval():
     d_nlist_tensor = Tensor(d_nlist)
     frames = []
     for i in range(batch_size):
-        frames.append(i * 1536)
+        frames.append(i * len(np.reshape(d_coord, (-1, 3))))
     frames = Tensor(frames)
     # evaluation
-    net = Network()
+    net = Network(tuple(np.bincount(atype.reshape(-1), minlength=len(sel_a)).tolist()))
     param_dict = load_checkpoint(config.checkpoint_path)
     load_param_into_net(net, param_dict)
     net.to_float(mstype.float32)
@@ -16,6 +16,7 @@
 import os
 import numpy as np
 from src.model_utils.config import config
+from src.neighbor_list import load_inputs
 from src.model_utils.moxing_adapter import moxing_wrapper
 
 
@@ -27,13 +28,12 @@ def generate_bin():
     """
     convert input data to numpy bin files
     """
-    r = np.load(config.dataset_path)
-    d_coord, d_nlist, avg, std, atype, nlist = r['d_coord'], r['d_nlist'], r['avg'], r['std'], r['atype'], r['nlist']
+    d_coord, d_nlist, avg, std, atype, nlist = load_inputs(config.dataset_path)
     batch_size = 1
     d_coord = np.reshape(d_coord.astype(np.float32), (1, -1, 3))
     frames = []
     for i in range(batch_size):
-        frames.append(i * 1536)
+        frames.append(i * d_coord.shape[1])
     frames = np.array(frames).astype(np.int32)
     dir_list = ["00_d_coord", "01_d_nlist", "02_frames", "03_avg", "04_std", "05_atype", "06_nlist"]
     path_list = []
@@ -19,15 +19,17 @@ from mindspore.ops import operations as P
 
 
 class ComputeRij(nn.Cell):
-    """compute rij."""
-    def __init__(self):
+    """compute rij of natoms local atoms with nnei neighbours."""
+    def __init__(self, natoms=192, nnei=138):
         super(ComputeRij, self).__init__()
+        self.natoms = natoms
+        self.nnei = nnei
         self.reshape = P.Reshape()
         self.transpose = P.Transpose()
         self.cast = P.Cast()
         self.rsum = P.ReduceSum()
-        self.broadcastto = P.BroadcastTo((1, 192 * 138))
-        self.broadcastto1 = P.BroadcastTo((1, 192, 138, 3))
+        self.broadcastto = P.BroadcastTo((1, natoms * nnei))
+        self.broadcastto1 = P.BroadcastTo((1, natoms, nnei, 3))
         self.expdims = P.ExpandDims()
         self.concat = P.Concat(axis=1)
         self.gather = P.Gather()
@@ -38,10 +40,10 @@ class ComputeRij(nn.Cell):
         """construct function."""
         d_coord_tensor = self.cast(d_coord_tensor, mstype.float32)
         d_coord_tensor = self.reshape(d_coord_tensor, (1, -1, 3))
-        coord_tensor = self.slice(d_coord_tensor, (0, 0, 0), (1, 192, 3))
+        coord_tensor = self.slice(d_coord_tensor, (0, 0, 0), (1, self.natoms, 3))
 
         nlist_tensor = self.cast(nlist_tensor, mstype.int32)
-        nlist_tensor = self.reshape(nlist_tensor, (1, 192, 138))
+        nlist_tensor = self.reshape(nlist_tensor, (1, self.natoms, self.nnei))
 
         b_nlist = nlist_tensor > -1
         b_nlist = self.cast(b_nlist, mstype.int32)
@@ -58,7 +60,7 @@ class ComputeRij(nn.Cell):
 
         d_coord_tensor = self.reshape(d_coord_tensor, (-1, 3))
         selected_coord = self.gather(d_coord_tensor, nlist_tensor_r, 0)
-        selected_coord = self.reshape(selected_coord, (1, 192, 138, 3))
+        selected_coord = self.reshape(selected_coord, (1, self.natoms, self.nnei, 3))
 
         coord_tensor_expanded = self.expdims(coord_tensor, 2)
         coord_tensor_expanded = self.broadcastto1(coord_tensor_expanded)
@@ -74,18 +76,20 @@ class ComputeRij(nn.Cell):
 
 
 class ComputeDescriptor(nn.Cell):
-    """compute descriptor."""
-    def __init__(self):
+    """compute descriptor of natoms local atoms with nnei neighbours."""
+    def __init__(self, natoms=192, nnei=138):
         super(ComputeDescriptor, self).__init__()
+        self.natoms = natoms
+        self.nnei = nnei
         self.reshape = P.Reshape()
         self.transpose = P.Transpose()
         self.cast = P.Cast()
         self.rsum = P.ReduceSum()
-        self.broadcastto = P.BroadcastTo((1, 192 * 138))
-        self.broadcastto1 = P.BroadcastTo((1, 192, 138, 3))
-        self.broadcastto2 = P.BroadcastTo((1, 192, 138, 3, 3))
-        self.broadcastto3 = P.BroadcastTo((1, 192, 138, 4))
-        self.broadcastto4 = P.BroadcastTo((1, 192, 138, 4, 3))
+        self.broadcastto = P.BroadcastTo((1, natoms * nnei))
+        self.broadcastto1 = P.BroadcastTo((1, natoms, nnei, 3))
+        self.broadcastto2 = P.BroadcastTo((1, natoms, nnei, 3, 3))
+        self.broadcastto3 = P.BroadcastTo((1, natoms, nnei, 4))
+        self.broadcastto4 = P.BroadcastTo((1, natoms, nnei, 4, 3))
 
         self.expdims = P.ExpandDims()
         self.concat = P.Concat(axis=3)
@@ -100,7 +104,7 @@ class ComputeDescriptor(nn.Cell):
 
     def construct(self, rij_tensor, avg_tensor, std_tensor, nlist_tensor, atype_tensor, r_min=5.8, r_max=6.0):
         """construct function."""
-        nlist_tensor = self.reshape(nlist_tensor, (1, 192, 138))
+        nlist_tensor = self.reshape(nlist_tensor, (1, self.natoms, self.nnei))
         b_nlist = nlist_tensor > -1
         b_nlist = self.cast(b_nlist, mstype.int32)
         b_nlist_expanded = self.expdims(b_nlist, 3)
@@ -183,8 +187,8 @@ class ComputeDescriptor(nn.Cell):
         atype_tensor = self.cast(atype_tensor, mstype.int32)
         avg_tensor = self.gather(avg_tensor, atype_tensor, 0)
         std_tensor = self.gather(std_tensor, atype_tensor, 0)
-        avg_tensor = self.reshape(avg_tensor, (1, 192, 138, 4))
-        std_tensor = self.reshape(std_tensor, (1, 192, 138, 4))
+        avg_tensor = self.reshape(avg_tensor, (1, self.natoms, self.nnei, 4))
+        std_tensor = self.reshape(std_tensor, (1, self.natoms, self.nnei, 4))
 
         std_tensor_2 = self.expdims(std_tensor, 4)
         std_tensor_2 = self.broadcastto4(std_tensor_2)
@@ -196,10 +200,10 @@ class ComputeDescriptor(nn.Cell):
 
 
 class DescriptorSeA(nn.Cell):
-    def __init__(self):
+    def __init__(self, natoms=192, nnei=138):
         super(DescriptorSeA, self).__init__()
-        self.compute_rij = ComputeRij()
-        self.compute_descriptor = ComputeDescriptor()
+        self.compute_rij = ComputeRij(natoms, nnei)
+        self.compute_descriptor = ComputeDescriptor(natoms, nnei)
 
     def construct(self, coord, nlist, frames, avg, std, atype):
         rij = self.compute_rij(coord, nlist, frames)
@@ -0,0 +1,201 @@
+# Copyright 2022 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Cell list and Verlet neighbour list in the layout of DeePMD se_a."""
+import itertools
+import numpy as np
+
+
+class NeighborList:
+    """
+    Build d_coord, d_nlist and nlist of the descriptor from the atom coordinates.
+
+    The periodic images within the cutoff of the box are appended to the local atoms as ghost atoms, and the
+    neighbours are searched in a cell list whose cells are not smaller than the cutoff, so the cost is linear
+    in the number of atoms. The neighbours of each atom are grouped by type, sorted by distance and padded
+    with -1 to sel[type] slots, which is the layout of op/descrpt_se_a.cc in DeePMD-kit.
+
+    With skin > 0 the candidate pairs within rcut + skin are kept (Verlet list), and update() only filters
+    them again until an atom moves further than skin / 2 since the last build.
+
+    Args:
+        rcut (float): Cutoff radius. Default: 6.0.
+        sel (tuple): Maximum number of neighbours of each type. Default: (46, 92).
+        skin (float): Verlet skin, 0 means the cell list is searched at every update. Default: 0.0.
+        chunk_size (int): Number of local atoms searched at a time, which bounds the memory of the
+            candidate pairs. Default: 4096.
+    """
+    def __init__(self, rcut=6.0, sel=(46, 92), skin=0.0, chunk_size=4096):
+        self.rcut = rcut
+        self.sel = np.asarray(sel, dtype=np.int64)
+        self.sel_offset = np.concatenate([[0], np.cumsum(self.sel)[:-1]])
+        self.skin = skin
+        self.chunk_size = chunk_size
+        self.atype = None
+        self.box = None
+        self.ref_coord = None
+        self.wrap = None
+        self.ghost_src = None
+        self.ghost_shift = None
+        self.pairs = None
+
+    def build(self, coord, atype, box=None):
+        """
+        Search the neighbours with the cell list.
+
+        Args:
+            coord (numpy.ndarray): Coordinates of the local atoms with shape [natoms, 3].
+            atype (numpy.ndarray): Types of the local atoms with shape [natoms], sorted in ascending order.
+            box (numpy.ndarray): Cell vectors of the periodic box in rows with shape [3, 3],
+                None means the system is not periodic. Default: None.
+
+        Returns:
+            d_coord with shape [nall, 3], the local atoms wrapped into the box followed by the ghost atoms,
+            d_nlist with shape [natoms, sum(sel)] indexing d_coord,
+            nlist with shape [natoms, sum(sel)] indexing the local atoms.
+        """
+        coord = np.asarray(coord, dtype=np.float64).reshape(-1, 3)
+        atype = np.asarray(atype, dtype=np.int64).reshape(-1)
+        if len(atype) != len(coord):
+            raise ValueError("atype should have {} atoms, but got {}".format(len(coord), len(atype)))
+        if np.any(np.diff(atype) < 0):
+            raise ValueError("atype should be sorted, the network splits the atoms by type in order")
+        self.atype = atype
+        self.box = None if box is None else np.asarray(box, dtype=np.float64).reshape(3, 3)
+        self.ref_coord = coord.copy()
+        self._build_ghosts(coord)
+        d_coord = self._extended_coord(coord)
+        self.pairs = self._search_pairs(d_coord, len(coord))
+        return self._format(d_coord, len(coord))
+
+    def update(self, coord, box=None):
+        """Same as build() for the atoms of the last build, which reuses the Verlet list while it is valid."""
+        coord = np.asarray(coord, dtype=np.float64).reshape(-1, 3)
+        box = None if box is None else np.asarray(box, dtype=np.float64).reshape(3, 3)
+        rebuild = self.pairs is None or self.skin <= 0 or len(coord) != len(self.ref_coord)
+        if not rebuild:
+            same_box = (box is None and self.box is None) or \
+                       (box is not None and self.box is not None and np.array_equal(box, self.box))
+            max_disp = np.sqrt(np.max(np.sum(np.square(coord - self.ref_coord), axis=1)))
+            rebuild = not same_box or max_disp > 0.5 * self.skin
+        if rebuild:
+            return self.build(coord, self.atype, box)
+        return self._format(self._extended_coord(coord), len(coord))
+
+    def _build_ghosts(self, coord):
+        """Find the periodic images within rcut + skin of the box, as source atoms and integer image shifts."""
+        self.wrap = np.zeros((len(coord), 3), dtype=np.float64)
+        self.ghost_src = np.zeros(0, dtype=np.int64)
+        self.ghost_shift = np.zeros((0, 3), dtype=np.float64)
+        if self.box is None:
+            return
+        inv_box = np.linalg.inv(self.box)
+        frac = np.dot(coord, inv_box)
+        wrap = -np.floor(frac)
+        frac = frac + wrap
+        self.wrap = wrap
+        # Distance between the opposite faces of the box is 1 / |column of the inverse box|
+        margin = (self.rcut + self.skin) * np.linalg.norm(inv_box, axis=0)
+        num_images = np.ceil(margin).astype(np.int64)
+        src, shift = [], []
+        for image in itertools.product(*[range(-n, n + 1) for n in num_images]):
+            if not any(image):
+                continue
+            image_frac = frac + np.array(image, dtype=np.float64)
+            keep = np.flatnonzero(np.all((image_frac >= -margin) & (image_frac < 1.0 + margin), axis=1))
+            src.append(keep)
+            shift.append(wrap[keep] + np.array(image, dtype=np.float64))
+        self.ghost_src = np.concatenate(src)
+        self.ghost_shift = np.concatenate(shift)
+
+    def _extended_coord(self, coord):
+        if self.box is None:
+            return coord.copy()
+        local = coord + np.dot(self.wrap, self.box)
+        ghosts = coord[self.ghost_src] + np.dot(self.ghost_shift, self.box)
+        return np.concatenate([local, ghosts])
+
+    def _search_pairs(self, d_coord, natoms):
+        """Return (i, j) of all the pairs within rcut + skin, where i is a local atom and j indexes d_coord."""
+        cutoff = self.rcut + self.skin
+        origin = np.min(d_coord, axis=0)
+        cell_index = np.floor((d_coord - origin) / cutoff).astype(np.int64)
+        num_cells = np.max(cell_index, axis=0) + 1
+        cell_id = np.ravel_multi_index(cell_index.T, num_cells)
+        order = np.argsort(cell_id, kind='stable')
+        cell_start = np.searchsorted(cell_id[order], np.arange(np.prod(num_cells) + 1))
+
+        offsets = np.array(list(itertools.product((-1, 0, 1), repeat=3)), dtype=np.int64)
+        pair_i, pair_j = [], []
+        for start in range(0, natoms, self.chunk_size):
+            local = np.arange(start, min(start + self.chunk_size, natoms))
+            chunk_i, chunk_j = [], []
+            for offset in offsets:
+                neighbor_cell = cell_index[local] + offset
+                valid = np.all((neighbor_cell >= 0) & (neighbor_cell < num_cells), axis=1)
+                atoms = local[valid]
+                neighbor_id = np.ravel_multi_index(neighbor_cell[valid].T, num_cells)
+                lower, upper = cell_start[neighbor_id], cell_start[neighbor_id + 1]
+                counts = upper - lower
+                # Expand the [lower, upper) range of each atom into the positions in the sorted atoms
+                pos = np.arange(np.sum(counts)) - np.repeat(np.cumsum(counts) - counts - lower, counts)
+                chunk_i.append(np.repeat(atoms, counts))
+                chunk_j.append(order[pos])
+            chunk_i = np.concatenate(chunk_i)
+            chunk_j = np.concatenate(chunk_j)
+            dist_2 = np.sum(np.square(d_coord[chunk_j] - d_coord[chunk_i]), axis=1)
+            keep = (dist_2 < cutoff * cutoff) & (chunk_i != chunk_j)
+            pair_i.append(chunk_i[keep])
+            pair_j.append(chunk_j[keep])
+        return np.concatenate(pair_i), np.concatenate(pair_j)
+
+    def _format(self, d_coord, natoms):
+        """Fill the pairs within rcut into the per type slots of each atom, in ascending order of distance."""
+        pair_i, pair_j = self.pairs
+        dist_2 = np.sum(np.square(d_coord[pair_j] - d_coord[pair_i]), axis=1)
+        keep = dist_2 < self.rcut * self.rcut
+        pair_i, pair_j, dist_2 = pair_i[keep], pair_j[keep], dist_2[keep]
+        src = np.concatenate([np.arange(natoms), self.ghost_src])
+        pair_type = self.atype[src[pair_j]]
+        order = np.lexsort((pair_j, dist_2, pair_type, pair_i))
+        pair_i, pair_j, pair_type = pair_i[order], pair_j[order], pair_type[order]
+        group = pair_i * len(self.sel) + pair_type
+        group_start = np.flatnonzero(np.concatenate([[True], group[1:] != group[:-1]]))
+        rank = np.arange(len(group)) - np.repeat(group_start, np.diff(np.append(group_start, len(group))))
+        # The neighbours beyond sel are dropped, the same as DeePMD-kit
+        keep = rank < self.sel[pair_type]
+        slot = self.sel_offset[pair_type[keep]] + rank[keep]
+        d_nlist = np.full((natoms, int(np.sum(self.sel))), -1, dtype=np.int32)
+        d_nlist[pair_i[keep], slot] = pair_j[keep]
+        nlist = np.where(d_nlist >= 0, src[np.maximum(d_nlist, 0)], -1).astype(np.int32)
+        return d_coord, d_nlist, nlist
+
+
+def build_neighbor_list(coord, atype, box=None, rcut=6.0, sel=(46, 92)):
+    """Build d_coord, d_nlist and nlist of one frame, see NeighborList."""
+    return NeighborList(rcut, sel).build(coord, atype, box)
+
+
+def load_inputs(dataset_path, rcut=6.0, sel=(46, 92)):
+    """
+    Load d_coord, d_nlist, avg, std, atype and nlist from the npz file. If d_nlist is not saved, the neighbour
+    list is built from coord, atype and box (optional, the system is not periodic without it).
+    """
+    r = np.load(dataset_path)
+    avg, std, atype = r['avg'], r['std'], r['atype']
+    if 'd_nlist' in r:
+        return r['d_coord'], r['d_nlist'], avg, std, atype, r['nlist']
+    box = r['box'] if 'box' in r else None
+    d_coord, d_nlist, nlist = build_neighbor_list(r['coord'], atype, box, rcut, sel)
+    return d_coord.astype(np.float32), d_nlist[None], avg, std, atype.astype(np.int32), nlist[None]
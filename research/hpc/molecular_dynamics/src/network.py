@@ -45,8 +45,8 @@ type_bias_ae = [-93.57, -187.15]
 
 
 class MDNet(nn.Cell):
-    """MD simulation network."""
-    def __init__(self):
+    """MD simulation network, type_natoms is the number of local atoms of each type."""
+    def __init__(self, type_natoms=(natoms[2], natoms[3])):
         super(MDNet, self).__init__()
         self.reshape = P.Reshape()
         self.shape = P.Shape()
@@ -62,7 +62,7 @@ class MDNet(nn.Cell):
         self.idt = [self.idt1, self.idt2, self.idt3, self.idt4]
         self.neuron = [dim_descrpt] + n_neuron
         self.par = [1] + filter_neuron
-        self.process = Processing()
+        self.process = Processing(type_natoms)
         fc = []
         for i in range(3):
             fc.append(nn.Dense(self.par[i], self.par[i + 1],
@@ -172,18 +172,14 @@ class MDNet(nn.Cell):
 
 
 class Processing(nn.Cell):
-    """data process."""
-    def __init__(self):
+    """data process, the local atoms are sorted by type and type_natoms is the number of each type."""
+    def __init__(self, type_natoms=(natoms[2], natoms[3])):
         super(Processing, self).__init__()
+        self.type_natoms = type_natoms
         self.slice = P.Slice()
         self.reshape = P.Reshape()
         self.shape = P.Shape()
         self.batchmat = nn.MatMul()
-        self.split = P.Split(1, 3)
-        self.concat = P.Concat(axis=1)
-        slice_64 = Tensor(np.hstack((np.identity(64), np.zeros([64, 128]))))
-        slice_128 = Tensor(np.hstack((np.zeros([128, 64]), np.identity(128))))
-        self.slice_0 = [slice_64, slice_128]
         slice_46 = Tensor(np.hstack((np.identity(46), np.zeros([46, 92]))))
         slice_92 = Tensor(np.hstack((np.zeros([92, 46]), np.identity(92))))
         self.slice_1 = [slice_46, slice_92]
@@ -193,10 +189,10 @@ class Processing(nn.Cell):
     def construct(self, inputs):
         """construct function."""
         slice_data = []
-        split_tensor = self.split(inputs)
-        split_64 = self.reshape(split_tensor[0], (-1, 138, 4))
-        split_128 = self.reshape(self.concat((split_tensor[1], split_tensor[2])), (-1, 138, 4))
-        split_t = (split_64, split_128)
+        inputs = self.reshape(inputs, (-1, nnei_a, 4))
+        split_0 = self.slice(inputs, (0, 0, 0), (self.type_natoms[0], nnei_a, 4))
+        split_1 = self.slice(inputs, (self.type_natoms[0], 0, 0), (self.type_natoms[1], nnei_a, 4))
+        split_t = (split_0, split_1)
         for type_i in range(2):
             for type_j in range(2):
                 inputs_reshape = self.batchmat(self.slice_1[type_j], split_t[type_i])
@@ -220,15 +216,22 @@ class Grad(nn.Cell):
 
 
 class Network(nn.Cell):
-    """The network to calculate energy, force and virial."""
-    def __init__(self):
+    """
+    The network to calculate energy, force and virial.
+
+    Args:
+        type_natoms (tuple): Number of local atoms of each type, the atoms are sorted by type.
+            Default: the 64 O and 128 H atoms of the water example.
+    """
+    def __init__(self, type_natoms=(natoms[2], natoms[3])):
         super(Network, self).__init__()
+        self.natoms = sum(type_natoms)
         self.reshape = P.Reshape()
         self.sum = P.ReduceSum()
-        self.mdnet = MDNet()
+        self.mdnet = MDNet(type_natoms)
         self.grad = Grad(self.mdnet)
-        self.descrpt_se_a = DescriptorSeA()
-        self.process = Processing()
+        self.descrpt_se_a = DescriptorSeA(self.natoms, nnei_a)
+        self.process = Processing(type_natoms)
 
     def construct(self, d_coord, d_nlist, frames, avg, std, atype, nlist):
         """construct function."""
@@ -237,7 +240,7 @@ class Network(nn.Cell):
         # calculate energy and atom_ener
         atom_ener = self.mdnet(descrpt)
         energy_raw = atom_ener
-        energy_raw = self.reshape(energy_raw, (-1, natoms[0]))
+        energy_raw = self.reshape(energy_raw, (-1, self.natoms))
         energy = self.sum(energy_raw, 1)
         # grad of atom_ener
         net_deriv = self.grad(descrpt)
@@ -14,6 +14,7 @@
 # ============================================================================
 """read variables"""
 
+from collections.abc import Mapping
 import numpy as np
 import netCDF4 as nc
 
@@ -26,6 +27,93 @@ params_name = ['z', 'zz', 'dz', 'dzz', 'dx', 'dy', 'cor', 'h', 'fsm', 'dum', 'dv
                'sbw', 'tbw', 'tbn', 'tbs', 'sbn', 'sbs', 'wtsurf', 'swrad']
 
 
+def get_tile(im, jm, px, py, rank, halo=1):
+    """
+    Get the tile of rank in the px * py decomposition of the im * jm grid, ranks are ordered along x first.
+
+    Args:
+        im (int): The size of x direction.
+        jm (int): The size of y direction.
+        px (int): The number of tiles in x direction.
+        py (int): The number of tiles in y direction.
+        rank (int): The rank of the process.
+        halo (int): The width of the halo around the tile, which is clipped at the grid boundary. Default: 1.
+
+    Returns:
+        tuple[slice], The x and y slices of the tile with its halo in the global grid.
+    """
+    if not 0 <= rank < px * py:
+        raise ValueError("rank should be in [0, {}), but got {}".format(px * py, rank))
+    ti, tj = rank % px, rank // px
+    i_start, i_end = im * ti // px, im * (ti + 1) // px
+    j_start, j_end = jm * tj // py, jm * (tj + 1) // py
+    return slice(max(i_start - halo, 0), min(i_end + halo, im)), slice(max(j_start - halo, 0), min(j_end + halo, jm))
+
+
+class NcReader(Mapping):
+    """
+    Read the variables from the nc data file on demand, a variable is read when it is accessed, k_chunk levels
+    at a time, so the whole file is never held in memory. If a tile of the grid is given, only the hyperslab of
+    the tile is read from the file, and the dimensions which are not of the grid size (e.g. the boundary
+    values) are read entirely.
+
+    Args:
+        file_path (str): The path of the nc data file.
+        im (int): The size of x direction, only needed with tile. Default: None.
+        jm (int): The size of y direction, only needed with tile. Default: None.
+        tile (tuple[slice]): The x and y slices of the tile, see get_tile. Default: None, the whole grid.
+        k_chunk (int): The number of z levels read at a time. Default: 1.
+        cache (bool): Whether to keep the variables which have been read. Default: False.
+    """
+    def __init__(self, file_path, im=None, jm=None, tile=None, k_chunk=1, cache=False):
+        self.file_obj = nc.Dataset(file_path)
+        # The raw values are the same as the masked array converted by np.float32 in load_var
+        self.file_obj.set_auto_mask(False)
+        self.im = im
+        self.jm = jm
+        self.tile = tile
+        self.k_chunk = k_chunk
+        self.cache = {} if cache else None
+
+    def __getitem__(self, name):
+        if name not in params_name:
+            raise KeyError(name)
+        if self.cache is not None and name in self.cache:
+            return self.cache[name]
+        data = self.read(name)
+        if self.cache is not None:
+            self.cache[name] = data
+        return data
+
+    def __iter__(self):
+        return iter(params_name)
+
+    def __len__(self):
+        return len(params_name)
+
+    def _slices(self, shape):
+        """The slices of the variable in the file, whose dimensions are (z, y, x)."""
+        if self.tile is None:
+            return slice(None), slice(None)
+        i_slice, j_slice = self.tile
+        return (j_slice if shape[1] == self.jm else slice(None)), (i_slice if shape[2] == self.im else slice(None))
+
+    def read(self, name):
+        """Read the variable (of the tile) with dimensions (x, y, z)."""
+        var = self.file_obj.variables[name]
+        j_slice, i_slice = self._slices(var.shape)
+        kb = var.shape[0]
+        nj = len(range(var.shape[1])[j_slice])
+        ni = len(range(var.shape[2])[i_slice])
+        data = np.empty((ni, nj, kb), np.float32)
+        for k in range(0, kb, self.k_chunk):
+            data[:, :, k:k + self.k_chunk] = np.transpose(var[k:k + self.k_chunk, j_slice, i_slice], (2, 1, 0))
+        return data
+
+    def close(self):
+        self.file_obj.close()
+
+
 def load_var(file_obj, name):
     """load variable from nc data file"""
     data = file_obj.variables[name]
@@ -34,10 +122,6 @@ def load_var(file_obj, name):
     return data
 
 
-def read_nc(file_path):
+def read_nc(file_path, im=None, jm=None, tile=None):
     """ put the load variable into the dict """
-    variable = {}
-    file_obj = nc.Dataset(file_path)
-    for name in params_name:
-        variable[name] = load_var(file_obj, name)
-    return variable
+    return dict(NcReader(file_path, im, jm, tile))
@@ -18,7 +18,7 @@ import argparse
 import time
 import numpy as np
 import mindspore.context as context
-from src.read_var import read_nc
+from src.read_var import NcReader
 from src.GOMO import GOMO_init, GOMO, read_init
 
 parser = argparse.ArgumentParser(description='GOMO')
@@ -34,7 +34,8 @@ args_gomo = parser.parse_args()
 context.set_context(mode=context.GRAPH_MODE, device_target="GPU", save_graphs=False, enable_graph_kernel=True)
 
 if __name__ == "__main__":
-    variable = read_nc(args_gomo.file_path)
+    # the variables are read from the nc file when they are used
+    variable = NcReader(args_gomo.file_path)
     im = args_gomo.im
     jm = args_gomo.jm
     kb = args_gomo.kb
@@ -29,7 +29,7 @@ from src.model_utils.config import config
 from src.model_utils.device_adapter import get_device_id
 from src.model_utils.moxing_adapter import moxing_wrapper
 
-from src.data import Featurizer, make_grid
+from src.data import Featurizer, make_grids
 
 
 def modelarts_pre_process():
@@ -63,13 +63,9 @@ def eval_dataset(configs, data_path):
             configs.logger.info('Predict for all complexes at once')
         else:
             configs.logger.info('%s samples per batch' % configs.batch_size)
-    evaldata = []
-    for crd, f in zip(coords, features):
-        evaldata.append(make_grid(crd, f, max_dist=configs.max_dist,
-                                  grid_resolution=configs.grid_spacing))
-    batch_grid = np.vstack(evaldata)
-    batch_grid[..., charge_column] /= configs.charge_scaler
-    batch_grid = np.transpose(batch_grid, axes=(0, 4, 1, 2, 3))
+    batch_grid = make_grids(coords, features, max_dist=configs.max_dist,
+                            grid_resolution=configs.grid_spacing)
+    batch_grid[:, charge_column] /= configs.charge_scaler
     batch_grid = np.expand_dims(batch_grid, axis=1)
     print("batch grid: ", batch_grid.shape, names)
     return batch_grid, names
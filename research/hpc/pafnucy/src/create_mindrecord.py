@@ -19,26 +19,28 @@ import pandas as pd
 import numpy as np
 from mindspore.mindrecord import FileWriter
 from src.model_utils.config import config
-from src.dataloader import preprocess_dataset
+from src.dataloader import preprocess_dataset, iter_grid_batches
 
 
-class DatasetIter:
-    def __init__(self, coor_features, affinity):
-        self.coor_features = coor_features
-        self.affinity = affinity
-
-    def __getitem__(self, index):
-        return self.coor_features[index], self.affinity[index]
-
-    def __len__(self):
-        return len(self.coor_features)
+def write_mindrecord(file_name, schema_name, grid_batches):
+    """Write the voxelized grids into a mindrecord file batch by batch."""
+    writer = FileWriter(file_name, shard_num=1)
+    data_schema = {
+        "coords_features": {"type": "float32", "shape": [19, 21, 21, 21]},
+        "affinitys": {"type": "float32", "shape": [-1]}
+    }
+    writer.add_schema(data_schema, schema_name)
+    for grids, affinitys in grid_batches:
+        writer.write_raw_data([{'coords_features': np.array(coor_feature, dtype=np.float32),
+                                'affinitys': np.array(affine, dtype=np.float32)}
+                               for coor_feature, affine in zip(grids, affinitys)])
+    writer.commit()
 
 
 def create_mindrecord():
-    train_coords_features, y_train_size, train_no_rotationcoords_features, \
-    val_coords_features, no_batch_size = preprocess_dataset(config, config.data_path,
-                                                            batch_rotation=list(range(config.rotations)),
-                                                            batch_no_rotation=0, v_batch_rotation=0)
+    coords, features, affinity, charge_column, charges_std = preprocess_dataset(config.data_path)
+    y_train_size = len(affinity['training'])
+    no_batch_size = len(affinity['validation'])
     print("train size: ", y_train_size, flush=True)
     print("Validation size: ", no_batch_size, flush=True)
     train_rotation_path = os.path.join(config.mindrecord_path, 'train_rotation')
@@ -51,52 +53,20 @@ def create_mindrecord():
     if not os.path.exists(val_path):
         os.mkdir(val_path)
 
-    train_rot_writer = FileWriter(os.path.join(train_rotation_path, 'train_rotation_dataset.mindrecord'), shard_num=1)
-    rot_train_data_schema = {
-        "coords_features": {"type": "float32", "shape": [19, 21, 21, 21]},
-        "affinitys": {"type": "float32", "shape": [-1]}
-    }
-    train_rot_writer.add_schema(rot_train_data_schema, "pdbbind_rot")
-    data_iterator = DatasetIter(train_coords_features['coords_features'], train_coords_features['affinitys'])
-    train_rot_item = {'coords_features': [], 'affinitys': []}
-    for coor_feature, affine in data_iterator:
-        train_rot_item['coords_features'] = np.array(coor_feature, dtype=np.float32)
-        train_rot_item['affinitys'] = np.array(affine, dtype=np.float32)
-        train_rot_writer.write_raw_data([train_rot_item])
-    train_rot_writer.commit()
+    def grid_batches(dataset_name, rotations):
+        return iter_grid_batches(config, coords[dataset_name], features[dataset_name], affinity[dataset_name],
+                                 charge_column, charges_std, rotations)
+
+    write_mindrecord(os.path.join(train_rotation_path, 'train_rotation_dataset.mindrecord'), "pdbbind_rot",
+                     grid_batches('training', list(range(config.rotations))))
     print("Rotation training mindrecord create finished!", flush=True)
 
-    train_norot_writer = FileWriter(os.path.join(train_no_rotation_path,
-                                                 'train_norotation_dataset.mindrecord'), shard_num=1)
-    norot_train_data_schema = {
-        "coords_features": {"type": "float32", "shape": [19, 21, 21, 21]},
-        "affinitys": {"type": "float32", "shape": [-1]}
-    }
-    train_norot_writer.add_schema(norot_train_data_schema, "pdbbind_norot")
-    norot_data_iterator = DatasetIter(train_no_rotationcoords_features['coords_features'],
-                                      train_no_rotationcoords_features['affinitys'])
-    train_no_rot_item = {'coords_features': [], 'affinitys': []}
-    for coor_feature, affine in norot_data_iterator:
-        train_no_rot_item['coords_features'] = np.array(coor_feature, dtype=np.float32)
-        train_no_rot_item['affinitys'] = np.array(affine, dtype=np.float32)
-        train_norot_writer.write_raw_data([train_no_rot_item])
-    train_norot_writer.commit()
+    write_mindrecord(os.path.join(train_no_rotation_path, 'train_norotation_dataset.mindrecord'), "pdbbind_norot",
+                     grid_batches('training', 0))
     print("No rotation training mindrecord create finished!", flush=True)
 
-    val_writer = FileWriter(os.path.join(val_path, 'validation_dataset.mindrecord'), shard_num=1)
-    val_data_schema = {
-        "coords_features": {"type": "float32", "shape": [19, 21, 21, 21]},
-        "affinitys": {"type": "float32", "shape": [-1]}
-    }
-    val_writer.add_schema(val_data_schema, "pdbbind_val")
-    val_data_iterator = DatasetIter(val_coords_features['coords_features'],
-                                    val_coords_features['affinitys'])
-    val_rot_item = {'coords_features': [], 'affinitys': []}
-    for coor_feature, affine in val_data_iterator:
-        val_rot_item['coords_features'] = np.array(coor_feature, dtype=np.float32)
-        val_rot_item['affinitys'] = np.array(affine, dtype=np.float32)
-        val_writer.write_raw_data([val_rot_item])
-    val_writer.commit()
+    write_mindrecord(os.path.join(val_path, 'validation_dataset.mindrecord'), "pdbbind_val",
+                     grid_batches('validation', 0))
     size_list = [{'dataset': 'train_size', "size": y_train_size},
                  {'dataset': 'val_size', "size": no_batch_size}]
     results = pd.DataFrame(size_list, columns=['dataset', 'size'])
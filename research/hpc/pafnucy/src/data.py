@@ -425,6 +425,9 @@ for t in [1, 2]:
         axis[a1] = -1
         ROTATIONS.append(rotation_matrix(axis, theta))
 
+# The same rotations stacked into a single array, shape (24, 3, 3)
+ROTATION_MATRICES = np.stack(ROTATIONS)
+
 
 def rotate(coords, rotation):
     """Rotate coordinates by a given rotation
@@ -535,3 +538,80 @@ def make_grid(coords, features, grid_resolution=1.0, max_dist=10.0):
         grid[0, x, y, z] += f
 
     return grid
+
+
+def make_grids(coords, features, rotations=None, grid_resolution=1.0, max_dist=10.0, out=None):
+    """Batched version of `rotate` and `make_grid`. Atoms of all the complexes
+    are rotated and scattered into a single channel-first buffer at once.
+
+    Parameters
+    ----------
+    coords, features: lists of array-likes, shapes (N_i, 3) and (N_i, F)
+        Arrays with coordinates and features for each atom of each complex.
+    rotations: array-like of ints, shape (B,), optional
+        Index of the predefined rotation of each complex. Complexes are not
+        rotated if it is not given.
+    grid_resolution: float, optional
+        Resolution of a grid (in Angstroms).
+    max_dist: float, optional
+        Maximum distance between atom and box center.
+    out: np.ndarray, shape = (B, F, M, M, M), optional
+        Preallocated float32 buffer, which is zeroed and filled in place.
+
+    Returns
+    -------
+    grids: np.ndarray, shape = (B, F, M, M, M)
+        5D array with atom properties distributed in 3D space, the features
+        are on the second axis. M is the same as in `make_grid`.
+    """
+
+    if grid_resolution <= 0:
+        raise ValueError('grid_resolution must be positive')
+    if max_dist <= 0:
+        raise ValueError('max_dist must be positive')
+
+    num_complexes = len(coords)
+    num_features = np.shape(features[0])[1]
+    max_dist = float(max_dist)
+    grid_resolution = float(grid_resolution)
+    box_size = ceil(2 * max_dist / grid_resolution + 1)
+
+    grid_shape = (num_complexes, num_features, box_size, box_size, box_size)
+    if out is None:
+        out = np.zeros(grid_shape, dtype=np.float32)
+    elif out.shape != grid_shape or out.dtype != np.float32:
+        raise ValueError('out must be a float32 array of shape %s' % (grid_shape,))
+    else:
+        out.fill(0)
+
+    sizes = [len(c) for c in coords]
+    all_coords = np.concatenate(coords).astype(np.float64)
+    all_features = np.concatenate(features).astype(np.float64)
+    if rotations is not None:
+        atom_rotations = np.repeat(rotations, sizes)
+        for rotation in np.unique(rotations):
+            selected = atom_rotations == rotation
+            all_coords[selected] = np.dot(all_coords[selected], ROTATION_MATRICES[rotation])
+
+    # move all atoms to the nearest grid point
+    grid_coords = ((all_coords + max_dist) / grid_resolution).round().astype(int)
+
+    # remove atoms outside the box
+    in_box = ((grid_coords >= 0) & (grid_coords < box_size)).all(axis=1)
+    complex_ids = np.repeat(np.arange(num_complexes), sizes)[in_box]
+    x, y, z = grid_coords[in_box].T
+    cells = (x * box_size + y) * box_size + z
+    channels = complex_ids[:, None] * num_features + np.arange(num_features)
+    index = channels * box_size ** 3 + cells[:, None]
+    values = all_features[in_box]
+
+    # Most cells hold a single atom: the first atom of each cell is assigned
+    # directly and only the following ones are accumulated with np.add.at,
+    # in the same order as the atoms.
+    first = np.zeros(len(cells), dtype=bool)
+    first[np.unique(complex_ids * box_size ** 3 + cells, return_index=True)[1]] = True
+    flat_out = out.reshape(-1)
+    flat_out[index[first].ravel()] = values[first].ravel()
+    np.add.at(flat_out, index[~first].ravel(), values[~first].ravel())
+
+    return out
@@ -20,59 +20,35 @@ import h5py
 import mindspore.dataset as ds
 import mindspore.dataset.transforms.c_transforms as C
 from mindspore.common import dtype as mstype
-from src.data import Featurizer, make_grid, rotate
-
-
-def get_batch(configs, dataset_name, indices, coords, features, columns, std, affin, rotations=0):
-    train_x_final = {'coords_features': [], 'affinitys': []}
-    for rotation in rotations:
-        for i, idx in enumerate(indices):
-            x = []
-            coords_idx = rotate(coords[dataset_name][idx], rotation)
-            features_idx = features[dataset_name][idx]
-
-            x.append(make_grid(coords_idx, features_idx,
-                               grid_resolution=configs.grid_spacing,
-                               max_dist=configs.max_dist))
-            x = np.vstack(x)
-            x[..., columns['partialcharge']] /= std
-            train_x_final['coords_features'].append(np.transpose(np.squeeze(x), axes=(3, 0, 1, 2)))
-            train_x_final['affinitys'].append(affin[i])
-    return train_x_final
-
-
-def extract_features(configs, dataset_name, idx, coords, features, columns, std, rotation):
-    x = []
-    coords_idx = rotate(coords[dataset_name][idx], rotation)
-    features_idx = features[dataset_name][idx]
-
-    x.append(make_grid(coords_idx, features_idx,
-                       grid_resolution=configs.grid_spacing,
-                       max_dist=configs.max_dist))
-    x = np.vstack(x)
-    x[..., columns['partialcharge']] /= std
-    x = np.transpose(np.squeeze(x), axes=(3, 0, 1, 2))
-    return x
-
-
-def get_batchs(configs, dataset_name, indices, coords, features, columns, std, affin, rotations=0):
-    train_x_final = {'coords_features': [], 'affinitys': []}
-    if isinstance(rotations, int):
-        for i, idx in enumerate(indices):
-            x = extract_features(configs, dataset_name, idx, coords, features, columns, std, rotations)
-            train_x_final['coords_features'].append(x)
-            train_x_final['affinitys'].append(affin[i])
-    else:
-        for rotation in rotations:
-            for i, idx in enumerate(indices):
-                x = extract_features(configs, dataset_name, idx, coords, features, columns, std, rotation)
-                train_x_final['coords_features'].append(x)
-                train_x_final['affinitys'].append(affin[i])
-    return train_x_final
+from src.data import Featurizer, make_grids
+
 
+def iter_grid_batches(configs, coords, features, affin, charge_column, std, rotations=0, batch_size=64):
+    """Voxelize the complexes under each rotation, batch_size grids at a time.
 
-def preprocess_dataset(configs, paths, batch_rotation, batch_no_rotation, v_batch_rotation):
-    """dataset preprocess"""
+    The grids are yielded in the order of rotations, then complexes, and share a preallocated
+    buffer of shape [batch_size, F, M, M, M], so each batch must be consumed before the next one.
+    """
+    if isinstance(rotations, int):
+        rotations = [rotations]
+    num_complexes = len(coords)
+    entries = [(rotation, i) for rotation in rotations for i in range(num_complexes)]
+    box_size = int(np.ceil(2 * configs.max_dist / configs.grid_spacing + 1))
+    num_features = np.shape(features[0])[1]
+    buffer = np.zeros((batch_size, num_features, box_size, box_size, box_size), dtype=np.float32)
+    for start in range(0, len(entries), batch_size):
+        batch_entries = entries[start:start + batch_size]
+        batch_rotations = [rotation for rotation, _ in batch_entries]
+        batch_ids = [i for _, i in batch_entries]
+        grids = make_grids([coords[i] for i in batch_ids], [features[i] for i in batch_ids], batch_rotations,
+                           grid_resolution=configs.grid_spacing, max_dist=configs.max_dist,
+                           out=buffer[:len(batch_entries)])
+        grids[:, charge_column] /= std
+        yield grids, affin[batch_ids]
+
+
+def preprocess_dataset(paths):
+    """Load the complexes of each dataset stage and the scaling factor of the partial charges."""
     datasets_stage = ['validation', 'training', 'test']
     ids = {}
     affinity = {}
@@ -113,27 +89,8 @@ def preprocess_dataset(configs, paths, batch_rotation, batch_no_rotation, v_batc
     t_baseline = ((affinity['training'] - affinity['training'].mean()) ** 2.0).mean()
     v_baseline = ((affinity['validation'] - affinity['training'].mean()) ** 2.0).mean()
     print('baseline mse: training=%s, validation=%s' % (t_baseline, v_baseline))
-    ds_sizes = {dataset: len(affinity[dataset]) for dataset in datasets_stage}
-
-    # val set
-    val_y = affinity['validation']
-    no_batch_size = ds_sizes['validation']
-    ds_sizes_range = list(range(no_batch_size))
-    val_coords_features = get_batchs(configs, 'validation', ds_sizes_range,
-                                     coords, features, columns, charges_std, val_y, v_batch_rotation)
-
-    # train set with rotation
-    train_y = affinity['training']
-    y_train_size = ds_sizes['training']
-    train_sizes_range = list(range(y_train_size))
-    train_coords_features = get_batchs(configs, 'training', train_sizes_range, coords,
-                                       features, columns, charges_std, train_y, batch_rotation)
-    # train set without rotation
-    train_no_rotationcoords_features = get_batchs(configs, 'training', train_sizes_range, coords,
-                                                  features, columns, charges_std, train_y, batch_no_rotation)
-
-    return train_coords_features, y_train_size, train_no_rotationcoords_features, val_coords_features, no_batch_size
 
+    return coords, features, affinity, columns['partialcharge'], charges_std
 
 
 class DatasetIter:
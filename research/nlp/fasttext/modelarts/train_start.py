@@ -195,7 +195,8 @@ def train_single(input_file_path):
     preprocessed_data = load_dataset(dataset_path=input_file_path,
                                      batch_size=config.batch_size,
                                      epoch_count=config.epoch_count,
-                                     bucket=config.buckets)
+                                     bucket=config.buckets,
+                                     token_budget=config.token_budget)
     _build_training_pipeline(preprocessed_data)
 
 
@@ -224,7 +225,8 @@ def train_paralle(input_file_path):
                                      rank_size=MultiDevice.get_group_size(),
                                      rank_id=MultiDevice.get_rank(),
                                      bucket=config.buckets,
-                                     shuffle=False)
+                                     shuffle=False,
+                                     token_budget=config.token_budget)
     _build_training_pipeline(preprocessed_data, True)
 
 
@@ -0,0 +1,141 @@
+# Copyright 2022 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""Length bucketed batcher with token budget, cross bucket shuffle and background prefetch"""
+import queue
+import threading
+import numpy as np
+
+
+class BucketBatcher:
+    """
+    Group the samples into batches of similar length.
+
+    Each sample goes to the smallest bucket boundary not shorter than it, the samples longer than the last
+    boundary go to the last bucket and are truncated. A batch of a bucket holds at most
+    token_budget // boundary samples (and at most batch_size), so the padded tokens of the batches are about
+    the same for all the buckets. In every epoch the samples are shuffled in their buckets and then the
+    batches of all the buckets are shuffled together.
+
+    Args:
+        lengths (numpy.ndarray): Token length of each sample.
+        boundaries (list): Ascending bucket lengths, every batch is padded to one of them.
+        batch_size (int): Maximum number of samples in a batch.
+        token_budget (int): Maximum padded tokens in a batch, 0 means batch_size samples for all the buckets.
+            Default: 0.
+        shuffle (bool): Whether to shuffle the samples and the batches in every epoch. Default: True.
+        drop_remainder (bool): Whether to drop the last incomplete batch of every bucket. Default: False.
+        num_shards (int): Number of shards, the batches are distributed to the shards in turn and every shard
+            gets the same number of batches. Default: 1.
+        shard_id (int): Shard of this process. Default: 0.
+        seed (int): Random seed of the shuffle, which must be the same for all the shards. Default: 1.
+    """
+    def __init__(self, lengths, boundaries, batch_size, token_budget=0, shuffle=True, drop_remainder=False,
+                 num_shards=1, shard_id=0, seed=1):
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.boundaries = np.asarray(sorted(boundaries), dtype=np.int64)
+        self.bucket_ids = np.minimum(np.searchsorted(self.boundaries, self.lengths), len(self.boundaries) - 1)
+        self.bucket_batch_size = np.full(len(self.boundaries), batch_size, dtype=np.int64)
+        if token_budget > 0:
+            self.bucket_batch_size = np.clip(token_budget // self.boundaries, 1, batch_size)
+        self.shuffle = shuffle
+        self.drop_remainder = drop_remainder
+        self.num_shards = num_shards
+        self.shard_id = shard_id
+        self.seed = seed
+        self.epoch = 0
+
+    def batches(self, epoch=0):
+        """Return the (sample indices, bucket length) of the batches of this shard in the epoch."""
+        rng = np.random.RandomState(self.seed + epoch)
+        batches = []
+        for bucket, boundary in enumerate(self.boundaries):
+            indices = np.flatnonzero(self.bucket_ids == bucket)
+            if self.shuffle:
+                indices = rng.permutation(indices)
+            size = self.bucket_batch_size[bucket]
+            end = len(indices) - len(indices) % size if self.drop_remainder else len(indices)
+            batches.extend((indices[i:i + size], int(boundary)) for i in range(0, end, size))
+        if self.shuffle:
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+        num_batches = len(batches) // self.num_shards
+        return batches[self.shard_id:num_batches * self.num_shards:self.num_shards]
+
+    def __len__(self):
+        return len(self.batches())
+
+    def __iter__(self):
+        batches = self.batches(self.epoch)
+        self.epoch += 1
+        return iter(batches)
+
+    def padding_efficiency(self):
+        """Real tokens / padded tokens of the batches of this shard in an epoch."""
+        real, padded = 0, 0
+        for indices, boundary in self.batches():
+            real += int(np.sum(np.minimum(self.lengths[indices], boundary)))
+            padded += len(indices) * int(boundary)
+        return real / max(padded, 1)
+
+
+class PrefetchIterator:
+    """
+    Iterate the collated batches of a BucketBatcher, the batches are collated in a background thread.
+
+    Args:
+        batcher (BucketBatcher): The batcher.
+        collate_fn (function): Make the columns of a batch from (sample indices, bucket length).
+        prefetch_size (int): Number of collated batches buffered by the thread. Default: 8.
+    """
+    def __init__(self, batcher, collate_fn, prefetch_size=8):
+        self.batcher = batcher
+        self.collate_fn = collate_fn
+        self.prefetch_size = prefetch_size
+
+    def __len__(self):
+        return len(self.batcher)
+
+    def __iter__(self):
+        buffer = queue.Queue(self.prefetch_size)
+        stop = threading.Event()
+        end = object()
+
+        def produce():
+            try:
+                for indices, boundary in self.batcher:
+                    if stop.is_set():
+                        return
+                    buffer.put(self.collate_fn(indices, boundary))
+                buffer.put(end)
+            except Exception as e:  # pylint: disable=broad-except
+                buffer.put(e)
+
+        thread = threading.Thread(target=produce, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = buffer.get()
+                if item is end:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            # Unblock the producer if the consumer stops early
+            while thread.is_alive():
+                try:
+                    buffer.get_nowait()
+                except queue.Empty:
+                    thread.join(0.01)
@@ -13,7 +13,9 @@
 # limitations under the License.
 # ============================================================================
 """FastText data loader"""
+import numpy as np
 import mindspore.dataset as ds
+from src.bucket_batcher import BucketBatcher, PrefetchIterator
 
 
 def load_dataset(dataset_path,
@@ -22,8 +24,12 @@ def load_dataset(dataset_path,
                  rank_size=1,
                  rank_id=0,
                  bucket=None,
-                 shuffle=True):
+                 shuffle=True,
+                 token_budget=0):
     """dataset loader"""
+    if token_budget > 0:
+        return load_bucketed_dataset(dataset_path, batch_size, token_budget, epoch_count, rank_size, rank_id,
+                                     bucket)
 
     def batch_per_bucket(bucket_length, input_file):
         input_file = input_file + '/train_dataset_bs_' + str(bucket_length) + '.mindrecord'
@@ -57,3 +63,56 @@ def load_dataset(dataset_path,
     data_set.channel_name = 'fasttext'
 
     return data_set
+
+
+class _TokenColumns:
+    """The samples of all the bucket files, the tokens are stored without padding."""
+    def __init__(self, dataset_path, bucket):
+        tokens, lengths, labels = [], [], []
+        for bucket_length in bucket:
+            input_file = dataset_path + '/train_dataset_bs_' + str(bucket_length) + '.mindrecord'
+            data_set = ds.MindDataset(input_file, columns_list=['src_tokens', 'label_idx'], shuffle=False)
+            for item in data_set.create_dict_iterator(output_numpy=True, num_epochs=1):
+                # Token ids start from 1, 0 is the padding
+                sample = item['src_tokens'][item['src_tokens'] != 0]
+                tokens.append(sample)
+                lengths.append(len(sample))
+                labels.append(item['label_idx'])
+        self.lengths = np.array(lengths, dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(self.lengths)])
+        self.tokens = np.concatenate(tokens).astype(np.int32) if tokens else np.zeros(0, np.int32)
+        self.labels = np.array(labels, dtype=np.int32).reshape(-1, 1)
+
+    def collate(self, indices, bucket_length):
+        """Pad the samples to bucket_length, which is also the length column as in the bucket files."""
+        src_tokens = np.zeros((len(indices), bucket_length), dtype=np.int32)
+        for row, index in enumerate(indices):
+            sample = self.tokens[self.offsets[index]:self.offsets[index + 1]][:bucket_length]
+            src_tokens[row, :len(sample)] = sample
+        src_tokens_length = np.full((len(indices), 1), bucket_length, dtype=np.int32)
+        return src_tokens, src_tokens_length, self.labels[indices]
+
+
+def load_bucketed_dataset(dataset_path,
+                          batch_size,
+                          token_budget,
+                          epoch_count=1,
+                          rank_size=1,
+                          rank_id=0,
+                          bucket=None):
+    """
+    Dataset loader which batches the samples of all the buckets with BucketBatcher. A batch of a bucket holds at
+    most token_budget // bucket_length samples, the batches of all the buckets are shuffled together in every
+    epoch, and they are padded in a background thread.
+    """
+    columns = _TokenColumns(dataset_path, bucket)
+    batcher = BucketBatcher(columns.lengths, bucket, batch_size, token_budget=token_budget,
+                            num_shards=rank_size, shard_id=rank_id)
+    print(f"Dataset size: {len(columns.lengths)}, batches: {len(batcher)}, "
+          f"padding efficiency: {batcher.padding_efficiency():.4f}")
+    data_set = ds.GeneratorDataset(PrefetchIterator(batcher, columns.collate),
+                                   column_names=['src_token_text', 'src_tokens_text_length', 'label_idx_tag'],
+                                   shuffle=False)
+    data_set = data_set.repeat(epoch_count)
+    data_set.channel_name = 'fasttext'
+    return data_set
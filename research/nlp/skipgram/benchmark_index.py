@@ -0,0 +1,77 @@
+# Copyright 2022 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""
+recall and latency of the approximate embedding index against exact search:
+python benchmark_index.py [--emb_path=W2V_EMB_PATH]
+"""
+
+import argparse
+import time
+import numpy as np
+
+from src.embedding_index import EmbeddingIndex
+
+parser = argparse.ArgumentParser(description='Benchmark the embedding index')
+parser.add_argument('--emb_path', type=str, default=None,
+                    help='w2v_emb.npy saved by train.py, random clustered embeddings are used if not set.')
+parser.add_argument('--vocab_size', type=int, default=200000, help='vocabulary size of random embeddings.')
+parser.add_argument('--emb_size', type=int, default=288, help='embedding size of random embeddings.')
+parser.add_argument('--num_queries', type=int, default=2000, help='number of queries.')
+parser.add_argument('--k', type=int, default=10, help='number of neighbours.')
+parser.add_argument('--nlist', type=int, default=1024, help='number of IVF cells.')
+parser.add_argument('--pq_m', type=int, default=36, help='number of product quantization sub-vectors.')
+parser.add_argument('--nprobes', type=str, default='1,4,16,64', help='comma separated nprobe values.')
+args = parser.parse_args()
+
+
+def random_embeddings(vocab_size, emb_size, seed=0):
+    """Embeddings scattered around random topics, which is closer to real word vectors than uniform noise."""
+    rng = np.random.RandomState(seed)
+    topics = rng.randn(vocab_size // 100 + 1, emb_size).astype(np.float32)
+    emb = topics[rng.randint(0, len(topics), vocab_size)]
+    return emb + 0.5 * rng.randn(vocab_size, emb_size).astype(np.float32)
+
+
+def timed_search(index, queries, k):
+    start = time.time()
+    _, ids = index.search(queries, k)
+    return ids, (time.time() - start) * 1000 / len(queries)
+
+
+if __name__ == '__main__':
+    if args.emb_path is not None:
+        w2v_emb = np.load(args.emb_path, allow_pickle=True).item()  # dict()
+        emb_matrix = np.array(list(w2v_emb.values()), dtype=np.float32)
+    else:
+        emb_matrix = random_embeddings(args.vocab_size, args.emb_size)
+    rng = np.random.RandomState(1)
+    queries = emb_matrix[rng.randint(0, len(emb_matrix), args.num_queries)]
+    queries = queries + 0.3 * rng.randn(*queries.shape).astype(np.float32)
+
+    exact = EmbeddingIndex(emb_matrix)
+    truth, latency = timed_search(exact, queries, args.k)
+    print('%-10s nprobe: %-5s recall@%d: %.4f  latency: %.3f ms/query' % ('exact', '-', args.k, 1.0, latency))
+
+    for pq_m in (0, args.pq_m):
+        name = 'ivf_pq%d' % pq_m if pq_m else 'ivf_flat'
+        start = time.time()
+        index = EmbeddingIndex(emb_matrix, nlist=args.nlist, pq_m=pq_m)
+        print('%-10s build: %.1f s' % (name, time.time() - start))
+        for nprobe in [int(n) for n in args.nprobes.split(',')]:
+            index.nprobe = nprobe
+            ids, latency = timed_search(index, queries, args.k)
+            recall = np.mean([len(np.intersect1d(a, b)) for a, b in zip(ids, truth)]) / args.k
+            print('%-10s nprobe: %-5d recall@%d: %.4f  latency: %.3f ms/query' % (name, nprobe, args.k, recall,
+                                                                                  latency))
@@ -26,6 +26,7 @@ from mindspore.train.serialization import load_param_into_net, load_checkpoint
 from src.dataset import load_eval_data
 from src.config import w2v_cfg
 from src.utils import cal_top_k_similar, get_w2v_emb
+from src.embedding_index import EmbeddingIndex
 from src.skipgram import SkipGram
 
 parser = argparse.ArgumentParser(description='Evaluate SkipGram')
@@ -62,7 +63,9 @@ if __name__ == '__main__':
             target_embs.append((vecs[1] + vecs[2] - vecs[0]) / 3)  # average
             labels.append(sample[3])
             ignores.append([sample[0], sample[1], sample[2]])
-    top_k_similar = cal_top_k_similar(np.array(target_embs), emb_matrix, k=5)
+    index = EmbeddingIndex(emb_matrix, nlist=w2v_cfg.index_nlist, nprobe=w2v_cfg.index_nprobe,
+                           pq_m=w2v_cfg.index_pq_m)
+    top_k_similar = cal_top_k_similar(np.array(target_embs), emb_matrix, k=5, index=index)
 
     correct_cnt = 0
     for i, candidate_index in enumerate(top_k_similar):
@@ -41,7 +41,8 @@ if __name__ == '__main__':
     if args.train_data_dir:
         train_data_dir = args.train_data_dir
     data_controller = DataController(train_data_dir, w2v_cfg.ms_dir, w2v_cfg.min_count, w2v_cfg.window_size,
-                                     w2v_cfg.neg_sample_num, w2v_cfg.data_epoch, w2v_cfg.batch_size)
+                                     w2v_cfg.neg_sample_num, w2v_cfg.data_epoch, w2v_cfg.batch_size,
+                                     samples_per_file=w2v_cfg.samples_per_file)
 
     np.save(os.path.join(w2v_cfg.w2v_emb_save_dir, 'word2id.npy'), data_controller.word2id)
     np.save(os.path.join(w2v_cfg.w2v_emb_save_dir, 'id2word.npy'), data_controller.id2word)
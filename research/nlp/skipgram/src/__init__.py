@@ -18,6 +18,8 @@ encapsulation operations
 
 from .utils import cal_top_k_similar
 
+from .embedding_index import EmbeddingIndex
+
 from .dataset import preprocess_data, load_eval_data, DataController
 
 from .lr_scheduler import poly_decay_lr, exp_decay_lr
@@ -38,6 +38,10 @@ class ConfigSkipgram:
     min_count = 5                      # keep vocabulary that have appeared at least 'min_count' times
     window_size = 5                    # window size of center word
     neg_sample_num = 5                 # number of negative words in negative sampling
+    samples_per_file = int(1e7)        # number of samples shuffled and saved in each mindrecord file
+    index_nlist = 0                    # number of IVF cells of the embedding index in eval, 0 for exact search
+    index_nprobe = 16                  # number of IVF cells searched for each query
+    index_pq_m = 0                     # number of product quantization codes of each vector, 0 for no quantization
     save_checkpoint_steps = int(5e5)   # step interval between two checkpoints
     keep_checkpoint_max = 15                                    # maximal number of checkpoint files
     temp_dir = os.path.join(par_dir, 'temp/')                   # save files generated during code execution
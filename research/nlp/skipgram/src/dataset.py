@@ -16,10 +16,7 @@
 Produce the dataset
 """
 
-import collections
-import math
 import os
-import random
 import re
 
 import numpy as np
@@ -28,24 +25,51 @@ import mindspore.dataset as ds
 from mindspore.mindrecord import FileWriter
 
 
-def get_corpus(data_dir):
-    """Get list of words in the text.
+_NON_WORD = re.compile("[^a-z^A-Z]")  # English words.
+
+
+def iter_corpus_words(data_dir, chunk_size=1 << 26):
+    """Read the text files in data_dir chunk by chunk, so a huge file is never held in memory at once.
 
     Args:
         data_dir: data directory.
-    Returns:
+        chunk_size: number of characters read at a time.
+    Yields:
         list of str words.
     """
-    corpus = []
     files = os.listdir(data_dir)
     for filename in files:
         data_path = os.path.join(data_dir, filename)
         if not os.path.isfile(data_path):
             continue
         with open(data_path, 'r') as f:
-            text = f.read().strip('\n')
-        corpus.extend(del_useless_char(text))
-    return corpus
+            tail = ''
+            while True:
+                text = f.read(chunk_size)
+                if not text:
+                    break
+                words = del_useless_char(tail + text)
+                # The last word may continue in the next chunk.
+                tail = words.pop() if words and _NON_WORD.match(text[-1]) is None else ''
+                yield words
+            if tail:
+                yield [tail]
+
+
+def get_corpus(data_dir):
+    """Get the words in the text, encoded by the order of their first occurrence.
+
+    Args:
+        data_dir: data directory.
+    Returns:
+        numpy.ndarray of word codes, list of str words indexed by code.
+    """
+    word2code = dict()
+    corpus = [np.zeros(0, dtype=np.int32)]
+    for words in iter_corpus_words(data_dir):
+        codes = [word2code.setdefault(w, len(word2code)) for w in words]
+        corpus.append(np.array(codes, dtype=np.int32))
+    return np.concatenate(corpus), list(word2code)
 
 
 def del_useless_char(corpus):
@@ -57,27 +81,26 @@ def del_useless_char(corpus):
         list of str words.
     """
     corpus = corpus.strip().lower()
-    rule = re.compile("[^a-z^A-Z]")  # English words.
-    corpus = rule.sub(' ', corpus)
+    corpus = _NON_WORD.sub(' ', corpus)
     corpus = corpus.split()
     return corpus
 
 
-def get_count_freq(corpus):
-    """Construct dictionaries about words and count.
+def get_count_freq(corpus, words):
+    """Count the words.
 
     Args:
-        corpus: list of str words.
+        corpus: numpy.ndarray of word codes.
+        words: list of str words indexed by code.
     Returns:
-        list of (word, count) pairs, dictionary that maps word to its frequency.
+        list of (word, count) pairs, numpy.ndarray of the frequency of each word code.
     """
-    word_count = collections.Counter(corpus)
-    word_count = sorted(word_count.items(), key=lambda x: x[1], reverse=True)
-    word_sum = sum([item[1] for item in word_count])
-    word2freq = dict()
-    for w, c in word_count:
-        word2freq[w] = c / word_sum
-    return word_count, word2freq
+    counts = np.bincount(corpus, minlength=len(words))
+    # Stable sort keeps the words with the same count in the order of their first occurrence.
+    order = np.argsort(-counts, kind='stable')
+    word_count = [(words[c], int(counts[c])) for c in order]
+    word_freq = counts / max(len(corpus), 1)
+    return word_count, word_freq
 
 
 def build_dict(word_count, min_count):
@@ -101,70 +124,90 @@ def build_dict(word_count, min_count):
     return word2id, id2word
 
 
-def convert_words_to_id(corpus, word2id):
-    """Convert list of words to list of corresponding id.
+def convert_words_to_id(corpus, words, word2id):
+    """Convert word codes to the corresponding ids.
 
     Args:
-        corpus: a list of str words.
+        corpus: numpy.ndarray of word codes.
+        words: list of str words indexed by code.
         word2id: a dictionary that maps word to id.
     Returns:
-        converted corpus, i.e., list of word ids.
+        converted corpus, i.e., numpy.ndarray of word ids.
     """
-    new_corpus = [-1] * len(corpus)
-    for i, word in enumerate(corpus):
-        if word in word2id:
-            new_corpus[i] = word2id[word]
-    return new_corpus
+    code2id = np.array([word2id.get(w, -1) for w in words], dtype=np.int32)
+    return code2id[corpus]
 
 
-def get_sample_table(word_count, word2id, table_size):
-    """Get a list about the probability of each word being sampled.
+class AliasSampler:
+    """Draw samples from a discrete distribution in O(1) time per sample by Walker's alias method.
+
+    Args:
+        weights: numpy.ndarray, unnormalized probability of each outcome.
+    """
+    def __init__(self, weights):
+        num = len(weights)
+        prob = np.asarray(weights, dtype=np.float64) * num / np.sum(weights)
+        alias = np.arange(num, dtype=np.int32)
+        small = np.flatnonzero(prob < 1).tolist()
+        large = np.flatnonzero(prob >= 1).tolist()
+        while small and large:
+            s, l = small.pop(), large.pop()
+            alias[s] = l
+            prob[l] -= 1 - prob[s]
+            if prob[l] < 1:
+                small.append(l)
+            else:
+                large.append(l)
+        # Whatever is left is 1 up to rounding errors.
+        prob[small + large] = 1
+        self.prob = prob
+        self.alias = alias
+
+    def sample(self, size):
+        """Draw samples of the given shape."""
+        idx = np.random.randint(0, len(self.prob), size)
+        accept = np.random.random_sample(size) < self.prob[idx]
+        return np.where(accept, idx, self.alias[idx]).astype(np.int32)
+
+
+def get_neg_sampler(word_count, word2id):
+    """Get the sampler of negative words, whose probability is proportional to count^0.75.
 
     Args:
         word_count: a list of (word, count) tuples.
         word2id: a dictionary that maps word to id.
-        table_size: sample table size
     Returns:
-        sample table
+        AliasSampler over word ids.
     """
-    count = [ele[1] for ele in word_count]
-    pow_freq = np.array(count)**0.75
-    ratios = pow_freq/sum(pow_freq)
-    sample_count = np.round(ratios * table_size)
-    sample_table = []
-    for i, ele in enumerate(word_count):
-        w = ele[0]
+    pow_freq = np.zeros(len(word2id))
+    for w, c in word_count:
         if w in word2id:
-            wid = word2id[w]
-            sample_table += [wid] * int(sample_count[i])
-    return sample_table
+            pow_freq[word2id[w]] = c**0.75
+    return AliasSampler(pow_freq)
 
 
-def subsampling(corpus, word2freq):
+def subsampling(corpus, word_freq, t=1e-3):
     """Randomly delete words with high frequency to reduce redundant information.
     Args:
-        corpus: a list of word ids.
-        word2freq: a dictionary that maps word id to word frequency.
+        corpus: numpy.ndarray of word codes.
+        word_freq: numpy.ndarray of the frequency of each word code.
+        t: threshold of the frequency above which words are deleted.
     Returns:
-        a list of words.
+        numpy.ndarray of word codes.
     """
-    def reserve(w, t=1e-3):
-        freq = word2freq[w]
-        p = (math.sqrt(freq / t) + 1) * t / freq
-        return random.uniform(0, 1) < p
-    new_corpus = [word for word in corpus if reserve(word)]
-    return new_corpus
+    reserve_prob = (np.sqrt(word_freq / t) + 1) * t / word_freq
+    return corpus[np.random.random_sample(len(corpus)) < reserve_prob[corpus]]
 
 
 def preprocess_data(data_dir, min_count):
     """encapsulated preprocess works"""
-    corpus = get_corpus(data_dir)  # list of str words
-    word_count, word2freq = get_count_freq(corpus)  # list of (str, int) pairs
-    corpus = subsampling(corpus, word2freq)   # remove some most frequent word, such as 'a', 'the'
+    corpus, words = get_corpus(data_dir)  # word codes
+    word_count, word_freq = get_count_freq(corpus, words)  # list of (str, int) pairs
+    corpus = subsampling(corpus, word_freq)   # remove some most frequent word, such as 'a', 'the'
     word2id, id2word = build_dict(word_count, min_count)  # dictionary doesn't contain seldom used words
-    sample_table = get_sample_table(word_count, word2id, int(1e8))
-    corpus = convert_words_to_id(corpus, word2id)   # set ID of deleted word as -1
-    return corpus, word_count, word2id, id2word, sample_table
+    neg_sampler = get_neg_sampler(word_count, word2id)
+    corpus = convert_words_to_id(corpus, words, word2id)   # set ID of deleted word as -1
+    return corpus, word_count, word2id, id2word, neg_sampler
 
 
 def load_eval_data(data_dir):
@@ -193,9 +236,10 @@ class DataController:
     """encapsulated data operations
     """
     def __init__(self, train_data_dir, ms_dir, min_count, window_size,
-                 neg_sample_num, epoch_num, batch_size, rank_size=1, rank_id=0):
+                 neg_sample_num, epoch_num, batch_size, rank_size=1, rank_id=0,
+                 samples_per_file=int(1e7), chunk_size=int(1e6)):
         super(DataController, self).__init__()
-        self.corpus, self.word_count, self.word2id, self.id2word, self.sample_table = \
+        self.corpus, self.word_count, self.word2id, self.id2word, self.neg_sampler = \
             preprocess_data(train_data_dir, min_count)
 
         self.ms_dir = ms_dir
@@ -204,73 +248,95 @@ class DataController:
         self.neg_sample_num = neg_sample_num
         self.epoch_num = epoch_num
         self.batch_size = batch_size
+        self.samples_per_file = samples_per_file
+        self.chunk_size = chunk_size
 
         self.rank_size = rank_size
         self.rank_id = rank_id
 
-        self.samples, self.dataset = [], []
         self.cnt, self.sample_id = 0, 0
 
     def prepare_mindrecord(self):
         """
-        prepare mindrecord
+        prepare mindrecord, the corpus is processed in chunks of center words and the samples are
+        written into a new mindrecord file whenever samples_per_file of them are buffered.
         :return: None
         """
+        buffers, buffered = [], 0
         for _ in range(self.epoch_num):
-            for i in range(len(self.corpus)):
-                center_word = self.corpus[i]
-                if center_word == -1:
-                    continue
-                cur_window_size = random.randint(1, self.window_size)
-                pos_range = (max(0, i - cur_window_size), min(len(self.corpus) - 1, i + cur_window_size))
-                pos_words = [self.corpus[j] for j in range(pos_range[0], pos_range[1]+1) if j != i]
-                for pos_word in pos_words:
-                    if pos_word == -1:
-                        continue
-                    neg_words = self.get_neg_words(center_word, pos_word)
-                    self.samples.append([center_word, pos_word, neg_words])
-
-                if len(self.samples) >= int(1e6) * self.batch_size:  # save as mindrecord
-                    filename = self.samples_to_dataset_aux()
-                    self.convert_to_mindrecord(os.path.join(self.ms_dir, filename), self.dataset)
-                    self.cnt += 1
-                    self.dataset, self.samples = [], []
-
-        if self.samples:  # save as mindrecord
-            filename = self.samples_to_dataset_aux()
-            self.convert_to_mindrecord(os.path.join(self.ms_dir, filename), self.dataset)
-            self.dataset, self.samples = [], []
-
-    def get_neg_words(self, center_word, pos_word):
-        """Get list of negative word ids.
+            for start in range(0, len(self.corpus), self.chunk_size):
+                c_words, p_words = self.get_pairs(start, min(start + self.chunk_size, len(self.corpus)))
+                n_words = self.get_neg_words(c_words, p_words)
+                buffers.append((c_words, p_words, n_words))
+                buffered += len(c_words)
+                if buffered >= self.samples_per_file:  # save as mindrecord
+                    samples = [np.concatenate(column) for column in zip(*buffers)]
+                    samples = self.samples_to_mindrecord(*samples)
+                    buffers, buffered = [samples], len(samples[0])
+
+        if buffered >= self.batch_size:  # save as mindrecord
+            samples = [np.concatenate(column) for column in zip(*buffers)]
+            self.samples_to_mindrecord(*samples)
+
+    def get_pairs(self, start, end):
+        """Get the (center word, positive word) pairs whose center word is in corpus[start:end].
         Args:
-            center_word: center word.
-            pos_word: positive word.
+            start: start index of the center words.
+            end: end index of the center words.
+        Returns:
+            numpy.ndarray of center words, numpy.ndarray of positive words.
         """
-        neg_words = random.sample(self.sample_table, self.neg_sample_num)
-        while center_word in neg_words or pos_word in neg_words or -1 in neg_words:
-            neg_words = random.sample(self.sample_table, self.neg_sample_num)
-        return np.array(neg_words)
-
-    def samples_to_dataset_aux(self):
+        center = np.arange(start, end)
+        cur_window_size = np.random.randint(1, self.window_size + 1, end - start)
+        c_words, p_words = [], []
+        for offset in range(-self.window_size, self.window_size + 1):
+            if offset == 0:
+                continue
+            context = center + offset
+            in_window = (abs(offset) <= cur_window_size) & (context >= 0) & (context < len(self.corpus))
+            center_word = self.corpus[center[in_window]]
+            pos_word = self.corpus[context[in_window]]
+            valid = (center_word != -1) & (pos_word != -1)
+            c_words.append(center_word[valid])
+            p_words.append(pos_word[valid])
+        return np.concatenate(c_words), np.concatenate(p_words)
+
+    def get_neg_words(self, center_words, pos_words):
+        """Get negative word ids, the negative words of a pair are redrawn until none of them is
+        the center word or the positive word.
+        Args:
+            center_words: numpy.ndarray of center words.
+            pos_words: numpy.ndarray of positive words.
+        Returns:
+            numpy.ndarray of negative words with shape (len(center_words), neg_sample_num).
         """
-        an auxiliary function, which helps convert samples to mindrecord dataset.
+        neg_words = self.neg_sampler.sample((len(center_words), self.neg_sample_num))
+        redraw = np.arange(len(center_words))
+        while redraw.size:
+            neg = neg_words[redraw]
+            collide = (neg == center_words[redraw, None]) | (neg == pos_words[redraw, None])
+            redraw = redraw[np.any(collide, axis=1)]
+            neg_words[redraw] = self.neg_sampler.sample((redraw.size, self.neg_sample_num))
+        return neg_words
+
+    def samples_to_mindrecord(self, c_words, p_words, n_words):
         """
-        random.shuffle(self.samples)
-        for start in range(0, len(self.samples) - self.batch_size, self.batch_size):
-            c_words = [self.samples[start + step][0] for step in range(self.batch_size)]
-            p_words = [self.samples[start + step][1] for step in range(self.batch_size)]
-            n_words = [self.samples[start + step][2] for step in range(self.batch_size)]
-            data_json = {"id": self.sample_id,
-                         "c_words": np.array(c_words, dtype=np.int32),
-                         "p_words": np.array(p_words, dtype=np.int32),
-                         "n_words": np.array(n_words, dtype=np.int32)}
-            self.dataset.append(data_json)
-            self.sample_id += 1
+        Shuffle the samples and write the full batches into a new mindrecord file.
+        Returns:
+            the samples which do not fill a batch.
+        """
+        perm = np.random.permutation(len(c_words))
+        num_batches = len(perm) // self.batch_size
+        batches = perm[:num_batches * self.batch_size].reshape(num_batches, self.batch_size)
         filename = 'text' + str(self.cnt) + '.mindrecord'
-        return filename
-
-    def convert_to_mindrecord(self, ms_data_path, data, shard_num=1):
+        self.convert_to_mindrecord(os.path.join(self.ms_dir, filename), c_words, p_words, n_words, batches)
+        self.cnt += 1
+        rest = perm[num_batches * self.batch_size:]
+        return c_words[rest], p_words[rest], n_words[rest]
+
+    def convert_to_mindrecord(self, ms_data_path, c_words, p_words, n_words, batches, shard_num=1,
+                              rows_per_write=1000):
+        """Write the batches into mindrecord, rows_per_write of them at a time."""
         schema_json = {"id": {"type": "int64"},
                        "c_words": {"type": "int32", "shape": [-1]},
                        "p_words": {"type": "int32", "shape": [-1]},
@@ -278,7 +344,15 @@ class DataController:
         writer = FileWriter(ms_data_path, shard_num)
         writer.add_schema(schema_json, "w2v_schema")
         writer.add_index(["id"])  # select index fields from schema to accelerate reading.
-        writer.write_raw_data(data)
+        for start in range(0, len(batches), rows_per_write):
+            data = []
+            for batch in batches[start:start + rows_per_write]:
+                data.append({"id": self.sample_id,
+                             "c_words": c_words[batch].astype(np.int32),
+                             "p_words": p_words[batch].astype(np.int32),
+                             "n_words": n_words[batch].astype(np.int32)})
+                self.sample_id += 1
+            writer.write_raw_data(data)
         writer.commit()
 
     def get_mindrecord_dataset(self, col_list, repeat_count=1):
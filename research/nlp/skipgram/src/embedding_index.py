@@ -0,0 +1,227 @@
+# Copyright 2022 Huawei Technologies Co., Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ============================================================================
+"""
+Nearest neighbour index of word embeddings (used in eval.py)
+"""
+
+import numpy as np
+
+
+def kmeans(data, num_clusters, niter=20, max_points_per_cluster=256, seed=1):
+    """Lloyd's k-means with L2 distance, trained on at most max_points_per_cluster * num_clusters rows.
+
+    Args:
+        data: numpy.ndarray, [num, dim].
+        num_clusters: number of clusters.
+        niter: number of iterations.
+        max_points_per_cluster: the training rows are sampled from data if there are more.
+        seed: random seed of the sampling and the initial centroids.
+    Returns:
+        centroids with shape [num_clusters, dim], cluster of each row of data.
+    """
+    rng = np.random.RandomState(seed)
+    train = data
+    if len(data) > max_points_per_cluster * num_clusters:
+        train = data[rng.choice(len(data), max_points_per_cluster * num_clusters, replace=False)]
+    centroids = train[rng.choice(len(train), num_clusters, replace=False)].copy()
+    for _ in range(niter):
+        assign = assign_clusters(train, centroids)
+        order = np.argsort(assign, kind='stable')
+        counts = np.bincount(assign, minlength=num_clusters)
+        nonempty = counts > 0
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums = np.add.reduceat(train[order].astype(np.float64), starts[nonempty], axis=0)
+        centroids[nonempty] = sums / counts[nonempty, None]
+        # Restart the empty clusters from random points.
+        empty = np.flatnonzero(~nonempty)
+        centroids[empty] = train[rng.choice(len(train), len(empty), replace=False)]
+    return centroids, assign_clusters(data, centroids)
+
+
+def assign_clusters(data, centroids, block_size=65536):
+    """Return the nearest centroid of each row of data in L2 distance."""
+    assign = np.empty(len(data), dtype=np.int64)
+    centroid_norms = np.sum(centroids * centroids, axis=1)
+    for start in range(0, len(data), block_size):
+        block = data[start:start + block_size]
+        assign[start:start + block_size] = np.argmin(centroid_norms - 2 * np.dot(block, centroids.T), axis=1)
+    return assign
+
+
+def top_k(scores, k):
+    """Return the ids of the k largest scores of each row, in descending order of score."""
+    k = min(k, scores.shape[1])
+    ids = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, ids, axis=1), axis=1)
+    return np.take_along_axis(ids, order, axis=1)
+
+
+class EmbeddingIndex:
+    """
+    Maximum cosine similarity (or inner product) search over an embedding matrix.
+
+    The vectors are normalized once when the index is built. By default the search is exact and scores the
+    vocabulary block by block, so only [batch_size, block_size] scores are held at a time. With nlist > 0 the
+    vectors are clustered into an inverted file (IVF) and only the nprobe cells nearest to a query are scored.
+    With pq_m > 0 the residuals to the cell centroids are further product quantized into pq_m codes per vector,
+    and the k * pq_refine best candidates of the quantized scores are re-ranked with the exact vectors.
+
+    Args:
+        emb_matrix (numpy.ndarray): Embeddings with shape [vocab_size, emb_size].
+        metric (str): 'cosine' or 'ip' (inner product). Default: 'cosine'.
+        nlist (int): Number of IVF cells, 0 means exact search. Default: 0.
+        nprobe (int): Number of IVF cells scored for each query. Default: 16.
+        pq_m (int): Number of product quantization sub-vectors, 0 means the residuals are kept exactly.
+            emb_size must be divisible by pq_m. Default: 0.
+        pq_bits (int): Bits of each product quantization code. Default: 8.
+        pq_refine (int): Re-ranking factor of the product quantized search, 0 means the exact vectors are
+            dropped and the quantized scores are returned. Default: 4.
+        block_size (int): Number of vectors scored at a time in exact search. Default: 65536.
+        batch_size (int): Number of queries scored at a time. Default: 1024.
+        seed (int): Random seed of the k-means training. Default: 1.
+    """
+    def __init__(self, emb_matrix, metric='cosine', nlist=0, nprobe=16, pq_m=0, pq_bits=8, pq_refine=4,
+                 block_size=65536, batch_size=1024, seed=1):
+        if metric not in ('cosine', 'ip'):
+            raise ValueError("metric should be 'cosine' or 'ip', but got {}".format(metric))
+        self.metric = metric
+        self.vectors = self._normalize(np.asarray(emb_matrix, dtype=np.float32))
+        self.num_vectors = len(self.vectors)
+        self.nlist = min(nlist, self.num_vectors)
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.pq_refine = pq_refine
+        self.block_size = block_size
+        self.batch_size = batch_size
+        self.list_ids = None
+        if self.nlist > 0:
+            self._build_ivf(pq_bits, seed)
+
+    def _normalize(self, vectors):
+        if self.metric != 'cosine':
+            return vectors
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _build_ivf(self, pq_bits, seed):
+        """Cluster the vectors into cells, and product quantize the residuals if pq_m > 0.
+
+        The vectors are reordered cell by cell, list_ids maps the position in this order to the id.
+        """
+        self.centroids, assign = kmeans(self.vectors, self.nlist, seed=seed)
+        self.centroids = self.centroids.astype(np.float32)
+        order = np.argsort(assign, kind='stable')
+        self.list_ids = order
+        self.list_bounds = np.searchsorted(assign[order], np.arange(self.nlist + 1))
+        self.vectors = self.vectors[order]
+        if self.pq_m <= 0:
+            return
+        emb_size = self.vectors.shape[1]
+        if emb_size % self.pq_m != 0:
+            raise ValueError("emb_size {} should be divisible by pq_m {}".format(emb_size, self.pq_m))
+        residuals = self.vectors - self.centroids[assign[order]]
+        sub_vectors = residuals.reshape(len(residuals), self.pq_m, -1)
+        num_codes = min(2 ** pq_bits, len(residuals))
+        self.codebooks = np.zeros((self.pq_m, num_codes, sub_vectors.shape[2]), dtype=np.float32)
+        self.codes = np.zeros((len(residuals), self.pq_m), dtype=np.uint8 if pq_bits <= 8 else np.int32)
+        for j in range(self.pq_m):
+            self.codebooks[j], self.codes[:, j] = kmeans(sub_vectors[:, j], num_codes, seed=seed + j)
+        if self.pq_refine <= 0:
+            self.vectors = None
+
+    def search(self, queries, k=1):
+        """
+        Search the k most similar vectors of each query.
+
+        Args:
+            queries (numpy.ndarray): Query vectors with shape [num_queries, emb_size].
+            k (int): Number of neighbours. Default: 1.
+
+        Returns:
+            scores with shape [num_queries, k], ids with shape [num_queries, k], both in descending order of score.
+            The ids are -1 where less than k vectors are in the probed cells.
+        """
+        queries = self._normalize(np.asarray(queries, dtype=np.float32))
+        k = min(k, self.num_vectors)
+        scores = np.empty((len(queries), k), dtype=np.float32)
+        ids = np.empty((len(queries), k), dtype=np.int64)
+        for start in range(0, len(queries), self.batch_size):
+            batch = queries[start:start + self.batch_size]
+            if self.nlist > 0:
+                batch_scores, batch_ids = self._search_ivf(batch, k)
+            else:
+                batch_scores, batch_ids = self._search_exact(batch, k)
+            scores[start:start + len(batch)] = batch_scores
+            ids[start:start + len(batch)] = batch_ids
+        return scores, ids
+
+    @staticmethod
+    def _merge(best_scores, best_ids, scores, ids, k):
+        """Merge the candidates into the running top k of each query."""
+        scores = np.concatenate([best_scores, scores], axis=1)
+        ids = np.concatenate([best_ids, ids], axis=1)
+        keep = top_k(scores, k)
+        return np.take_along_axis(scores, keep, axis=1), np.take_along_axis(ids, keep, axis=1)
+
+    def _search_exact(self, queries, k):
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_ids = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, self.num_vectors, self.block_size):
+            block_scores = np.dot(queries, self.vectors[start:start + self.block_size].T)
+            block_ids = top_k(block_scores, k)
+            best_scores, best_ids = self._merge(best_scores, best_ids,
+                                                np.take_along_axis(block_scores, block_ids, axis=1),
+                                                block_ids + start, k)
+        return best_scores, best_ids
+
+    def _search_ivf(self, queries, k):
+        """Score the vectors in the nprobe nearest cells of each query, cell by cell."""
+        num_queries = len(queries)
+        centroid_scores = np.dot(queries, self.centroids.T)
+        probes = top_k(centroid_scores, self.nprobe)
+        num_cand = k
+        if self.pq_m > 0:
+            sub_queries = queries.reshape(num_queries, self.pq_m, -1)
+            # Look-up table of the inner products between the query sub-vectors and the codewords.
+            lut = np.einsum('qjd,jcd->qjc', sub_queries, self.codebooks)
+            if self.vectors is not None:
+                num_cand = k * self.pq_refine
+        best_scores = np.full((num_queries, num_cand), -np.inf, dtype=np.float32)
+        best_pos = np.full((num_queries, num_cand), -1, dtype=np.int64)
+        probe_order = np.argsort(probes, axis=None, kind='stable')
+        probe_queries = probe_order // probes.shape[1]
+        cell_bounds = np.searchsorted(probes.reshape(-1)[probe_order], np.arange(self.nlist + 1))
+        for cell in np.flatnonzero(np.diff(cell_bounds)):
+            lower, upper = self.list_bounds[cell:cell + 2]
+            if lower == upper:
+                continue
+            qs = probe_queries[cell_bounds[cell]:cell_bounds[cell + 1]]
+            if self.pq_m > 0:
+                scores = centroid_scores[qs, cell:cell + 1] + np.sum(
+                    lut[qs][:, np.arange(self.pq_m), self.codes[lower:upper]], axis=2)
+            else:
+                scores = np.dot(queries[qs], self.vectors[lower:upper].T)
+            cand = top_k(scores, num_cand)
+            best_scores[qs], best_pos[qs] = self._merge(
+                best_scores[qs], best_pos[qs], np.take_along_axis(scores, cand, axis=1), cand + lower, num_cand)
+        if num_cand > k:
+            # Re-rank the candidates of the quantized scores with the exact vectors.
+            valid = best_pos >= 0
+            exact_scores = np.einsum('qd,qcd->qc', queries, self.vectors[np.maximum(best_pos, 0)])
+            best_scores = np.where(valid, exact_scores, -np.inf).astype(np.float32)
+            keep = top_k(best_scores, k)
+            best_scores = np.take_along_axis(best_scores, keep, axis=1)
+            best_pos = np.take_along_axis(best_pos, keep, axis=1)
+        return best_scores, np.where(best_pos >= 0, self.list_ids[np.maximum(best_pos, 0)], -1)
@@ -16,18 +16,16 @@
 utility function (used in eval.py)
 """
 
-import numpy as np
+from .embedding_index import EmbeddingIndex
 
 
-def cal_top_k_similar(target_embs, emb_matrix, k=1):
-    """Return ids of the most similar word of embedding in target_embs
+def cal_top_k_similar(target_embs, emb_matrix, k=1, index=None):
+    """Return ids of the most similar word of embedding in target_embs,
+    searched in index if given, otherwise exactly in emb_matrix.
     """
-    cosine_projection = np.dot(target_embs, emb_matrix.T)  # sample_num * vocab_size
-    target_norms = np.linalg.norm(target_embs, axis=1).reshape(-1, 1)
-    emb_norms = np.linalg.norm(emb_matrix, axis=1).reshape(1, -1)
-    cosine_similarity = cosine_projection / (np.dot(target_norms, emb_norms))
-    top_k_similar = np.argsort(-cosine_similarity, axis=1)
-    top_k_similar = top_k_similar[:, :k]
+    if index is None:
+        index = EmbeddingIndex(emb_matrix)
+    _, top_k_similar = index.search(target_embs, k)
     return top_k_similar
 
 
@@ -15,6 +15,7 @@
 """
 Evaluate TransE/TransD/TransH/TransR models
 """
+import numpy as np
 
 from mindspore import Tensor
 from mindspore import context
@@ -56,6 +57,7 @@ def run_eval():
         entities_file_name=config.entities_file_name,
         relations_file_name=config.relations_file_name,
         triplets_filter_files=config.filter_triplets_files_names,
+        batch_size=config.eval_batch_size,
     )
 
     # network
@@ -85,17 +87,28 @@ def run_eval():
         head_corrupted_mask = batch_data[1]
         tail_corrupted_batch = batch_data[2]
         tail_corrupted_mask = batch_data[3]
+        triplets = batch_data[4]
+        valid_number = batch_data[5]
 
-        head_scores = network(Tensor(head_corrupted_batch)).asnumpy()
-        tail_scores = network(Tensor(tail_corrupted_batch)).asnumpy()
+        # Each network call scores all the entities for every triplet of the batch
+        head_scores = network(Tensor(head_corrupted_batch.reshape(-1, 3))).asnumpy()
+        tail_scores = network(Tensor(tail_corrupted_batch.reshape(-1, 3))).asnumpy()
+        head_scores = head_scores.reshape(head_corrupted_mask.shape)[:valid_number]
+        tail_scores = tail_scores.reshape(tail_corrupted_mask.shape)[:valid_number]
 
-        head_hits.update(head_scores, head_scores[-1], head_corrupted_mask)
-        tails_hits.update(tail_scores, tail_scores[-1], tail_corrupted_mask)
+        # The original triplet is the corrupted one with the true head (tail)
+        valid_range = np.arange(valid_number)
+        head_ref_scores = head_scores[valid_range, triplets[:valid_number, 0]]
+        tail_ref_scores = tail_scores[valid_range, triplets[:valid_number, 2]]
+
+        head_hits.update(head_scores, head_ref_scores, head_corrupted_mask[:valid_number])
+        tails_hits.update(tail_scores, tail_ref_scores, tail_corrupted_mask[:valid_number])
 
     results_info = (
         f'Result: hit@10 = {(head_hits.hit10 + tails_hits.hit10) / 2:.4f} '
         f'hit@3 = {(head_hits.hit3 + tails_hits.hit3) / 2:.4f} '
-        f'hit@1 = {(head_hits.hit1 + tails_hits.hit1) / 2:.4f}'
+        f'hit@1 = {(head_hits.hit1 + tails_hits.hit1) / 2:.4f} '
+        f'MRR = {(head_hits.mrr + tails_hits.mrr) / 2:.4f}'
     )
 
     config.logger.info('evaluation finished')
@@ -330,6 +330,8 @@ class TripletsFilter:
     """Triplets filter.
 
     Allows to exclude false negative results.
+    The known tails of each (head, relation) pair and the known heads of each (tail, relation) pair
+    are stored in the CSR form: the sorted pair keys and the entities grouped by the key.
 
     Args:
         dataset_root (str or Path): Dataset root directory
@@ -351,20 +353,48 @@ class TripletsFilter:
             _check_dataset_file(t_file_path, 'triplets')
 
         # Loading the triplets
-        hr_t_map = {}
-        tr_h_map = {}
+        triplets = np.concatenate(
+            [_read_triplets(t_file_path)[1] for t_file_path in triplets_files_paths]
+        ).astype(np.int64)
+        heads, relations, tails = triplets[:, 0], triplets[:, 1], triplets[:, 2]
 
-        for t_file_path in triplets_files_paths:
-            _, triplets = _read_triplets(t_file_path)
+        self._relations_key_size = int(relations.max()) + 1 if len(relations) else 1
+        self._hr_keys, self._hr_tails = self._build_index(heads, relations, tails)
+        self._tr_keys, self._tr_heads = self._build_index(tails, relations, heads)
 
-            for triplet in triplets:
-                h, r, t = map(int, triplet)
+    def _pair_keys(self, entities, relations):
+        """Encode (entity, relation) pairs as int64 keys"""
+        return np.asarray(entities, np.int64) * self._relations_key_size + np.asarray(relations, np.int64)
 
-                hr_t_map.setdefault(h, {}).setdefault(r, []).append(t)
-                tr_h_map.setdefault(t, {}).setdefault(r, []).append(h)
+    def _build_index(self, entities, relations, related):
+        """Sort the related entities by the (entity, relation) key"""
+        keys = self._pair_keys(entities, relations)
+        order = np.lexsort((related, keys))
+        return keys[order], related[order]
 
-        self._hr_t_map = hr_t_map
-        self._tr_h_map = tr_h_map
+    def _lookup(self, keys, values, entities, relations):
+        """Get the related entities of each pair in the CSR form.
+
+        Returns:
+            (tuple) Related entities of all pairs, row pointers with shape [pairs_number + 1].
+        """
+        relations = np.asarray(relations, np.int64)
+        query = self._pair_keys(entities, relations)
+        lower = np.searchsorted(keys, query, side='left')
+        upper = np.searchsorted(keys, query, side='right')
+        # The keys of unknown relations could alias the keys of the next entity.
+        upper = np.where(relations < self._relations_key_size, upper, lower)
+        counts = upper - lower
+        row_pointers = np.concatenate([[0], np.cumsum(counts)])
+        positions = np.arange(row_pointers[-1]) - np.repeat(row_pointers[:-1] - lower, counts)
+        return values[positions], row_pointers
+
+    def _get_mask(self, keys, values, entities, relations, entities_number):
+        """Boolean mask with shape [pairs_number, entities_number] of the related entities"""
+        related, row_pointers = self._lookup(keys, values, entities, relations)
+        mask = np.zeros((len(row_pointers) - 1, entities_number), dtype=bool)
+        mask[np.repeat(np.arange(len(row_pointers) - 1), np.diff(row_pointers)), related] = True
+        return mask
 
     def get_related_tails(self, head, relation):
         """Returns the set of tails indices, related to the specified head and relation.
@@ -376,12 +406,7 @@ class TripletsFilter:
         Returns:
             (list) Indices of the related tails
         """
-        head = int(head)
-        relation = int(relation)
-        if head not in self._hr_t_map:
-            return []
-
-        return self._hr_t_map[head].get(relation, [])
+        return self._lookup(self._hr_keys, self._hr_tails, [head], [relation])[0].tolist()
 
     def get_related_heads(self, tail, relation):
         """Returns the set of heads indices, related to the specified tail and relation.
@@ -393,18 +418,40 @@ class TripletsFilter:
         Returns:
             (list) Indices of the related heads
         """
-        tail = int(tail)
-        relation = int(relation)
-        if tail not in self._tr_h_map:
-            return []
+        return self._lookup(self._tr_keys, self._tr_heads, [tail], [relation])[0].tolist()
+
+    def get_related_tails_mask(self, heads, relations, entities_number):
+        """Returns the mask of the tails related to each of the specified heads and relations.
+
+        Args:
+            heads (numpy.ndarray): heads indices with shape [batch_size]
+            relations (numpy.ndarray): relations indices with shape [batch_size]
+            entities_number (int): Number of entities in the dataset.
+
+        Returns:
+            (numpy.ndarray) Boolean mask with shape [batch_size, entities_number]
+        """
+        return self._get_mask(self._hr_keys, self._hr_tails, heads, relations, entities_number)
 
-        return self._tr_h_map[tail].get(relation, [])
+    def get_related_heads_mask(self, tails, relations, entities_number):
+        """Returns the mask of the heads related to each of the specified tails and relations.
+
+        Args:
+            tails (numpy.ndarray): tails indices with shape [batch_size]
+            relations (numpy.ndarray): relations indices with shape [batch_size]
+            entities_number (int): Number of entities in the dataset.
+
+        Returns:
+            (numpy.ndarray) Boolean mask with shape [batch_size, entities_number]
+        """
+        return self._get_mask(self._tr_keys, self._tr_heads, tails, relations, entities_number)
 
 
 class ValidationTripletsDataset(BaseTripletsDataset):
     """Class for the TripletDataset adapted for validation.
 
-    This class additionally provides the negative sampling mechanism.
+    Each item is a batch of the evaluation triplets, in which every triplet
+    is corrupted by replacing its head (and its tail) with all the entities.
 
     Args:
         dataset_root (str or Path): Dataset root directory
@@ -413,6 +460,8 @@ class ValidationTripletsDataset(BaseTripletsDataset):
         relations_number (int): Number of relations in the dataset.
         triplets_filter (TripletsFilter, optional): Filter for the triplets,
             which will be used to determine if the triplet is corrupted. Default: None.
+        batch_size (int): Number of evaluation triplets in a batch. The last batch is padded
+            with its last triplet, so all the batches have the same shape. Default: 1.
     """
 
     def __init__(
@@ -422,6 +471,7 @@ class ValidationTripletsDataset(BaseTripletsDataset):
             entities_number,
             relations_number,
             triplets_filter=None,
+            batch_size=1,
     ):
         super().__init__(
             dataset_root,
@@ -430,45 +480,58 @@ class ValidationTripletsDataset(BaseTripletsDataset):
             relations_number,
         )
 
+        if batch_size <= 0:
+            raise ValueError(f'Batch size must be greater than zero, got {batch_size}')
+
         self._triplets_filter: Optional[TripletsFilter] = triplets_filter
-        self._head_batch_container = np.zeros((self._entities_number + 1, 3), dtype=np.int32)
-        self._tail_batch_container = np.zeros((self._entities_number + 1, 3), dtype=np.int32)
-        self._entities_range = np.arange(self._entities_number, dtype=np.int32)
+        self._batch_size = batch_size
+        self._batches_number = (self._triplets_number + batch_size - 1) // batch_size
 
-        self._head_batch_container[self._entities_range, 0] = self._entities_range
-        self._tail_batch_container[self._entities_range, 2] = self._entities_range
+        # Shape of the batch containers: [batch_size, entities_number, 3]
+        entities_range = np.arange(self._entities_number, dtype=np.int32)
+        self._head_batch_container = np.zeros((batch_size, self._entities_number, 3), dtype=np.int32)
+        self._tail_batch_container = np.zeros((batch_size, self._entities_number, 3), dtype=np.int32)
+        self._head_batch_container[:, :, 0] = entities_range
+        self._tail_batch_container[:, :, 2] = entities_range
 
-    def __getitem__(self, index):
-        """gets the item of the dataset"""
-        triplet = self._triplets[index]
+    def __len__(self):
+        """Returns the number of batches in the dataset"""
+        return self._batches_number
 
-        # The first part of the batch data will contain triplets with corrupted heads.
-        # The second part of the batch data will contain triplets with corrupted tails.
-        head_batch_data = self._head_batch_container
-        tail_batch_data = self._tail_batch_container
+    def __getitem__(self, index):
+        """Returns the batch of the triplets with corrupted heads and tails.
 
-        head_batch_data[-1, 0] = triplet[0]
-        head_batch_data[:, 1].fill(triplet[1])
-        head_batch_data[:, 2].fill(triplet[2])
+        Returns:
+            (tuple) Triplets with corrupted heads with shape [batch_size, entities_number, 3],
+            mask of the corrupted heads with shape [batch_size, entities_number],
+            triplets with corrupted tails with shape [batch_size, entities_number, 3],
+            mask of the corrupted tails with shape [batch_size, entities_number],
+            the evaluation triplets with shape [batch_size, 3] and the number of valid (not padded) triplets.
+        """
+        if index >= self._batches_number:
+            raise IndexError
 
-        tail_batch_data[:, 0].fill(triplet[0])
-        tail_batch_data[:, 1].fill(triplet[1])
-        tail_batch_data[-1, 2] = triplet[2]
+        valid_number = min(self._batch_size, self._triplets_number - index * self._batch_size)
+        triplets = self._triplets[index * self._batch_size:index * self._batch_size + valid_number]
+        triplets = np.concatenate([triplets, triplets[-1:].repeat(self._batch_size - valid_number, axis=0)])
 
-        # # Fill triplets with fake indices
+        head_batch_data = self._head_batch_container
+        tail_batch_data = self._tail_batch_container
 
-        # Create corruption mask
-        corrupted_head_mask = np.ones(self._entities_number + 1, dtype=bool)
-        corrupted_tail_mask = np.ones(self._entities_number + 1, dtype=bool)
+        head_batch_data[:, :, 1:] = triplets[:, None, 1:]
+        tail_batch_data[:, :, :2] = triplets[:, None, :2]
 
+        # Create corruption mask, the triplets known by the filter are not corrupted
         if self._triplets_filter is not None:
-            not_corrupted_tails = self._triplets_filter.get_related_tails(triplet[0], triplet[1])
-            not_corrupted_heads = self._triplets_filter.get_related_heads(triplet[2], triplet[1])
-
-            corrupted_head_mask[not_corrupted_heads] = 0
-            corrupted_tail_mask[not_corrupted_tails] = 0
+            corrupted_head_mask = ~self._triplets_filter.get_related_heads_mask(
+                triplets[:, 2], triplets[:, 1], self._entities_number)
+            corrupted_tail_mask = ~self._triplets_filter.get_related_tails_mask(
+                triplets[:, 0], triplets[:, 1], self._entities_number)
+        else:
+            corrupted_head_mask = np.ones((self._batch_size, self._entities_number), dtype=bool)
+            corrupted_tail_mask = np.ones((self._batch_size, self._entities_number), dtype=bool)
 
-        return head_batch_data, corrupted_head_mask, tail_batch_data, corrupted_tail_mask
+        return head_batch_data, corrupted_head_mask, tail_batch_data, corrupted_tail_mask, triplets, valid_number
 
 
 def create_train_dataset(
@@ -537,6 +600,7 @@ def create_evaluation_generator(
         entities_file_name='entity2id.txt',
         relations_file_name='relation2id.txt',
         triplets_filter_files=tuple(),
+        batch_size=1,
 ):
     """Prepare a custom dataset, which produces triplets batches with corrupted heads and tails
     which are suitable for measuring hit@10 metrics.
@@ -547,6 +611,7 @@ def create_evaluation_generator(
         entities_file_name (str or Path): Name of the file, containing entities definitions.
         relations_file_name (str or Path): Name of the file, containing relations definitions.
         triplets_filter_files (tuple): Names of files, which will be used to mark the corrupted triplets only.
+        batch_size (int): Number of evaluation triplets in a batch. Default 1.
 
     Returns:
         Triplets generator, number of entities and number of relations.
@@ -572,6 +637,7 @@ def create_evaluation_generator(
         entities_number=entities_number,
         relations_number=relations_number,
         triplets_filter=triplets_filter,
+        batch_size=batch_size,
     )
 
     return validation_data_generator
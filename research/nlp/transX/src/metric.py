@@ -13,8 +13,9 @@
 # limitations under the License.
 # ============================================================================
 """
-Implementation of the Hit@10 metrics
+Implementation of the Hit@10 and MRR metrics
 """
+import numpy as np
 
 
 class HitAt10:
@@ -25,6 +26,7 @@ class HitAt10:
         self._hit1_count = 0
         self._hit3_count = 0
         self._hit10_count = 0
+        self._reciprocal_rank_sum = 0.0
 
     def clear(self):
         """Reset the metrics"""
@@ -32,21 +34,26 @@ class HitAt10:
         self._hit1_count = 0
         self._hit3_count = 0
         self._hit10_count = 0
+        self._reciprocal_rank_sum = 0.0
 
     def update(self, scores, ref_score, mask):
-        """Update the metrics"""
-        self._total_samples_number += 1
+        """Update the metrics
 
-        misses_num = ((scores < ref_score) & mask).sum()
+        Args:
+            scores (numpy.ndarray): Scores of the corrupted triplets with shape [entities_number]
+                or [batch_size, entities_number], the lower the better.
+            ref_score (numpy.ndarray): Scores of the original triplets with shape [] or [batch_size].
+            mask (numpy.ndarray): Mask of the corrupted triplets, with the same shape as scores.
+        """
+        scores = np.asarray(scores)
+        ref_score = np.asarray(ref_score).reshape(scores.shape[:-1] + (1,))
+        misses_num = ((scores < ref_score) & mask).sum(axis=-1)
 
-        if misses_num < 10:
-            self._hit10_count += 1
-
-        if misses_num < 3:
-            self._hit3_count += 1
-
-        if misses_num < 1:
-            self._hit1_count += 1
+        self._total_samples_number += misses_num.size
+        self._hit10_count += int((misses_num < 10).sum())
+        self._hit3_count += int((misses_num < 3).sum())
+        self._hit1_count += int((misses_num < 1).sum())
+        self._reciprocal_rank_sum += float((1.0 / (misses_num + 1)).sum())
 
     @property
     def hit10(self):
@@ -63,6 +70,11 @@ class HitAt10:
         """Get Hit@1 metric result"""
         return self._hit1_count / max(1, self._total_samples_number)
 
+    @property
+    def mrr(self):
+        """Get the mean reciprocal rank"""
+        return self._reciprocal_rank_sum / max(1, self._total_samples_number)
+
     def eval(self):
         """Get the evaluation results"""
         return self.hit10, self.hit3, self.hit1
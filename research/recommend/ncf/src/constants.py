@@ -59,6 +59,8 @@ NDCG_METRIC_NAME = "NDCG_METRIC"
 # error due to differences in unicode handling.
 RAW_CACHE_FILE = "raw_data_cache_py{}.pickle".format(sys.version_info[0])
 CACHE_INVALIDATION_SEC = 3600 * 24
+# CSR index of the positive items of each user, built from the raw data cache.
+LOOKUP_CACHE_FILE = "lookup_cache.npz"
 
 # ==============================================================================
 # == Data Generation ===========================================================
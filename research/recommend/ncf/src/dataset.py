@@ -162,42 +162,47 @@ def load_data(data_dir, dataset):
     return data, num_users, num_items
 
 
-def construct_lookup_variables(train_pos_users, train_pos_items, num_users):
-    """Lookup variables"""
-    index_bounds = None
-    sorted_train_pos_items = None
-
-    def index_segment(user):
-        lower, upper = index_bounds[user:user + 2]
-        items = sorted_train_pos_items[lower:upper]
-
-        negatives_since_last_positive = np.concatenate(
-            [items[0][np.newaxis], items[1:] - items[:-1] - 1])
-
-        return np.cumsum(negatives_since_last_positive)
+def construct_lookup_variables(train_pos_users, train_pos_items, num_users, cache_path=None, create_time=None):
+    """
+    Build the CSR index of the positive items of each user.
+
+    Args:
+        train_pos_users (numpy.ndarray): Users of the training positives, sorted in ascending order.
+        train_pos_items (numpy.ndarray): Items of the training positives.
+        num_users (int): Number of users.
+        cache_path (str): Path of the .npz cache of the index, which is reused while create_time matches.
+            Default: None, no cache.
+        create_time (float): Create time of the raw data the index is built from. Default: None.
+
+    Returns:
+        index_bounds (numpy.ndarray): Row pointers, the positives of user u are in [index_bounds[u], index_bounds[u+1]).
+        sorted_train_pos_items (numpy.ndarray): Positive items of each user sorted in ascending order.
+    """
+    if cache_path is not None and os.path.exists(cache_path):
+        with np.load(cache_path) as cached:
+            if create_time is not None and cached["create_time"] == create_time and \
+                    cached["index_bounds"].shape[0] == num_users + 1 and \
+                    cached["sorted_train_pos_items"].shape == train_pos_items.shape:
+                logging.info("Loaded lookup cache from {}.".format(cache_path))
+                return cached["index_bounds"], cached["sorted_train_pos_items"]
+        logging.info("Removing stale lookup cache file.")
+        os.remove(cache_path)
 
     start_time = timeit.default_timer()
-    inner_bounds = np.argwhere(train_pos_users[1:] -
-                               train_pos_users[:-1])[:, 0] + 1
-    (upper_bound,) = train_pos_users.shape
-    index_bounds = np.array([0] + inner_bounds.tolist() + [upper_bound])
+    index_bounds = np.searchsorted(train_pos_users, np.arange(num_users + 1)).astype(np.int64)
 
     # Later logic will assume that the users are in sequential ascending order.
     assert np.array_equal(train_pos_users[index_bounds[:-1]], np.arange(num_users))
 
-    sorted_train_pos_items = train_pos_items.copy()
-
-    for i in range(num_users):
-        lower, upper = index_bounds[i:i + 2]
-        sorted_train_pos_items[lower:upper].sort()
-
-    total_negatives = np.concatenate([
-        index_segment(i) for i in range(num_users)])
+    sorted_train_pos_items = train_pos_items[np.lexsort((train_pos_items, train_pos_users))]
 
-    logging.info("Negative total vector built. Time: {:.1f} seconds".format(
+    logging.info("Positive items index built. Time: {:.1f} seconds".format(
         timeit.default_timer() - start_time))
 
-    return total_negatives, index_bounds, sorted_train_pos_items
+    if cache_path is not None and create_time is not None:
+        np.savez(cache_path, index_bounds=index_bounds, sorted_train_pos_items=sorted_train_pos_items,
+                 create_time=create_time)
+    return index_bounds, sorted_train_pos_items
 
 
 class NCFDataset:
@@ -211,7 +216,6 @@ class NCFDataset:
                  num_users,
                  num_items,
                  batch_size,
-                 total_negatives,
                  index_bounds,
                  sorted_train_pos_items,
                  num_neg,
@@ -223,7 +227,6 @@ class NCFDataset:
 
         self._batch_size = batch_size
 
-        self._total_negatives = total_negatives
         self._index_bounds = index_bounds
         self._sorted_train_pos_items = sorted_train_pos_items
 
@@ -239,69 +242,43 @@ class NCFDataset:
         _num_samples = (1 + num_neg) * _pos_count
         self.dataset_len = math.ceil(_num_samples / batch_size)
 
-    def lookup_negative_items(self, negative_users):
-        """Lookup negative items"""
-        output = np.zeros(shape=negative_users.shape, dtype=rconst.ITEM_DTYPE) - 1
-
-        left_index = self._index_bounds[negative_users]
-        right_index = self._index_bounds[negative_users + 1] - 1
-
-        num_positives = right_index - left_index + 1
-        num_negatives = self._num_items - num_positives
-        neg_item_choice = stat_utils.very_slightly_biased_randint(num_negatives)
-
-        # Shortcuts:
-        # For points where the negative is greater than or equal to the tally before
-        # the last positive point there is no need to bisect. Instead the item id
-        # corresponding to the negative item choice is simply:
-        #   last_postive_index + 1 + (neg_choice - last_negative_tally)
-        # Similarly, if the selection is less than the tally at the first positive
-        # then the item_id is simply the selection.
-        #
-        # Because MovieLens organizes popular movies into low integers (which is
-        # preserved through the preprocessing), the first shortcut is very
-        # efficient, allowing ~60% of samples to bypass the bisection. For the same
-        # reason, the second shortcut is rarely triggered (<0.02%) and is therefore
-        # not worth implementing.
-        use_shortcut = neg_item_choice >= self._total_negatives[right_index]
-        output[use_shortcut] = (
-            self._sorted_train_pos_items[right_index] + 1 +
-            (neg_item_choice - self._total_negatives[right_index])
-            )[use_shortcut]
-
-        if np.all(use_shortcut):
-            # The bisection code is ill-posed when there are no elements.
-            return output
-
-        not_use_shortcut = np.logical_not(use_shortcut)
-        left_index = left_index[not_use_shortcut]
-        right_index = right_index[not_use_shortcut]
-        neg_item_choice = neg_item_choice[not_use_shortcut]
-
-        num_loops = np.max(
-            np.ceil(np.log2(num_positives[not_use_shortcut])).astype(np.int32))
-
-        for _ in range(num_loops):
+    def is_positive(self, users, items):
+        """Check whether each item is a training positive of its user, by bisection in the user's CSR row."""
+        left_index = self._index_bounds[users]
+        right_index = self._index_bounds[users + 1]
+        end_index = right_index.copy()
+        last = self._sorted_train_pos_items.shape[0] - 1
+        while True:
+            active = left_index < right_index
+            if not np.any(active):
+                break
             mid_index = (left_index + right_index) // 2
-            right_criteria = self._total_negatives[mid_index] > neg_item_choice
-            left_criteria = np.logical_not(right_criteria)
-
-            right_index[right_criteria] = mid_index[right_criteria]
-            left_index[left_criteria] = mid_index[left_criteria]
-
-        # Expected state after bisection pass:
-        #   The right index is the smallest index whose tally is greater than the
-        #   negative item choice index.
-
-        assert np.all((right_index - left_index) <= 1)
+            go_right = active & (self._sorted_train_pos_items[np.minimum(mid_index, last)] < items)
+            left_index = np.where(go_right, mid_index + 1, left_index)
+            right_index = np.where(active & ~go_right, mid_index, right_index)
+        found = self._sorted_train_pos_items[np.minimum(left_index, last)] == items
+        return (left_index < end_index) & found
+
+    def _check_has_negatives(self, users):
+        """Raise if a user has interacted with every item, the rejection sampling would never end for it."""
+        num_positives = self._index_bounds[users + 1] - self._index_bounds[users]
+        for user in users[num_positives >= self._num_items]:
+            positives = self._sorted_train_pos_items[self._index_bounds[user]:self._index_bounds[user + 1]]
+            if np.unique(positives).shape[0] >= self._num_items:
+                raise ValueError("User {} has interacted with all the {} items, so it has no negative item to "
+                                 "sample".format(user, self._num_items))
 
-        output[not_use_shortcut] = (
-            self._sorted_train_pos_items[right_index] - (self._total_negatives[right_index] - neg_item_choice)
-            )
-
-        assert np.all(output >= 0)
-
-        return output
+    def lookup_negative_items(self, negative_users):
+        """Sample a uniformly random negative item for each user, by rejecting sampled positives."""
+        users = negative_users.reshape(-1)
+        output = np.random.randint(0, self._num_items, size=users.shape).astype(rconst.ITEM_DTYPE)
+        rejected = np.flatnonzero(self.is_positive(users, output))
+        if rejected.size:
+            self._check_has_negatives(np.unique(users[rejected]))
+        while rejected.size:
+            output[rejected] = np.random.randint(0, self._num_items, size=rejected.shape)
+            rejected = rejected[self.is_positive(users[rejected], output[rejected])]
+        return output.reshape(negative_users.shape)
 
     def _get_train_item(self, index):
         """Get train item"""
@@ -568,13 +545,14 @@ def create_dataset(test_train=True, data_dir='./dataset/', dataset='ml-1m', trai
     eval_pos_users = data[rconst.EVAL_USER_KEY]
     eval_pos_items = data[rconst.EVAL_ITEM_KEY]
 
-    total_negatives, index_bounds, sorted_train_pos_items = \
-        construct_lookup_variables(train_pos_users, train_pos_items, num_users)
+    index_bounds, sorted_train_pos_items = construct_lookup_variables(
+        train_pos_users, train_pos_items, num_users,
+        cache_path=os.path.join(data_dir, dataset, rconst.LOOKUP_CACHE_FILE), create_time=data.get("create_time"))
 
     if test_train:
-        print(train_pos_users, train_pos_items, num_users, num_items, batch_size, total_negatives, index_bounds,
+        print(train_pos_users, train_pos_items, num_users, num_items, batch_size, index_bounds,
               sorted_train_pos_items)
-        dataset = NCFDataset(train_pos_users, train_pos_items, num_users, num_items, batch_size, total_negatives,
+        dataset = NCFDataset(train_pos_users, train_pos_items, num_users, num_items, batch_size,
                              index_bounds, sorted_train_pos_items, num_neg)
         sampler = RandomSampler(train_pos_users.shape[0], num_neg, batch_size)
         if rank_id is not None and rank_size is not None:
@@ -591,7 +569,7 @@ def create_dataset(test_train=True, data_dir='./dataset/', dataset='ml-1m', trai
     else:
         eval_batch_size = parse_eval_batch_size(eval_batch_size=eval_batch_size)
         dataset = NCFDataset(eval_pos_users, eval_pos_items, num_users, num_items,
-                             eval_batch_size, total_negatives, index_bounds,
+                             eval_batch_size, index_bounds,
                              sorted_train_pos_items, num_neg, is_training=False)
         sampler = SequenceSampler(eval_batch_size, num_users)
 
@@ -31,29 +31,22 @@ class NCFMetric(Metric):
         self.ndcg = []
         self.weights = []
 
-    def hit(self, gt_item, pred_items):
-        if gt_item in pred_items:
-            return 1
-        return 0
-
-    def ndcg_function(self, gt_item, pred_items):
-        if gt_item in pred_items:
-            index = pred_items.index(gt_item)
-            return np.reciprocal(np.log2(index + 2))
-        return 0
-
     def update(self, batch_indices, batch_items, metric_weights):
-        """Update hr and ndcg"""
+        """Update hr and ndcg of the whole batch, the ground truth item is the last item of each user."""
         batch_indices = batch_indices.asnumpy()  # (num_user, topk)
         batch_items = batch_items.asnumpy()  # (num_user, 100)
         metric_weights = metric_weights.asnumpy()  # (num_user,)
-        num_user = batch_items.shape[0]
-        for user in range(num_user):
-            if metric_weights[user]:
-                recommends = batch_items[user][batch_indices[user]].tolist()
-                items = batch_items[user].tolist()[-1]
-                self.hr.append(self.hit(items, recommends))
-                self.ndcg.append(self.ndcg_function(items, recommends))
+        valid = metric_weights.astype(bool)
+        batch_indices, batch_items = batch_indices[valid], batch_items[valid]
+        recommends = np.take_along_axis(batch_items, batch_indices, axis=1)
+        matched = recommends == batch_items[:, -1:]
+        hits = matched.any(axis=1)
+        # rank of the first recommendation equal to the ground truth item
+        ranks = np.argmax(matched, axis=1)
+        self.hr.append(hits.astype(np.float64))
+        self.ndcg.append(np.where(hits, np.reciprocal(np.log2(ranks + 2.)), 0.))
 
     def eval(self):
-        return np.mean(self.hr), np.mean(self.ndcg)
+        hr = np.concatenate(self.hr) if self.hr else np.array([])
+        ndcg = np.concatenate(self.ndcg) if self.ndcg else np.array([])
+        return np.mean(hr), np.mean(ndcg)